@@ -3,32 +3,84 @@ import json
 import cloudscraper
 import requests
 import threading
-from datetime import datetime, timedelta, timezone
-from eth_account import Account
-from eth_account.messages import encode_typed_data, encode_defunct
+from collections import deque
+from urllib.parse import urlsplit
 import config
+from listing import loads
+from log import fields, get_logger
+from metrics import API_BLOCKED, DETECT_TO_BUY, SETTLE_TIME, instrument_session
+from ratelimit import RateLimiter, parse_retry_after
+from session import is_jwt_error, read_token_expiry
+from wallets import Wallet, WalletPool
 
-# 全局變數，保存已認證的scraper實例
-_AUTHENTICATED_SCRAPER = None
-_LAST_AUTH_TIME = None
+logger = get_logger("api")
+
+# 全局變數，保存錢包（各自的認證會話及簽名器）及普通scraper實例
+_WALLET_POOL = None
 _REGULAR_SCRAPER = None
 
+# 交易結果代碼: 1 處理中，2 成功，其他為失敗
+TX_CODE_PENDING = 1
+TX_CODE_SUCCESS = 2
+
+# 交易最終狀態
+TX_SUCCESS = "success"
+TX_FAILED = "failed"
+TX_TIMEOUT = "timeout"  # 逾時時仍在處理中
+TX_UNKNOWN = "unknown"  # 逾時前一直無法取得交易結果（網路、JWT等暫時性錯誤）
+
+# 最近購買的「偵測到送出購買請求」延遲（毫秒）
+_BUY_POST_LATENCIES = deque(maxlen=200)
+
+# 所有API呼叫共用的限流器
+_RATE_LIMITER = RateLimiter()
+
+# 每個主機的同時請求數量限制
+_HOST_SEMAPHORES = {}
+_HOST_SEMAPHORES_LOCK = threading.Lock()
+
+def get_rate_limiter():
+    """取得所有API呼叫共用的限流器"""
+    return _RATE_LIMITER
+
+def get_wallet_pool():
+    """取得所有購買用錢包（依 config.WALLETS 建立，不會進行網路請求）"""
+    global _WALLET_POOL
+    if _WALLET_POOL is None:
+        wallets = [
+            Wallet(entry["name"], entry["wallet"], entry["private_key"], budget=entry.get("budget"))
+            for entry in config.WALLETS
+        ]
+        _WALLET_POOL = WalletPool(wallets, max_in_flight_per_wallet=config.MAX_BUYS_IN_FLIGHT)
+    return _WALLET_POOL
+
+def get_default_wallet():
+    """取得預設錢包（config.WALLETS 的第一個）"""
+    return get_wallet_pool().wallets[0]
+
+def get_auth_session(wallet=None):
+    """取得錢包的認證會話（不會進行網路請求），預設為預設錢包"""
+    return (wallet or get_default_wallet()).session
+
 # 初始化認證（在程式啟動時調用）
 def initialize_authentication():
-    """初始化認證，預先獲取認證會話"""
-    global _AUTHENTICATED_SCRAPER
+    """初始化所有錢包的認證，預先獲取認證會話並啟動背景重新認證"""
     try:
-        print("正在初始化認證會話...")
-        _AUTHENTICATED_SCRAPER = create_authenticated_scraper()
-        print("認證會話初始化完成")
+        logger.info("正在初始化認證會話...")
+        for wallet in get_wallet_pool().wallets:
+            wallet.session.refresh()
+            wallet.session.start_refresher()
+            # 預先建立訂單簽名器，購買時不需再解析私鑰
+            wallet.signer
+        logger.info("認證會話初始化完成（%d 個錢包）", len(get_wallet_pool()))
         return True
     except Exception as e:
-        print(f"初始化認證失敗: {e}")
+        logger.error("初始化認證失敗: %s", e)
         return False
 
 # 檢查JWT是否有效
 def is_jwt_valid(scraper):
-    """檢查JWT憑證是否有效
+    """檢查JWT憑證是否有效（從cookie本地解析過期時間，不進行網路請求）
     
     Args:
         scraper: 要檢查的scraper實例
@@ -39,118 +91,56 @@ def is_jwt_valid(scraper):
     """
     if scraper is None:
         return False
-        
-    try:
-        # 使用API檢查認證狀態
-        test_url = "https://msu.io/api/bff/users/me"
-        response = scraper.get(test_url, allow_redirects=False)
-        
-        # 檢查回應內容是否包含JWT錯誤
-        response_text = response.text
-        if "Jwt is missing" in response_text or "Jwt is expired" in response_text or "code\":3" in response_text:
-            print("JWT 憑證過期或丟失")
-            return False
-        else:
-            # 其他情況認為認證有效
-            return True
-    except Exception as e:
-        print(f"檢查JWT狀態時出錯: {e}")
-        return False
+
+    session = get_auth_session()
+    if scraper is session.scraper:
+        return session.is_valid()
+
+    expires_at = read_token_expiry(scraper)
+    return expires_at is not None and time.time() < expires_at
 
 # 檢查認證狀態並在需要時重新驗證
 def check_and_refresh_authentication():
-    """檢查認證狀態，如果過期則重新認證"""
-    global _AUTHENTICATED_SCRAPER
-    
-    if _AUTHENTICATED_SCRAPER is None:
-        print("認證會話不存在，正在創建新會話...")
-        try:
-            _AUTHENTICATED_SCRAPER = create_authenticated_scraper()
-            print("已創建新的認證會話")
-            return True
-        except Exception as e:
-            print(f"創建認證會話失敗: {e}")
-            return False
-    
-    # 使用共用函數檢查JWT有效性
-    if is_jwt_valid(_AUTHENTICATED_SCRAPER):
+    """檢查認證狀態，如果過期則重新認證（有效時不進行網路請求）"""
+    session = get_auth_session()
+    if session.is_valid():
         return True
-    else:
-        print("重新認證中...")
-        try:
-            _AUTHENTICATED_SCRAPER = create_authenticated_scraper()
-            return True
-        except Exception:
-            print("重新認證失敗")
-            return False
+
+    logger.info("認證會話不存在或已過期，正在重新認證...")
+    try:
+        session.get_scraper()
+        return True
+    except Exception as e:
+        logger.error("重新認證失敗: %s", e)
+        return False
 
 # 創建或獲取普通scraper（不需認證）
 def get_regular_scraper():
     """獲取普通的scraper實例（不需認證）"""
     global _REGULAR_SCRAPER
     if _REGULAR_SCRAPER is None:
-        _REGULAR_SCRAPER = cloudscraper.create_scraper()
+        _REGULAR_SCRAPER = instrument_session(cloudscraper.create_scraper())
     return _REGULAR_SCRAPER
 
-def create_authenticated_scraper():
-    """創建已認證的scraper實例，或返回現有的有效實例"""
-    global _AUTHENTICATED_SCRAPER, _LAST_AUTH_TIME
-    
-    # 檢查是否已有有效的scraper實例
-    if _AUTHENTICATED_SCRAPER is not None:
-        # 使用共用函數檢查JWT有效性
-        if is_jwt_valid(_AUTHENTICATED_SCRAPER):
-            return _AUTHENTICATED_SCRAPER
-        else:
-            print("重新登入中...")
-    
-    # 建立新的scraper實例並進行認證
-    scraper = cloudscraper.create_scraper()
-    
-    # 使用config模組讀取設定，保持一致性
-    WALLET_ADDRESS = config.WALLET
-    PRIVATE_KEY = config.PRIVATE_KEY
-    RPC_ENDPOINT = "https://msu.io/marketplace/api/gateway/v1"
-    
-    try:
-        # 1. 拿 challenge message
-        msg_res = scraper.post(f"{RPC_ENDPOINT}/web/message", json={"address": WALLET_ADDRESS})
-        msg_res.raise_for_status()
-        challenge = msg_res.json()["message"]
-        print(f"收到挑戰訊息")
-        
-        # 2. 簽名
-        eip191_msg = encode_defunct(text=challenge)
-        signed = Account.sign_message(eip191_msg, private_key=PRIVATE_KEY)
-        signature = signed.signature.hex()
-        print(f"生成簽名: 0x{signature[:10]}...")
-        
-        # 3. 登入
-        auth_payload = {
-            "address": WALLET_ADDRESS,
-            "signature": "0x" + signature,
-            "walletType": "WALLET_TYPE_METAMASK"
-        }
-        auth_res = scraper.post(f"{RPC_ENDPOINT}/web/signin-wallet", json=auth_payload)
-        
-        # 顯示詳細錯誤
-        if auth_res.status_code != 200:
-            print(f"認證失敗: {auth_res.status_code}")
-            print(f"錯誤內容: {auth_res.text}")
-            raise Exception(f"認證失敗: {auth_res.status_code}")
-            
-        auth_res.raise_for_status()
-        print("認證成功，已取得認證cookies")
-        
-        # 更新全局變數
-        _AUTHENTICATED_SCRAPER = scraper
-        _LAST_AUTH_TIME = datetime.now()
-        
-        return scraper
-        
-    except Exception as e:
-        print(f"認證過程發生錯誤: {e}")
-        raise
+def create_authenticated_scraper(wallet=None):
+    """返回錢包已認證的scraper實例，只有在本地判斷過期時才重新登入"""
+    return get_auth_session(wallet).get_scraper()
+
+def _invalidate_on_jwt_error(response, wallet=None):
+    """伺服器回應JWT過期或丟失時，讓認證會話在下次使用前重新登入"""
+    if is_jwt_error(response.text):
+        logger.warning("JWT 憑證過期或丟失")
+        get_auth_session(wallet).invalidate()
+
+def _host_semaphore(url):
+    """取得URL所屬主機的併發限制信號量，限制同一主機的同時請求數量"""
+    host = urlsplit(url).netloc
+    with _HOST_SEMAPHORES_LOCK:
+        semaphore = _HOST_SEMAPHORES.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(config.MAX_CONCURRENT_REQUESTS_PER_HOST)
+            _HOST_SEMAPHORES[host] = semaphore
+    return semaphore
 
 def fetch_url_using_cloudscraper(method: str, url: str, payload=None, need_auth=False):
     """使用cloudscraper發送請求並處理錯誤
@@ -163,87 +153,111 @@ def fetch_url_using_cloudscraper(method: str, url: str, payload=None, need_auth=
     """
     # 根據是否需要認證選擇scraper
     scraper = create_authenticated_scraper() if need_auth else get_regular_scraper()
-    
+
+    # 依共用的限流器排隊，冷卻期間會在此等待
+    _RATE_LIMITER.acquire()
     try:
-        if method == "post":
-            response = scraper.post(url, json=payload)
-        else:
-            response = scraper.get(url)
+        with _host_semaphore(url):
+            if method == "post":
+                response = scraper.post(url, json=payload)
+            else:
+                response = scraper.get(url)
         response.raise_for_status()  # 如果不是 200，會觸發 HTTPError
-        return response.json()  # 成功時回傳資料
+        _RATE_LIMITER.record_success()
+        return loads(response.content)  # 成功時回傳資料（有安裝 orjson 時使用較快的解析器）
     except cloudscraper.exceptions.CloudflareChallengeError:
-        print("遇到Cloudflare驗證。重試中...")
+        API_BLOCKED.inc("cloudflare")
+        cooldown = _RATE_LIMITER.record_throttled()
+        logger.warning("遇到Cloudflare驗證。%.0f秒後重試...", cooldown)
         return None
     except requests.exceptions.HTTPError as e:
-        if response.status_code == 403:
-            print("403 拒絕存取。30秒後重試...")
-            time.sleep(30)
-        elif response.status_code == 429:
-            print("請求過多。120秒後重試...")
-            time.sleep(120)
+        if response.status_code in (403, 429):
+            # 優先使用伺服器指定的 Retry-After，否則指數退避
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            cooldown = _RATE_LIMITER.record_throttled(retry_after)
+            if response.status_code == 403:
+                logger.warning("403 拒絕存取。%.0f秒後重試...", cooldown)
+            else:
+                logger.warning("請求過多。%.0f秒後重試...", cooldown)
         else:
-            print(f"HTTP錯誤: {e}")
+            logger.warning("HTTP錯誤: %s", e)
         return None
     except Exception as e:
-        print(f"發生意外錯誤: {e}")
+        logger.error("發生意外錯誤: %s", e)
         return None
 
-def get_transaction_result(transactionId):
-    """取得交易結果"""
+def get_transaction_result(transactionId, wallet=None):
+    """取得交易結果
+
+    Args:
+        transactionId: 交易ID
+        wallet: 送出該交易的錢包，預設為預設錢包
+    """
     transactionId = transactionId.replace(":", "%3A")
-    url = f"https://msu.io/marketplace/api/marketplace/transaction/{transactionId}/result"
+    url = f"{config.MARKETPLACE_API_URL}/marketplace/transaction/{transactionId}/result"
 
     # 交易結果查詢需要認證
-    scraper = create_authenticated_scraper()
-    response = scraper.get(url)
-
+    scraper = create_authenticated_scraper(wallet)
+    response = None
     try:
+        # 交易結果查詢優先於市集查詢，避免錢包因排在查詢後面而無法釋放
+        _RATE_LIMITER.acquire(priority=True)
+        response = scraper.get(url)
         response.raise_for_status()
         # 將返回結果解析為 JSON
         result = response.json()
-        
+
         return result["code"]
     except json.JSONDecodeError as e:
-        print("取得交易結果失敗")
-        print("JSON解析錯誤:", e)
+        logger.warning("取得交易結果失敗，JSON解析錯誤: %s", e)
     except Exception as e:
-        print("取得交易結果失敗")
-        print(f"HTTP錯誤 {response.status_code}: {response.text}")
+        if response is None:
+            # 連線錯誤等，沒有取得回應
+            logger.warning("取得交易結果失敗: %s", e)
+            return None
+        logger.warning("取得交易結果失敗，HTTP錯誤 %s: %s", response.status_code, response.text)
+        _invalidate_on_jwt_error(response, wallet)
 
-def fetch_all_pets():
-    """取得所有寵物列表"""
-    # 每次獲取前檢查認證狀態
-    check_and_refresh_authentication()
-    
-    url = "https://msu.io/marketplace/api/marketplace/explore/items"
-    fetch_amount = 20
+def fetch_all_pets(page_no=1, page_size=None):
+    """取得所有寵物列表
+
+    Args:
+        page_no: 頁碼，從1開始
+        page_size: 每頁數量，預設為 config.PET_PAGE_SIZE
+    """
+    url = f"{config.MARKETPLACE_API_URL}/marketplace/explore/items"
+    fetch_amount = page_size or config.PET_PAGE_SIZE
     payload = {
         "filter": {
             "categoryNo": 1000401001,
             "price": {"min": 0, "max": 10000000000},
         },
         "sorting": "ExploreSorting_RECENTLY_LISTED",
-        "paginationParam": {"pageNo": 1, "pageSize": fetch_amount},
+        "paginationParam": {"pageNo": page_no, "pageSize": fetch_amount},
     }
 
     # 瀏覽市場不需要認證
     return fetch_url_using_cloudscraper("post", url, payload, need_auth=False)
 
-def query_equipment_batch():
-    """查詢所有最近上架的裝備"""
-    # 每次獲取前檢查認證狀態
-    check_and_refresh_authentication()
-    
-    url = "https://msu.io/marketplace/api/marketplace/explore/items"
-    fetch_amount = 135  # 一次查詢的數量
+def query_equipment_batch(page_no=1, page_size=None, category_no=None):
+    """查詢最近上架的裝備
+
+    Args:
+        page_no: 頁碼，從1開始
+        page_size: 每頁數量，預設為 config.EQUIPMENT_PAGE_SIZE
+        category_no: 分類編號，None表示所有分類
+    """
+    url = f"{config.MARKETPLACE_API_URL}/marketplace/explore/items"
+    fetch_amount = page_size or config.EQUIPMENT_PAGE_SIZE  # 一次查詢的數量
+    item_filter = {"price": {"min": 0, "max": 10000000000}}
+    if category_no:
+        item_filter["categoryNo"] = category_no
     # 最近上架：RECENTLY_LISTED
     # 最低價：LOWEST_PRICE
     payload = {
-        "filter": {
-            "price": {"min": 0, "max": 10000000000}
-        },
+        "filter": item_filter,
         "sorting": "ExploreSorting_RECENTLY_LISTED",
-        "paginationParam": {"pageNo": 1, "pageSize": fetch_amount},
+        "paginationParam": {"pageNo": page_no, "pageSize": fetch_amount},
     }
 
     # 批量查詢不需要認證
@@ -251,7 +265,7 @@ def query_equipment_batch():
 
 def get_singal_pet_skill_info(tokenId: int):
     """取得單個寵物技能資訊"""
-    url = f"https://msu.io/marketplace/api/marketplace/items/{tokenId}"
+    url = f"{config.MARKETPLACE_API_URL}/marketplace/items/{tokenId}"
 
     # 查詢單品資訊不需要認證
     response = fetch_url_using_cloudscraper("get", url, need_auth=False)
@@ -261,82 +275,52 @@ def get_singal_pet_skill_info(tokenId: int):
         pet_skills = response["item"]["pet"]["petSkills"]
         return pet_skills
 
-def buy_item_api(tokenId, tokenAmount):
-    """購買物品API"""
-    # 計算時間戳記
-    current_time = datetime.now(timezone.utc)
-    listing_time = int(current_time.timestamp())  # 秒級時間戳記
-    expiration_time = int((current_time + timedelta(days=1)).timestamp())  # 一天後
-    salt = int(current_time.timestamp() * 1000)  # 毫秒級時間戳記
-    # 合約地址
-    TOKEN_ADDRESS = "0x07E49Ad54FcD23F6e7B911C2068F0148d1827c08"
-    NFT_ADDRESS = "0x43DCff2A0cedcd5e10e6f1c18b503498dDCe60d5"
-
-    # 建構 EIP-712 結構化資料
-    full_message = {
-        "domain": {
-            "name": "Marketplace",
-            "version": "1.0",
-            "chainId": 68414,
-            "verifyingContract": "0xf1c82c082af3de3614771105f01dc419c3163352",
-        },
-        "primaryType": "Order",
-        "types": {
-            "EIP712Domain": [
-                {"name": "name", "type": "string"},
-                {"name": "version", "type": "string"},
-                {"name": "chainId", "type": "uint256"},
-                {"name": "verifyingContract", "type": "address"},
-            ],
-            "Order": [
-                {"name": "isSeller", "type": "uint256"},  # 維持原狀
-                {"name": "maker", "type": "address"},
-                {"name": "listingTime", "type": "uint256"},
-                {"name": "expirationTime", "type": "uint256"},
-                {"name": "tokenAddress", "type": "address"},
-                {"name": "tokenAmount", "type": "uint256"},
-                {"name": "nftAddress", "type": "address"},
-                {"name": "nftTokenId", "type": "uint256"},
-                {"name": "salt", "type": "uint256"},
-            ],
-        },
-        "message": {
-            "isSeller": 0,  # 簽名時使用數值 0
-            "maker": config.WALLET.lower(),
-            "listingTime": listing_time,
-            "expirationTime": expiration_time,
-            "tokenAddress": TOKEN_ADDRESS.lower(),
-            "tokenAmount": int(tokenAmount),
-            "nftAddress": NFT_ADDRESS.lower(),
-            "nftTokenId": int(tokenId),  # 轉換為整數
-            "salt": salt,
-        },
-    }
+def get_order_signer(wallet=None):
+    """取得錢包預先編譯的訂單簽名器（第一次呼叫時建立），預設為預設錢包"""
+    return (wallet or get_default_wallet()).signer
 
-    # 簽名
-    encoded_message = encode_typed_data(full_message=full_message)
-    signature = Account.sign_message(encoded_message, config.PRIVATE_KEY)
-
-    # 組裝 POST 資料
-    post_data = {
-        "order": {
-            "isSeller": False,  # 修改為bool False
-            "maker": config.WALLET,
-            "listingTime": str(full_message["message"]["listingTime"]),
-            "expirationTime": str(full_message["message"]["expirationTime"]),
-            "tokenAddress": TOKEN_ADDRESS,
-            "tokenAmount": str(full_message["message"]["tokenAmount"]),
-            "nftAddress": NFT_ADDRESS,
-            "nftTokenId": str(full_message["message"]["nftTokenId"]),
-            "salt": str(full_message["message"]["salt"]), 
-        },
-        "orderSign": "0x" + signature.signature.hex(),
+def get_buy_latency_stats():
+    """取得最近購買的「偵測到送出購買請求」延遲統計（毫秒）
+
+    Returns:
+        包含 count、p50、p90、max 的字典，沒有紀錄時返回None
+    """
+    latencies = sorted(_BUY_POST_LATENCIES)
+    if not latencies:
+        return None
+    return {
+        "count": len(latencies),
+        "p50": latencies[len(latencies) // 2],
+        "p90": latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))],
+        "max": latencies[-1],
     }
 
-    url = f"https://msu.io/marketplace/api/marketplace/items/{tokenId}/buy" 
+def submit_buy_order(tokenId, tokenAmount, detected_at=None, wallet=None):
+    """簽署並送出購買訂單，不等待交易結果
+
+    Args:
+        tokenId: 物品的 tokenId
+        tokenAmount: 價格（Wei）
+        detected_at: 偵測到物品時的 time.perf_counter() 值，用於紀錄偵測到送出購買的延遲
+        wallet: 用來購買的錢包，預設為預設錢包
+
+    Returns:
+        成功送出時返回交易ID，失敗時返回None
+    """
+    # 簽署訂單（網域、型別雜湊及帳戶已預先計算）
+    post_data = get_order_signer(wallet).sign_order(tokenId, tokenAmount)
+
+    url = f"{config.MARKETPLACE_API_URL}/marketplace/items/{tokenId}/buy" 
 
     # 購買需要認證
-    scraper = create_authenticated_scraper()
+    scraper = create_authenticated_scraper(wallet)
+    if detected_at is not None:
+        latency_ms = (time.perf_counter() - detected_at) * 1000
+        _BUY_POST_LATENCIES.append(latency_ms)
+        DETECT_TO_BUY.observe(latency_ms / 1000)
+        logger.info("偵測到送出購買請求: %.1f ms", latency_ms, extra=fields(token_id=tokenId, latency_ms=latency_ms))
+    # 購買請求優先，不等待限流器，但仍計入令牌用量
+    _RATE_LIMITER.acquire(block=False)
     response = scraper.post(url, json=post_data)
 
     # 檢查 HTTP 狀態碼
@@ -345,51 +329,100 @@ def buy_item_api(tokenId, tokenAmount):
         # 將返回結果解析為 JSON
         result = response.json()
         transactionId = result["transactionId"]
-        print(transactionId)
-
-        for _ in range(6):
-            transaction_result_code = get_transaction_result(transactionId)
-            if transaction_result_code == 1:
-                print("交易處理中...")
-                time.sleep(1)
-            elif transaction_result_code == 2:
-                # Transaction status: 2 means success
-                print("交易成功")
-                return True
-            else:
-                print("交易失敗")
-                return False
-
+        logger.info("已送出購買: %s", transactionId, extra=fields(token_id=tokenId, transaction_id=transactionId))
+        return transactionId
     except json.JSONDecodeError as e:
-        print("JSON解析錯誤:", e)
-        return False
+        logger.warning("JSON解析錯誤: %s", e)
+        return None
     except Exception as e:
-        print(f"HTTP錯誤 {response.status_code}: {response.text}")
-        return False 
+        logger.warning("購買失敗，HTTP錯誤 %s: %s", response.status_code, response.text, extra=fields(token_id=tokenId))
+        _invalidate_on_jwt_error(response, wallet)
+        return None
 
-def get_wallet_balance():
-    """獲取用戶錢包餘額
+def wait_for_transaction(transactionId, wallet=None):
+    """以退避間隔輪詢交易結果，直到成功、失敗或逾時
+
+    查詢失敗（返回None）時交易可能仍會完成，視同處理中繼續等待。
+
+    Returns:
+        TX_SUCCESS、TX_FAILED、TX_TIMEOUT 或 TX_UNKNOWN
+    """
+    delay = config.SETTLE_POLL_INITIAL
+    started = time.monotonic()
+    deadline = started + config.SETTLE_TIMEOUT
+    while True:
+        transaction_result_code = get_transaction_result(transactionId, wallet)
+        if transaction_result_code == TX_CODE_SUCCESS:
+            logger.info("交易成功", extra=fields(transaction_id=transactionId))
+            SETTLE_TIME.observe(time.monotonic() - started, TX_SUCCESS)
+            return TX_SUCCESS
+        if transaction_result_code not in (TX_CODE_PENDING, None):
+            logger.warning("交易失敗", extra=fields(transaction_id=transactionId))
+            SETTLE_TIME.observe(time.monotonic() - started, TX_FAILED)
+            return TX_FAILED
+        if time.monotonic() + delay > deadline:
+            result = TX_TIMEOUT if transaction_result_code == TX_CODE_PENDING else TX_UNKNOWN
+            logger.warning("交易在 %s 秒內仍未確認結果: %s", config.SETTLE_TIMEOUT, transactionId)
+            SETTLE_TIME.observe(time.monotonic() - started, result)
+            return result
+        logger.debug("交易處理中...")
+        time.sleep(delay)
+        delay = min(delay * 2, config.SETTLE_POLL_MAX)
+
+def buy_item_api(tokenId, tokenAmount, detected_at=None):
+    """購買物品API（同步等待交易結果）
+
+    Args:
+        tokenId: 物品的 tokenId
+        tokenAmount: 價格（Wei）
+        detected_at: 偵測到物品時的 time.perf_counter() 值，用於紀錄偵測到送出購買的延遲
+
+    Returns:
+        交易成功時返回True，失敗、逾時或結果未知時返回False
+    """
+    transactionId = submit_buy_order(tokenId, tokenAmount, detected_at=detected_at)
+    if transactionId is None:
+        return False
+    return wait_for_transaction(transactionId) == TX_SUCCESS
+
+def get_wallet_balance_wei(address=None):
+    """獲取用戶錢包餘額（Wei）
+
+    Args:
+        address: 錢包地址，預設為 config.WALLET
     
     返回：
-        成功時返回餘額（以遊戲幣為單位）
+        成功時返回整數 Wei 餘額
         失敗時返回None
     """
-    url = f"https://msu.io/marketplace/api/gateway/bcbackend/next-meso/balance/{config.WALLET}"
+    url = f"{config.MARKETPLACE_API_URL}/gateway/bcbackend/next-meso/balance/{address or config.WALLET}"
     
     try:
         # 使用無需認證的scraper
         scraper = get_regular_scraper()
+        _RATE_LIMITER.acquire()
         response = scraper.get(url)
         response.raise_for_status()
         
         # 解析返回的餘額
         result = response.json()
-        balance_wei = result.get("balance", "0")
-        
-        # 轉換為遊戲幣單位
-        balance = int(int(balance_wei) / config.WEI_PER_ETHER)
-        
-        return balance
+        return int(result.get("balance", "0"))
     except Exception as e:
-        print(f"獲取錢包餘額失敗: {e}")
-        return None 
\ No newline at end of file
+        logger.warning("獲取錢包餘額失敗: %s", e)
+        return None
+
+def get_wallet_balance(address=None):
+    """獲取用戶錢包餘額
+
+    Args:
+        address: 錢包地址，預設為 config.WALLET
+    
+    返回：
+        成功時返回餘額（以遊戲幣為單位）
+        失敗時返回None
+    """
+    balance_wei = get_wallet_balance_wei(address)
+    if balance_wei is None:
+        return None
+    # 轉換為遊戲幣單位
+    return int(balance_wei / config.WEI_PER_ETHER)
\ No newline at end of file
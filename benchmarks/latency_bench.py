@@ -0,0 +1,220 @@
+"""端到端偵測延遲效能測試
+
+對本地模擬市集（benchmarks/mock_market.py）執行監控引擎，依模式回報：
+    - 上架到偵測 (listing -> detection) 的延遲百分位數
+    - 偵測到送出購買 (detection -> buy POST) 的延遲百分位數
+    - 監控範圍內的物品（寵物、符合裝備監控清單的裝備）偵測到的比例及從上架到偵測的延遲百分位數
+    - 每個偵測到的物品平均花費的請求數
+
+需要與 main.py 相同的 config.json；指定 --wallets 時改用隨機產生的測試錢包。
+
+使用方式:
+    python benchmarks/latency_bench.py
+    python benchmarks/latency_bench.py --modes pet equipment all --duration 30 --rate 3 --throttle 0.02
+    python benchmarks/latency_bench.py --modes equipment --rate 150 --noise 0.95  # 大量無關上架
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eth_account import Account  # noqa: E402
+
+import config  # noqa: E402
+import api  # noqa: E402
+from monitor import MonitorEngine  # noqa: E402
+from price_history import open_price_history  # noqa: E402
+from benchmarks.mock_market import API_PREFIX, EQUIPMENT, MockMarket, create_server  # noqa: E402
+
+MODES = {
+    "pet": ["pet"],
+    "equipment": ["equipment"],
+    "all": ["pet", "equipment"],
+}
+
+
+def percentile(values, pct):
+    """最近排名法百分位數，沒有資料時返回None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _format_ms(values):
+    if not values:
+        return "N/A"
+    return " / ".join(f"{percentile(values, pct) * 1000:.0f}" for pct in (50, 90, 99))
+
+
+def _instrument(engine, detected_at, buy_detected_at):
+    """包裝各監控的判斷函數及購買函數
+
+    detected_at 紀錄每個物品第一次被任一監控判斷的時間；
+    buy_detected_at 紀錄送出購買的那次判斷開始的時間。不分分類的裝備來源也會查詢到寵物，
+    寵物可能先被裝備監控判斷（不購買），之後才由寵物監控判斷並購買，
+    因此偵測到購買的延遲以送出購買的判斷為準。
+    """
+    evaluating = threading.local()
+    for monitor in engine.monitors:
+        for attribute in ("_evaluate_pet", "_evaluate_item"):
+            evaluate = getattr(monitor, attribute, None)
+            if evaluate is None:
+                continue
+
+            def wrapper(listing, *args, _evaluate=evaluate):
+                now = time.monotonic()
+                detected_at.setdefault(listing.token_id, now)
+                # 判斷及送出購買在同一個執行緒
+                evaluating.started = now
+                return _evaluate(listing, *args)
+
+            setattr(monitor, attribute, wrapper)
+
+        def buy(token_id, *args, _buy=monitor.buy, **kwargs):
+            buy_detected_at.setdefault(token_id, getattr(evaluating, "started", time.monotonic()))
+            return _buy(token_id, *args, **kwargs)
+
+        monitor.buy = buy
+
+
+def _watched(engine, name):
+    """物品是否在監控範圍內：寵物監控的所有寵物，以及符合裝備監控清單的裝備"""
+    for monitor in engine.monitors:
+        matcher = getattr(monitor, "matcher", None)
+        if matcher is None and name == "Pet" or matcher is not None and matcher.match(name):
+            return True
+    return False
+
+
+def run_mode(mode, args):
+    """對全新的模擬市集執行一種模式，返回統計結果"""
+    market = MockMarket(
+        arrival_rate=args.rate, pet_ratio=args.pet_ratio, latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms, throttle_rate=args.throttle, settle_seconds=args.settle,
+        noise_ratio=args.noise, seed=args.seed,
+    )
+    # 先放一頁舊物品，模擬啟動時市集已有的上架
+    for _ in range(30):
+        market.add_listing()
+    warmup_tokens = set(market.listed_at)
+
+    server = create_server(market)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config.MARKETPLACE_API_URL = f"http://127.0.0.1:{server.server_port}{API_PREFIX}"
+
+    if args.wallets:
+        # 每種模式使用新的錢包池，分別測試多錢包並行購買
+        config.WALLETS = [
+            {"name": f"bench-{index + 1}", "private_key": account.key.hex(), "wallet": account.address, "budget": None}
+            for index, account in enumerate(Account.create() for _ in range(args.wallets))
+        ]
+        api._WALLET_POOL = None
+
+    detected_at = {}
+    buy_detected_at = {}
+    output = io.StringIO()
+    with tempfile.TemporaryDirectory() as state_dir:
+        config.STATE_DIR = state_dir
+        if args.warm_history:
+            # 模擬長時間執行後的價格歷史紀錄，裝備監控可直接推斷各裝備的分類
+            history = open_price_history(os.path.join(state_dir, config.PRICE_HISTORY_FILE))
+            history.record([
+                {"tokenId": f"warm-{index}", "name": name, "categoryNo": category, "salesInfo": {"priceWei": "1"}}
+                for index, (name, category) in enumerate(EQUIPMENT)
+            ])
+            history.flush()
+        redirect = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(output)
+        with redirect:
+            api.initialize_authentication()
+            engine = MonitorEngine(MODES[mode])
+            _instrument(engine, detected_at, buy_detected_at)
+            market.start()
+
+            async def run():
+                try:
+                    await asyncio.wait_for(engine.run(), args.duration)
+                except asyncio.TimeoutError:
+                    pass
+
+            asyncio.run(run())
+
+            # 停止上架並等背景執行緒中尚未完成的請求結束後再關閉伺服器
+            market.stop()
+            engine.wait_closed()
+            server.shutdown()
+            server.server_close()
+
+    # 只統計測試期間新上架的物品
+    detected = {token: at for token, at in detected_at.items() if token not in warmup_tokens}
+    arrived = len(market.listed_at) - len(warmup_tokens)
+    listing_to_detection = [at - market.listed_at[token] for token, at in detected.items()]
+    detection_to_buy = [
+        market.buy_posted_at[token] - buy_detected_at[token]
+        for token in market.buy_posted_at if token in detected and token in buy_detected_at
+    ]
+    watched_arrived = sum(
+        1 for token in market.listed_at
+        if token not in warmup_tokens and _watched(engine, market.details[token]["name"])
+    )
+    watched_to_detection = [
+        at - market.listed_at[token] for token, at in detected.items()
+        if _watched(engine, market.details[token]["name"])
+    ]
+    total_requests = sum(market.requests.values())
+    return {
+        "mode": mode,
+        "arrived": arrived,
+        "detected": len(detected),
+        "bought": len(detection_to_buy),
+        "listing_to_detection": listing_to_detection,
+        "detection_to_buy": detection_to_buy,
+        "watched_to_detection": watched_to_detection,
+        "watched_arrived": watched_arrived,
+        "requests_per_detected": total_requests / len(detected) if detected else None,
+        "throttled": market.throttled,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端偵測延遲效能測試")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--duration", type=float, default=60, help="每種模式執行秒數")
+    parser.add_argument("--rate", type=float, default=2.0, help="每秒平均上架數量")
+    parser.add_argument("--pet-ratio", type=float, default=0.3)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--throttle", type=float, default=0.0, help="隨機回應 429 的比例")
+    parser.add_argument("--settle", type=float, default=1.5, help="交易結算秒數")
+    parser.add_argument("--noise", type=float, default=0.0, help="非寵物上架中與監控無關的消耗品比例")
+    parser.add_argument("--warm-history", action="store_true", help="預先在價格歷史紀錄中加入每種裝備（模擬長時間執行後的狀態）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--wallets", type=int, default=0, help="使用多少個隨機測試錢包，0表示使用 config.json 的錢包")
+    parser.add_argument("--verbose", action="store_true", help="顯示監控程式的輸出")
+    args = parser.parse_args()
+
+    results = [run_mode(mode, args) for mode in args.modes]
+
+    print(f"模擬設定: 上架 {args.rate}/秒, 延遲 {args.latency_ms}±{args.jitter_ms} ms, 429 比例 {args.throttle}, 每模式 {args.duration} 秒")
+    print(f"{'模式':<10} | {'上架':>5} | {'偵測':>5} | {'購買':>5} | {'上架→偵測 p50/p90/p99 (ms)':>28} | {'偵測→購買 p50/p90/p99 (ms)':>28} | {'監控物品 偵測/上架':>10} | {'監控物品 上架→偵測 p50/p90/p99':>28} | {'請求/偵測':>9} | {'429':>4}")
+    print("-" * 165)
+    for result in results:
+        requests_per = result["requests_per_detected"]
+        print(
+            f"{result['mode']:<10} | {result['arrived']:>5} | {result['detected']:>5} | {result['bought']:>5} | "
+            f"{_format_ms(result['listing_to_detection']):>28} | {_format_ms(result['detection_to_buy']):>28} | "
+            f"{len(result['watched_to_detection']):>5}/{result['watched_arrived']:<5} | {_format_ms(result['watched_to_detection']):>28} | "
+            f"{(f'{requests_per:.2f}' if requests_per is not None else 'N/A'):>9} | {result['throttled']:>4}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""監控清單比對效能測試
+
+比較原本逐一子字串比對與 WatchlistMatcher（Aho-Corasick）在不同規則數量下的每件物品比對時間。
+
+使用方式:
+    python benchmarks/matcher_bench.py
+    python benchmarks/matcher_bench.py --rules 10 100 1000 10000 --items 2000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matcher import WatchlistMatcher  # noqa: E402
+
+WORDS = [
+    "Golden", "Clover", "Belt", "Noble", "Ifia's", "Ring", "Crystal", "Ventus", "Badge",
+    "Arcane", "Umbra", "Hat", "Maple", "Leaf", "Condensed", "Power", "Black", "Bean",
+    "Mark", "Wisps", "Aquatic", "Letter", "Eye", "Accessory", "Absolab", "Cape", "Gloves",
+]
+
+
+def random_name(rng):
+    """產生類似市集物品名稱的隨機字串"""
+    words = rng.sample(WORDS, rng.randint(2, 4))
+    suffix = "".join(rng.choice(string.ascii_letters) for _ in range(rng.randint(0, 6)))
+    return " ".join(words + [suffix]).strip()
+
+
+def build_rules(count, rng):
+    """產生指定數量的監控規則，包含完整名稱與前綴片段"""
+    rules = {}
+    while len(rules) < count:
+        name = random_name(rng)
+        if rng.random() < 0.3:
+            name = name[: rng.randint(4, max(4, len(name) - 1))]
+        rules[name] = rng.choice([None, 100000, 200000, 380000])
+    return rules
+
+
+def naive_match(rules, name):
+    """原本的逐一子字串比對"""
+    return [pattern for pattern in rules if pattern in name]
+
+
+def bench(func, names):
+    start = time.perf_counter()
+    for name in names:
+        func(name)
+    return (time.perf_counter() - start) / len(names) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="監控清單比對效能測試")
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = [random_name(rng) for _ in range(args.items)]
+
+    print(f"{'規則數':>8} | {'編譯 (ms)':>10} | {'逐一比對 (us/件)':>16} | {'自動機 (us/件)':>14} | {'加速':>6}")
+    print("-" * 70)
+    for count in args.rules:
+        rules = build_rules(count, rng)
+
+        start = time.perf_counter()
+        matcher = WatchlistMatcher(rules)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        # 確認兩種方式結果一致
+        for name in names[:200]:
+            assert matcher.match(name) == naive_match(rules, name)
+
+        naive_us = bench(lambda name: naive_match(rules, name), names)
+        automaton_us = bench(matcher.match, names)
+        print(f"{count:>8} | {compile_ms:>10.1f} | {naive_us:>16.1f} | {automaton_us:>14.1f} | {naive_us / automaton_us:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""本地模擬市集伺服器
+
+實作監控程式使用到的 msu.io 端點，用於在不花錢、不被封鎖的情況下調整 buyer.py / api.py：
+
+    POST /marketplace/api/marketplace/explore/items
+    GET  /marketplace/api/marketplace/items/{tokenId}
+    POST /marketplace/api/marketplace/items/{tokenId}/buy
+    GET  /marketplace/api/marketplace/transaction/{transactionId}/result
+    POST /marketplace/api/gateway/v1/web/message
+    POST /marketplace/api/gateway/v1/web/signin-wallet
+    GET  /marketplace/api/gateway/bcbackend/next-meso/balance/{wallet}
+
+可設定上架速度（Poisson 到達）、回應延遲、429 比例及交易結算時間。
+
+單獨啟動:
+    python benchmarks/mock_market.py --port 8765 --rate 2
+之後把 config.MARKETPLACE_API_URL 改為 http://127.0.0.1:8765/marketplace/api 即可。
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+WEI_PER_ETHER = 10 ** 18
+PET_CATEGORY = 1000401001
+
+PET_SKILLS = [
+    "Magnet Effect", "Auto Buff", "Expanded Auto Move", "Auto Move", "Item Pouch",
+    "Auto HP Potion", "Auto MP Potion", "Fatten Up", "Ignore Item",
+]
+EQUIPMENT = [
+    # (名稱, 分類)
+    ("Golden Clover Belt", 1000201001),
+    ("Noble Ifia's Ring", 1000201002),
+    ("Crystal Ventus Badge", 1000201005),
+    ("Badge of Sengoku", 1000201005),
+    ("Gold Maple Leaf Emblem", 1000201006),
+    ("Condensed Power Crystal Earrings", 1000201003),
+    ("Aquatic Letter Eye Accessory", 1000201004),
+    ("Black Bean Mark", 1000201004),
+    ("Will o' the Wisps", 1000201003),
+    ("Arcane Umbra Hat", 1000101001),
+    ("Absolab Cape", 1000101005),
+    ("Pensalir Gloves", 1000101004),
+    ("Maple Pyrope Spear", 1000301001),
+    ("Utgard Bow", 1000301002),
+]
+
+# 與監控清單無關的大量上架（消耗品等），用來模擬其他分類擠滿最近上架的情況
+NOISE = [
+    ("Chaos Scroll 60%", 2000101001),
+    ("Power Elixir", 2000201001),
+    ("Mastery Book 20", 2000301001),
+]
+
+API_PREFIX = "/marketplace/api"
+
+
+def _fake_jwt(lifetime):
+    """產生帶有 exp 的假JWT（不驗證簽名）"""
+    def encode(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+    return f"{encode({'alg': 'none'})}.{encode({'exp': int(time.time() + lifetime)})}.mock"
+
+
+class MockMarket:
+    """模擬市集狀態：上架中的物品、交易及請求統計"""
+
+    def __init__(self, arrival_rate=1.0, pet_ratio=0.3, latency_ms=50, jitter_ms=20,
+                 throttle_rate=0.0, settle_seconds=1.5, balance=10_000_000, noise_ratio=0.0, seed=None):
+        """
+        Args:
+            arrival_rate: 每秒平均上架數量
+            pet_ratio: 上架物品中寵物的比例
+            latency_ms: 每個請求的基本延遲（毫秒）
+            jitter_ms: 延遲的隨機抖動（毫秒）
+            throttle_rate: 隨機回應 429 的比例
+            settle_seconds: 購買後交易從處理中變為完成的時間（秒）
+            balance: 錢包餘額（遊戲幣）
+            noise_ratio: 非寵物上架中與監控無關的消耗品比例
+            seed: 隨機種子
+        """
+        self.arrival_rate = arrival_rate
+        self.pet_ratio = pet_ratio
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.settle_seconds = settle_seconds
+        self.balance = balance
+        self.noise_ratio = noise_ratio
+        self.random = random.Random(seed)
+
+        self.listings = []  # 上架中的物品，由新到舊
+        self.details = {}  # tokenId -> 物品詳細資訊
+        self.listed_at = {}  # tokenId -> 上架時間 (time.monotonic)
+        self.buy_posted_at = {}  # tokenId -> 收到購買請求的時間
+        self.transactions = {}  # transactionId -> (tokenId, 完成時間)
+        self.requests = Counter()  # 端點 -> 請求數量
+        self.throttled = 0
+        self._next_token = 10 ** 30
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    # ---- 上架產生 ----
+
+    def add_listing(self):
+        """新增一筆隨機上架的物品"""
+        with self._lock:
+            self._next_token += self.random.randint(1, 1000)
+            token_id = str(self._next_token)
+            if self.random.random() < self.pet_ratio:
+                name, category = "Pet", PET_CATEGORY
+                skills = self.random.sample(PET_SKILLS, self.random.randint(0, 3))
+                price = self.random.choice([20000, 35000, 80000, 150000, 300000, 600000])
+                detail = {"pet": {"petSkills": skills}}
+            elif self.random.random() < self.noise_ratio:
+                name, category = self.random.choice(NOISE)
+                price = self.random.choice([1000, 5000, 20000])
+                detail = {}
+            else:
+                name, category = self.random.choice(EQUIPMENT)
+                price = self.random.choice([50000, 90000, 150000, 250000, 400000, 900000])
+                detail = {}
+            listing = {
+                "tokenId": token_id,
+                "name": name,
+                "categoryNo": category,
+                "salesInfo": {"priceWei": str(price * WEI_PER_ETHER)},
+            }
+            self.listings.insert(0, listing)
+            self.details[token_id] = {"tokenId": token_id, "name": name, **detail}
+            self.listed_at[token_id] = time.monotonic()
+        return listing
+
+    def start(self):
+        """啟動背景上架產生執行緒"""
+        threading.Thread(target=self._generate, name="mock-listings", daemon=True).start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _generate(self):
+        while not self._stop_event.is_set():
+            if self.arrival_rate <= 0:
+                self._stop_event.wait(0.5)
+                continue
+            if self._stop_event.wait(self.random.expovariate(self.arrival_rate)):
+                return
+            self.add_listing()
+
+    # ---- 端點處理 ----
+
+    def handle(self, method, path, body):
+        """處理請求
+
+        Returns:
+            (HTTP狀態碼, JSON內容, 額外標頭)
+        """
+        path = unquote(path.split("?", 1)[0])
+        if not path.startswith(API_PREFIX):
+            return 404, {"message": "not found"}, {}
+        path = path[len(API_PREFIX):]
+
+        endpoint = re.sub(r"/\d+(?=/|$)", "/{id}", path)
+        endpoint = re.sub(r"/transaction/[^/]+/", "/transaction/{id}/", endpoint)
+        endpoint = re.sub(r"/balance/[^/]+$", "/balance/{wallet}", endpoint)
+        with self._lock:
+            self.requests[f"{method} {endpoint}"] += 1
+
+        time.sleep(max(self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms), 0) / 1000)
+        if self.throttle_rate and self.random.random() < self.throttle_rate:
+            with self._lock:
+                self.throttled += 1
+            return 429, {"message": "Too Many Requests"}, {"Retry-After": "1"}
+
+        if method == "POST" and path == "/marketplace/explore/items":
+            return 200, self._explore(body), {}
+        if method == "POST" and path == "/gateway/v1/web/message":
+            return 200, {"message": f"Sign in to MSU mock: {self.random.getrandbits(64):x}"}, {}
+        if method == "POST" and path == "/gateway/v1/web/signin-wallet":
+            return 200, {"ok": True}, {"Set-Cookie": f"token={_fake_jwt(3600)}; Path=/"}
+        if method == "GET" and path.startswith("/gateway/bcbackend/next-meso/balance/"):
+            return 200, {"balance": str(self.balance * WEI_PER_ETHER)}, {}
+
+        match = re.fullmatch(r"/marketplace/items/(\d+)(/buy)?", path)
+        if match:
+            token_id, buy = match.groups()
+            if method == "POST" and buy:
+                return self._buy(token_id)
+            if method == "GET" and not buy:
+                detail = self.details.get(token_id)
+                if detail is None:
+                    return 404, {"message": "item not found"}, {}
+                return 200, {"item": detail}, {}
+
+        match = re.fullmatch(r"/marketplace/transaction/([^/]+)/result", path)
+        if method == "GET" and match:
+            transaction = self.transactions.get(match.group(1))
+            if transaction is None:
+                return 200, {"code": 3}, {}
+            return 200, {"code": 2 if time.monotonic() >= transaction[1] else 1}, {}
+
+        return 404, {"message": "not found"}, {}
+
+    def _explore(self, body):
+        filters = body.get("filter", {})
+        pagination = body.get("paginationParam", {})
+        page_no = int(pagination.get("pageNo", 1))
+        page_size = int(pagination.get("pageSize", 20))
+        category = filters.get("categoryNo") or 0
+        name = (filters.get("name") or "").lower()
+
+        with self._lock:
+            items = [
+                item for item in self.listings
+                if (not category or item["categoryNo"] == category)
+                and (not name or name in item["name"].lower())
+            ]
+        if body.get("sorting") == "ExploreSorting_LOWEST_PRICE":
+            items.sort(key=lambda item: int(item["salesInfo"]["priceWei"]))
+
+        start = (page_no - 1) * page_size
+        return {
+            "items": items[start:start + page_size],
+            "paginationResult": {"totalCount": len(items), "pageNo": page_no, "pageSize": page_size},
+        }
+
+    def _buy(self, token_id):
+        now = time.monotonic()
+        with self._lock:
+            self.buy_posted_at.setdefault(token_id, now)
+            listing = next((item for item in self.listings if item["tokenId"] == token_id), None)
+            if listing is None:
+                return 400, {"message": "item is not on sale"}, {}
+            self.listings.remove(listing)
+            price = int(listing["salesInfo"]["priceWei"]) // WEI_PER_ETHER
+            self.balance -= price
+            transaction_id = f"tx:{token_id}"
+            self.transactions[transaction_id] = (token_id, now + self.settle_seconds)
+        return 200, {"transactionId": transaction_id}, {}
+
+
+def create_server(market, host="127.0.0.1", port=0):
+    """建立綁定到模擬市集的 HTTP 伺服器（port=0 表示自動選擇）"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _respond(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            try:
+                body = json.loads(raw) if raw else {}
+            except json.JSONDecodeError:
+                body = {}
+            status, payload, headers = market.handle(method, self.path, body)
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._respond("GET")
+
+        def do_POST(self):
+            self._respond("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模擬市集伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate", type=float, default=1.0, help="每秒平均上架數量")
+    parser.add_argument("--pet-ratio", type=float, default=0.3, help="寵物所佔比例")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--throttle", type=float, default=0.0, help="隨機回應 429 的比例")
+    parser.add_argument("--settle", type=float, default=1.5, help="交易結算秒數")
+    parser.add_argument("--noise", type=float, default=0.0, help="非寵物上架中與監控無關的消耗品比例")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    market = MockMarket(
+        arrival_rate=args.rate, pet_ratio=args.pet_ratio, latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms, throttle_rate=args.throttle, settle_seconds=args.settle,
+        noise_ratio=args.noise, seed=args.seed,
+    )
+    server = create_server(market, args.host, args.port)
+    market.start()
+    print(f"模擬市集已啟動: http://{args.host}:{server.server_port}{API_PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        market.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
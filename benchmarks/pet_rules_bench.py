@@ -0,0 +1,82 @@
+"""寵物規則比對效能測試
+
+比較原本依序以 issubset 掃描 PET_FILTERS 與 PetRuleMatcher（技能位元遮罩加索引）在不同規則數量下的每隻寵物比對時間。
+
+使用方式:
+    python benchmarks/pet_rules_bench.py
+    python benchmarks/pet_rules_bench.py --rules 10 100 1000 10000 --pets 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matcher import PetRuleMatcher  # noqa: E402
+
+SKILLS = [
+    "Magnet Effect", "Auto Buff", "Expanded Auto Move", "Auto Move", "Auto HP Potion",
+    "Auto MP Potion", "Item Pouch", "Fatten Up", "Pet Training Skill", "Auto Loot",
+    "Expanded Range", "Ignore Items", "Auto Feed", "Speedy", "Cheerful",
+]
+# 加上等級變化，模擬實際技能名稱的數量
+SKILLS += [f"{skill} Lv.{level}" for skill in SKILLS[:10] for level in (2, 3, 4)]
+
+
+def build_rules(count, rng):
+    """產生指定數量的 [{技能}, 價格上限] 規則（2~3個技能），最後加上一條沒有技能的規則"""
+    rules = []
+    for _ in range(count - 1):
+        rules.append([set(rng.sample(SKILLS, rng.randint(2, 3))), rng.choice([None, 40000, 200000, 385501])])
+    rules.append([set(), 40000])
+    return rules
+
+
+def naive_match(rules, pet_skills):
+    """原本的依序 issubset 掃描，返回第一條符合的規則位置"""
+    for index, rule in enumerate(rules):
+        if rule[0].issubset(pet_skills):
+            return index
+    return None
+
+
+def bench(func, pets):
+    start = time.perf_counter()
+    for skills in pets:
+        func(skills)
+    return (time.perf_counter() - start) / len(pets) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="寵物規則比對效能測試")
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--pets", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pets = [set(rng.sample(SKILLS, 3)) for _ in range(args.pets)]
+
+    print(f"{'規則數':>8} | {'編譯 (ms)':>10} | {'逐一比對 (us/隻)':>16} | {'位元遮罩 (us/隻)':>16} | {'加速':>6}")
+    print("-" * 72)
+    for count in args.rules:
+        rules = build_rules(count, rng)
+
+        start = time.perf_counter()
+        matcher = PetRuleMatcher(rules)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        # 確認兩種方式選到同一條規則
+        for skills in pets[:200]:
+            rule = matcher.match(skills)
+            assert (rule.order if rule else None) == naive_match(rules, skills)
+
+        naive_us = bench(lambda skills: naive_match(rules, skills), pets)
+        matcher_us = bench(matcher.match, pets)
+        print(f"{count:>8} | {compile_ms:>10.1f} | {naive_us:>16.1f} | {matcher_us:>16.1f} | {naive_us / matcher_us:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
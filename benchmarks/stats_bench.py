@@ -0,0 +1,137 @@
+"""價格統計效能測試
+
+比較原本逐筆轉為 Decimal 的 compute_price_stats 與整數 Wei 批次統計（price_stats.compute_price_stats_batch），
+並確認兩者的結果完全相同。
+
+使用方式:
+    python benchmarks/stats_bench.py
+    python benchmarks/stats_bench.py --items 50 --listings 100 1000 10000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import ROUND_HALF_UP, Decimal
+from statistics import mean, median
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_stats import WEI_PER_ETHER, compute_price_stats_batch  # noqa: E402
+
+# 與批次結果比較的原有欄位
+COMPARED_KEYS = [
+    "lowest_price", "second_lowest_price", "avg_price", "median_price",
+    "price_gap_percent", "median_discount_percent", "avg_discount_percent", "should_buy",
+]
+
+
+def decimal_price_stats(items: list):
+    """原本以 Decimal 逐筆計算的版本（作為正確性及效能的基準）"""
+    prices = []
+    for item in items:
+        price_wei_str = item.get("salesInfo", {}).get("priceWei")
+        if price_wei_str:
+            price_wei = Decimal(price_wei_str)
+            price_ether = (price_wei / WEI_PER_ETHER).quantize(
+                Decimal("0.000000000000000001"), rounding=ROUND_HALF_UP
+            )
+            prices.append(price_ether)
+
+    if not prices:
+        return None
+
+    prices.sort()
+
+    lowest_price = prices[0]
+    second_lowest_price = prices[1] if len(prices) > 1 else None
+    avg_price = Decimal(mean(prices)) if prices else Decimal("0")
+    median_price = Decimal(median(prices)) if prices else Decimal("0")
+
+    price_gap_percent = None
+    if second_lowest_price:
+        price_gap_percent = (
+            (second_lowest_price - lowest_price) / second_lowest_price * 100
+        ).quantize(Decimal("0.01"))
+
+    median_discount_percent = None
+    if median_price > 0:
+        median_discount_percent = (
+            (median_price - lowest_price) / median_price * 100
+        ).quantize(Decimal("0.01"))
+
+    avg_discount_percent = None
+    if avg_price > 0:
+        avg_discount_percent = ((avg_price - lowest_price) / avg_price * 100).quantize(
+            Decimal("0.01")
+        )
+
+    should_buy = False
+    if price_gap_percent and median_discount_percent:
+        if price_gap_percent > 10 and median_discount_percent > 20:
+            should_buy = True
+
+    return {
+        "lowest_price": lowest_price,
+        "second_lowest_price": second_lowest_price,
+        "avg_price": avg_price,
+        "median_price": median_price,
+        "price_gap_percent": price_gap_percent,
+        "median_discount_percent": median_discount_percent,
+        "avg_discount_percent": avg_discount_percent,
+        "should_buy": should_buy,
+    }
+
+
+def random_listings(rng, count):
+    """產生隨機價格的市集物品，大多是整數遊戲幣，少數帶有小數"""
+    listings = []
+    for _ in range(count):
+        if rng.random() < 0.05:
+            price_wei = rng.randint(1, 10 ** 24)
+        else:
+            price_wei = rng.randint(1000, 5_000_000) * 10 ** 18
+        listings.append({"salesInfo": {"priceWei": str(price_wei)}})
+    return listings
+
+
+def check_equal(expected, actual):
+    """確認兩種計算方式的結果（包含字串表示）完全相同"""
+    for name, stats in expected.items():
+        if stats is None or actual[name] is None:
+            assert stats is actual[name], name
+            continue
+        for key in COMPARED_KEYS:
+            assert str(stats[key]) == str(actual[name][key]), (name, key, stats[key], actual[name][key])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="價格統計效能測試")
+    parser.add_argument("--items", type=int, default=50, help="同時統計的物品數量")
+    parser.add_argument("--listings", type=int, nargs="+", default=[100, 1000, 10000], help="每個物品的上架數量")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'上架/物品':>10} | {'Decimal (ms)':>12} | {'批次 (ms)':>10} | {'加速':>6}")
+    print("-" * 50)
+    for listings in args.listings:
+        items_by_name = {f"item-{index}": random_listings(rng, listings) for index in range(args.items)}
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            expected = {name: decimal_price_stats(items) for name, items in items_by_name.items()}
+        decimal_ms = (time.perf_counter() - start) / args.repeat * 1000
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            actual = compute_price_stats_batch(items_by_name)
+        batch_ms = (time.perf_counter() - start) / args.repeat * 1000
+
+        check_equal(expected, actual)
+        print(f"{listings:>10} | {decimal_ms:>12.1f} | {batch_ms:>10.1f} | {decimal_ms / batch_ms:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,235 +1,554 @@
+import logging
+import os
+import threading
 import time
-from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 import config
-from api import fetch_all_pets, get_singal_pet_skill_info, buy_item_api, query_equipment_batch
+from api import (
+    fetch_all_pets, get_singal_pet_skill_info, query_equipment_batch, submit_buy_order, wait_for_transaction,
+    get_wallet_pool, get_default_wallet, TX_SUCCESS, TX_FAILED,
+)
+from dedup import SeenIdStore
+from feed import FeedReader
+from listing import to_wei
+from log import fields, get_logger
+from matcher import PetRuleMatcher, WatchlistMatcher
+from metrics import observe_listing_age
+from price_history import open_price_history
+from ratelimit import AdaptivePollInterval
 
-def auto_buy_pet():
-    """自動購買寵物"""
-    print("開始自動購買寵物模式")
-
-    # 更新並顯示當前錢包餘額
-    config.update_wallet_balance()
-    
-    # 顯示篩選條件
-    print("\n寵物篩選條件:")
-    print("┌─────────────────────────────────┬───────────┐")
-    print("│ 技能組合                        │ 價格上限  │")
-    print("├─────────────────────────────────┼───────────┤")
-    for filter_set in config.PET_FILTERS:
-        skills = ", ".join(filter_set[0]) if filter_set[0] else "None"
-        price_limit = filter_set[1] if filter_set[1] is not None else config.WALLET_BALANCE
-        print(f"│ {skills:<31} │ {price_limit:<9} │")
-    print("└─────────────────────────────────┴───────────┘\n")
-    
-    # 上次擷取到的寵物ID集合，用於追蹤已處理過的寵物
-    processed_pet_ids = set()
-
-    while True:
-        try:
-            all_pets_list = fetch_all_pets()
-            # 沒有擷取到值時跳過當次迴圈
-            if all_pets_list is None:
+logger = get_logger("buyer")
+
+# 符合條件時的紀錄（只在符合時格式化一次）
+_PET_FOUND = "\n".join([
+    "發現高價值寵物!", "ID: %s", "價格: %s (上限: %s)", "技能: %s",
+    "連結: https://msu.io/marketplace/nft/%s",
+])
+_ITEM_FOUND = "\n".join([
+    "發現符合條件的裝備!", "名稱: %s", "價格: %s (上限: %s)", "符合規則: %s",
+    "連結: https://msu.io/marketplace/nft/%s",
+])
+_WATCHLIST_BORDER_TOP = "┌─────────────────────────────────┬───────────┐"
+_WATCHLIST_BORDER_MID = "├─────────────────────────────────┼───────────┤"
+_WATCHLIST_BORDER_BOTTOM = "└─────────────────────────────────┴───────────┘"
+
+
+def _format_watchlist(title, header, rows):
+    """把監控清單排成表格（單一紀錄）"""
+    lines = [title, _WATCHLIST_BORDER_TOP, header, _WATCHLIST_BORDER_MID]
+    lines += [f"│ {name:<31} │ {price_limit:<9} │" for name, price_limit in rows]
+    lines.append(_WATCHLIST_BORDER_BOTTOM)
+    return "\n".join(lines)
+
+
+# 寵物技能查詢的執行緒池，讓同一批新寵物的查詢同時進行
+_PET_LOOKUP_POOL = ThreadPoolExecutor(max_workers=config.PET_LOOKUP_WORKERS, thread_name_prefix="pet-lookup")
+
+
+def _create_seen_store(feed_name):
+    """建立指定來源的已處理ID儲存，並載入上次的快照"""
+    return SeenIdStore(
+        capacity=config.DEDUP_CAPACITY,
+        ttl=config.DEDUP_TTL,
+        path=os.path.join(config.STATE_DIR, f"seen_{feed_name}.json"),
+    )
+
+
+def _open_price_history():
+    """取得共用的價格歷史紀錄，未啟用時返回None"""
+    if not config.PRICE_HISTORY_ENABLED:
+        return None
+    return open_price_history(
+        os.path.join(config.STATE_DIR, config.PRICE_HISTORY_FILE),
+        batch_size=config.PRICE_HISTORY_BATCH_SIZE,
+        flush_interval=config.PRICE_HISTORY_FLUSH_INTERVAL,
+        retention=(
+            config.PRICE_HISTORY_RETENTION_DAYS * 24 * 60 * 60
+            if config.PRICE_HISTORY_RETENTION_DAYS is not None else None
+        ),
+    )
+
+
+def spendable_balance():
+    """單一錢包目前最多能花費的遊戲幣（讀取本地帳本，不呼叫API）"""
+    return get_wallet_pool().max_available()
+
+
+def buy_now(token_id, price_wei, label, detected_at=None, on_result=None):
+    """同步購買並等待交易結果（未使用購買流程時的預設購買方式）
+
+    Args:
+        on_result: 交易結果確定後呼叫 on_result(狀態)，狀態為 TX_SUCCESS、TX_FAILED、TX_TIMEOUT 或 TX_UNKNOWN
+    """
+    transaction_id = submit_buy_order(token_id, price_wei, detected_at=detected_at)
+    result = wait_for_transaction(transaction_id) if transaction_id is not None else TX_FAILED
+    if on_result is not None:
+        on_result(result)
+    if result == TX_SUCCESS:
+        logger.info("已成功購買 %s", label, extra=fields(token_id=token_id))
+    if result != TX_FAILED:
+        # 購買成功或結果未知時在本地帳本扣款，由背景對帳校正
+        get_wallet_pool().debit(get_default_wallet(), int(price_wei))
+
+
+class PetMonitor:
+    """寵物監控：每次 poll_once 擷取最新上架的寵物，並依 PET_FILTERS 判斷是否購買"""
+
+    name = "pet"
+
+    def __init__(self, buy=None):
+        """
+        Args:
+            buy: 購買函數，簽名為 buy(token_id, price_wei, label, detected_at, on_result=None)，預設為同步的 buy_now
+        """
+        self.buy = buy or buy_now
+        # 已處理過的寵物ID，依加入順序淘汰並快照到磁碟
+        self.processed_pet_ids = _create_seen_store(self.name)
+        # 依水位線翻頁讀取最近上架的寵物
+        self.feed = FeedReader(fetch_all_pets, max_page_size=config.PET_PAGE_SIZE)
+        # 紀錄每次查詢到的寵物價格
+        self.price_history = _open_price_history()
+        # 將篩選條件編譯成技能位元遮罩規則
+        self.rules = PetRuleMatcher(config.PET_FILTERS)
+        # 重新載入的監控設定，在下一次查詢開始前套用
+        self._pending_watch = None
+        # 技能查詢的執行緒同時讀取規則，規則及排入的設定的替換以此鎖保護
+        self._lock = threading.Lock()
+
+    def reload(self, watch):
+        """排入新的監控設定 (WatchConfig)，在下一次查詢開始前套用，不會中斷進行中的查詢"""
+        with self._lock:
+            self._pending_watch = watch
+
+    def apply_pending_watch(self):
+        """套用排入的監控設定，有套用時返回True"""
+        if self._pending_watch is None:
+            return False
+        with self._lock:
+            watch, self._pending_watch = self._pending_watch, None
+            if watch is None:
+                return False
+            rules = watch.pet_rules
+            # 相同條件的規則沿用已花費的預算
+            rules.carry_over(self.rules)
+            self.rules = rules
+        return True
+
+    def print_watchlist(self):
+        """顯示篩選條件"""
+        balance = spendable_balance()
+        # 依比對時的優先順序顯示
+        rows = [
+            (rule.describe(), rule.price_limit if rule.price_limit is not None else balance)
+            for rule in self.rules.rules
+        ]
+        logger.info(_format_watchlist("寵物篩選條件:", "│ 技能組合                        │ 價格上限  │", rows))
+
+    def shards(self):
+        """查詢中的來源分片（寵物只有單一來源）"""
+        return [None]
+
+    def poll_interval(self, shard=None):
+        """建立來源分片的查詢間隔調整器"""
+        return AdaptivePollInterval()
+
+    def poll_once(self, shard=None):
+        """執行一次查詢並處理新上架的寵物
+
+        Args:
+            shard: 來源分片，寵物只有單一來源，固定為None
+
+        Returns:
+            本次處理的新寵物數量，查詢失敗時返回None
+        """
+        if self.apply_pending_watch():
+            logger.info("已套用新的寵物篩選條件")
+            self.print_watchlist()
+        all_pets_list = self.feed.poll()
+        # 沒有擷取到值時跳過本次查詢
+        if all_pets_list is None:
+            return None
+        if self.price_history is not None:
+            self.price_history.record(all_pets_list)
+
+        # 找出新寵物（當前批次中但不在已處理集合中的寵物）
+        new_pet_ids = {pet.token_id for pet in all_pets_list if pet.token_id not in self.processed_pet_ids}
+        if not new_pet_ids:
+            return 0
+
+        new_pets = [pet for pet in all_pets_list if pet.token_id in new_pet_ids]
+        # 將新寵物ID添加到已處理集合
+        self.processed_pet_ids.update(new_pet_ids)
+        for pet in new_pets:
+            observe_listing_age(self.name, pet.listed_at)
+
+        # 同時查詢所有新寵物的技能，先回來的先判斷，符合條件時立即購買
+        lookups = {
+            _PET_LOOKUP_POOL.submit(get_singal_pet_skill_info, pet.token_id): pet
+            for pet in new_pets
+        }
+        for future in as_completed(lookups):
+            pet = lookups[future]
+            try:
+                skill_info = future.result()
+            except Exception as e:
+                logger.warning("查詢寵物技能時發生錯誤 (ID: %s): %s", pet.token_id, e)
                 continue
-            else:
-                all_pets_list = all_pets_list["items"]
-                
-            # 檢查是否有新寵物
-            has_new_pets = False
-            current_pet_ids = {pet["tokenId"] for pet in all_pets_list}
-            
-            # 找出新寵物（當前批次中但不在已處理集合中的寵物）
-            new_pet_ids = current_pet_ids - processed_pet_ids
-            if new_pet_ids:
-                has_new_pets = True
-            
-            # 如果沒有新寵物，等待下一次查詢
-            if not has_new_pets:
-                time.sleep(8)
+            if skill_info is None:
+                # 沒有擷取到值時跳過當前寵物
                 continue
-                
-            for pet in all_pets_list:
-                tokenId = pet["tokenId"]
-                
-                # 跳過已處理的寵物
-                if tokenId in processed_pet_ids:
-                    continue
-                    
-                # 將當前寵物ID添加到已處理集合
-                processed_pet_ids.add(tokenId)
-                
-                skill_info = get_singal_pet_skill_info(tokenId)
-                if skill_info is None:
-                    # 沒有擷取到值時跳過當前寵物
-                    continue
-
-                pet_skills = set(skill_info)
-                # 格式化顯示寵物技能
-                skills_text = ", ".join(pet_skills)
-                if len(skills_text) > 40:
-                    skills_text = skills_text[:37] + "..."
-                print(f"寵物ID: {tokenId:<10} | 技能: {skills_text:<40}")
-                
-                for filter_set in config.PET_FILTERS:
-                    # 檢查 filter_set 是否在 pet_skills 中
-                    if filter_set[0].issubset(pet_skills):
-                        price = Decimal(pet["salesInfo"]["priceWei"]) / config.WEI_PER_ETHER
-                        # 使用指定價格上限或當前錢包餘額
-                        price_limit = filter_set[1] if filter_set[1] is not None else config.WALLET_BALANCE
-                        
-                        print(f"匹配條件: {', '.join(filter_set[0]) if filter_set[0] else '無技能':<20} | 價格: {price:<8} | 上限: {price_limit:<8}")
-                        
-                        rounded_price = round(price, 1)
-                        if rounded_price <= price_limit:
-                            print("-" * 70)
-                            print(f"發現高價值寵物!")
-                            print(f"ID: {tokenId}")
-                            print(f"價格: {price} (上限: {price_limit})")
-                            print(f"技能: {', '.join(pet_skills)}")
-                            print(f"連結: https://msu.io/marketplace/nft/{tokenId}")
-                            
-                            # 檢查餘額是否足夠
-                            if config.WALLET_BALANCE < price:
-                                print(f"餘額不足！當前餘額: {config.WALLET_BALANCE:,}，需要: {price:,}")
-                                print("交易已跳過")
-                                print("-" * 70)
-                                break
-                                
-                            print("-" * 70)
-                    
-                            result = buy_item_api(tokenId, pet["salesInfo"]["priceWei"])
-                            if result:
-                                print(f"已成功購買寵物 (ID: {tokenId})")
-                                # 購買成功後更新錢包餘額
-                                config.update_wallet_balance()
-                            break
-
-                time.sleep(0.1)
-            
-            # 控制已處理寵物ID集合大小，避免無限增長
-            if len(processed_pet_ids) > 1000:
-                # 只保留最近500個處理過的ID
-                processed_pet_ids = set(list(processed_pet_ids)[-500:])
-                
-            time.sleep(8)
-        except KeyboardInterrupt:
-            print("程式被手動中斷")
-            break
-        except Exception as e:
-            print(f"發生錯誤: {e}")
-            time.sleep(5)
-            continue
 
-def auto_buy_multiple_equipment():
-    """自動監測多個裝備，使用config中的EQUIPMENT_MONITOR_LIST"""
-    equipment_list = list(config.EQUIPMENT_MONITOR_LIST.keys())
-    
-    print(f"開始自動監測多裝備模式: 監測 {len(equipment_list)} 個裝備")
-    
-    # 更新並顯示當前錢包餘額
-    config.update_wallet_balance()
-    
-    # 顯示監控的裝備和價格上限
-    equipment_price_limits = {
-        name: price if price is not None else config.WALLET_BALANCE 
-        for name, price in config.EQUIPMENT_MONITOR_LIST.items()
-    }
-    
-    # 格式化顯示監控的裝備和價格上限
-    print("\n監控裝備清單:")
-    print("┌─────────────────────────────────┬───────────┐")
-    print("│ 裝備名稱                        │ 價格上限  │")
-    print("├─────────────────────────────────┼───────────┤")
-    for name, price in equipment_price_limits.items():
-        print(f"│ {name:<31} │ {price:<9} │")
-    print("└─────────────────────────────────┴───────────┘\n")
-    
-    # 已處理裝備ID集合，用於追蹤已處理過的裝備
-    processed_item_ids = set()
-    
-    while True:
+            # 單隻寵物判斷或購買失敗時只跳過該寵物，繼續判斷同一批的其他寵物
+            try:
+                self._evaluate_pet(pet, skill_info)
+            except Exception as e:
+                logger.error("判斷寵物時發生錯誤 (ID: %s): %s", pet.token_id, e, extra=fields(token_id=pet.token_id))
+
+        return len(new_pet_ids)
+
+    def save_state(self):
+        """把已處理ID快照到磁碟（由監控引擎在背景定期呼叫及停止時呼叫，不在查詢途中寫入）"""
+        self.processed_pet_ids.save()
+
+    def _evaluate_pet(self, pet, skill_info):
+        """依編譯後的 PET_FILTERS 規則判斷單隻寵物，符合條件時購買"""
+        detected_at = time.perf_counter()
+        # 整次判斷使用同一組規則，判斷途中重新載入設定也不會混用新舊規則
+        rules = self.rules
+        tokenId = pet.token_id
+        pet_skills = set(skill_info)
+        balance = spendable_balance()
+        # 每隻寵物的判斷過程只在 DEBUG 等級格式化
+        if logger.isEnabledFor(logging.DEBUG):
+            skills_text = ", ".join(pet_skills)
+            if len(skills_text) > 40:
+                skills_text = skills_text[:37] + "..."
+            logger.debug("寵物ID: %-10s | 技能: %-40s", tokenId, skills_text)
+
+        # 以技能遮罩找出優先度最高、價格不超過上限（None則使用當前錢包餘額）且預算足夠的規則，
+        # 價格超過某條規則的上限時會繼續比對下一條規則（以整數 Wei 比較，不會有小數誤差）
+        rule = rules.match(pet_skills, pet.price_wei, to_wei(balance))
+        if rule is None:
+            return
+
+        price = pet.price_ether
+        # 使用指定價格上限或當前錢包餘額
+        price_limit = rule.price_limit if rule.price_limit is not None else balance
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("匹配條件: %-20s | 價格: %-8s | 上限: %-8s", rule.describe(), price, price_limit)
+
+        found = fields(token_id=tokenId, price=price, price_limit=price_limit, rule=rule.describe())
+        logger.info(_PET_FOUND, tokenId, price, price_limit, ", ".join(pet_skills), tokenId, extra=found)
+
+        # 檢查餘額是否足夠
+        if to_wei(balance) < pet.price_wei:
+            logger.warning("餘額不足！當前餘額: %s，需要: %s，交易已跳過", f"{balance:,}", f"{price:,}", extra=found)
+            return
+
+        # 送出購買前扣除規則預算，購買失敗時退回
+        if not rules.claim(rule, pet.price_wei):
+            logger.warning("規則 %s 的預算已用完，交易已跳過", rule.describe(), extra=found)
+            return
+
+        on_result = partial(self._on_buy_result, rule, pet.price_wei)
         try:
-            # 獲取最新裝備列表
-            all_items = query_equipment_batch()
-            if all_items:
-                all_items = all_items["items"]
-            else:
-                # 如果沒有裝備，則等待下一次查詢
-                time.sleep(8)
-                continue
-                
-            # 檢查是否有新裝備
-            has_new_items = False
-            current_item_ids = {item["tokenId"] for item in all_items}
-            
-            # 找出新裝備（當前批次中但不在已處理集合中的裝備）
-            new_item_ids = current_item_ids - processed_item_ids
-            if new_item_ids:
-                has_new_items = True
-            
-            # 如果沒有新裝備，等待下一次查詢
-            if not has_new_items:
-                time.sleep(8)
+            self.buy(tokenId, pet.price_wei, f"寵物 (ID: {tokenId})", detected_at, on_result=on_result)
+        except Exception:
+            rules.refund(rule, pet.price_wei)
+            raise
+
+    def _on_buy_result(self, rule, price_wei, state):
+        """購買結果確定後呼叫，確定失敗時把金額退回規則預算（結果未知時視為已花費）"""
+        if state == TX_FAILED:
+            self.rules.refund(rule, price_wei)
+
+
+class EquipmentMonitor:
+    """多裝備監控：每次 poll_once 擷取最新上架的裝備，並依 EQUIPMENT_MONITOR_LIST 判斷是否購買
+
+    只查詢監控裝備所屬的分類，每個分類是一個來源分片（各自的水位線及每頁數量），
+    由監控引擎分別排程同時查詢，結果以共用的已處理ID合併去重。
+    """
+
+    name = "equipment"
+
+    def __init__(self, buy=None):
+        """
+        Args:
+            buy: 購買函數，簽名為 buy(token_id, price_wei, label, detected_at, on_result=None)，預設為同步的 buy_now
+        """
+        self.buy = buy or buy_now
+        self.equipment_list = list(config.EQUIPMENT_MONITOR_LIST.keys())
+        # 將監控清單編譯成多關鍵字比對器，每個物品名稱只需掃描一次
+        self.matcher = WatchlistMatcher(config.EQUIPMENT_MONITOR_LIST)
+        # 已處理過的裝備ID，所有分類來源共用，依加入順序淘汰並快照到磁碟
+        self.processed_item_ids = _create_seen_store(self.name)
+        # 紀錄每次查詢到的裝備價格，也用來推斷監控裝備的分類
+        self.price_history = _open_price_history()
+        # 依水位線翻頁讀取最近上架的裝備：分類編號 -> FeedReader，None為不分分類的來源
+        self.feeds = {}
+        self.rule_categories = {}  # 監控關鍵字 -> 分類編號集合
+        self.unresolved = set()  # 分類不確定完整、仍由不分分類的來源查詢的監控關鍵字
+        self._explicit_categories = config.EQUIPMENT_CATEGORIES
+        # 從價格歷史紀錄及不分分類的來源學到的 監控關鍵字 -> 分類編號集合，
+        # 只在載入監控清單時查詢一次價格歷史，之後依新上架的物品逐步加入
+        self._learned_categories = self._history_categories(self.matcher)
+        # 各分類來源在不同執行緒同時查詢，分片及監控設定的替換以此鎖保護
+        self._lock = threading.Lock()
+        self._assign_feeds()
+        # 重新載入的監控設定，在下一次查詢開始前套用
+        self._pending_watch = None
+
+    def _history_categories(self, matcher):
+        """以價格歷史紀錄中出現過的物品名稱推斷每個監控關鍵字的分類
+
+        只查詢一次所有 (名稱, 分類) 組合，再以編譯後的比對器比對名稱，
+        不會為每個關鍵字各掃描一次資料表。
+
+        Returns:
+            {監控關鍵字: 分類編號集合}
+        """
+        learned = {}
+        if self.price_history is None or not config.EQUIPMENT_CATEGORY_FEEDS:
+            return learned
+        for name, category in self.price_history.name_categories():
+            for pattern in matcher.match(name):
+                learned.setdefault(pattern, set()).add(category)
+        return learned
+
+    def _resolve_categories(self, pattern):
+        """監控關鍵字所屬的分類及是否確定完整：設定中指定的分類為完整，學到的分類則不一定
+
+        Returns:
+            (分類編號集合, 是否完整)，都沒有時為空集合
+        """
+        explicit = self._explicit_categories.get(pattern)
+        if explicit:
+            return (set(explicit) if isinstance(explicit, (list, tuple, set)) else {explicit}), True
+        learned = self._learned_categories.get(pattern, set())
+        return learned, bool(learned) and config.EQUIPMENT_TRUST_LEARNED_CATEGORIES
+
+    def _assign_feeds(self):
+        """依監控清單決定要查詢的來源分片，保留仍在使用的來源（及其水位線）（呼叫前需持有鎖）"""
+        rule_categories = {}
+        unresolved = set()
+        for pattern in self.matcher.patterns:
+            categories, complete = self._resolve_categories(pattern) if config.EQUIPMENT_CATEGORY_FEEDS else (set(), False)
+            if categories:
+                rule_categories[pattern] = categories
+            if not complete:
+                unresolved.add(pattern)
+        self.rule_categories = rule_categories
+        self.unresolved = unresolved
+
+        shards = set().union(*rule_categories.values())
+        # 有分類不確定完整的關鍵字（或沒有任何分類）時保留不分分類的來源
+        if self.unresolved or not shards:
+            shards.add(None)
+
+        feeds = {}
+        for shard in shards:
+            feed = self.feeds.get(shard)
+            if feed is None:
+                if shard is None:
+                    feed = FeedReader(query_equipment_batch, max_page_size=config.EQUIPMENT_PAGE_SIZE)
+                else:
+                    feed = FeedReader(
+                        partial(query_equipment_batch, category_no=shard),
+                        max_page_size=config.EQUIPMENT_CATEGORY_PAGE_SIZE,
+                    )
+            feeds[shard] = feed
+        self.feeds = feeds
+
+    def shards(self):
+        """查詢中的來源分片：分類編號，None為不分分類的來源"""
+        with self._lock:
+            return list(self.feeds)
+
+    def poll_interval(self, shard=None):
+        """建立來源分片的查詢間隔調整器
+
+        單一分類的上架速度較慢，分類來源從最短間隔開始，並以較小的每次新物品數量為目標，
+        避免還沒估計出上架速度前就拉長間隔
+        """
+        if shard is None:
+            return AdaptivePollInterval()
+        return AdaptivePollInterval(
+            initial=config.POLL_INTERVAL_MIN, target_per_poll=config.EQUIPMENT_CATEGORY_TARGET_PER_POLL,
+        )
+
+    def reload(self, watch):
+        """排入新的監控設定 (WatchConfig)，在下一次查詢開始前套用，不會中斷進行中的查詢"""
+        with self._lock:
+            self._pending_watch = watch
+
+    def apply_pending_watch(self):
+        """套用排入的監控設定並重新分配來源分片，有套用時返回True"""
+        if self._pending_watch is None:
+            return False
+        with self._lock:
+            watch, self._pending_watch = self._pending_watch, None
+        if watch is None:
+            return False
+        # 在鎖外查詢價格歷史，不阻塞其他分類來源
+        learned = self._history_categories(watch.equipment_matcher)
+        with self._lock:
+            # 保留查詢期間從不分分類的來源學到、新監控清單仍有的分類
+            for pattern, categories in self._learned_categories.items():
+                if pattern in watch.equipment_matcher.rules:
+                    learned.setdefault(pattern, set()).update(categories)
+            self.equipment_list = list(watch.equipment.keys())
+            self.matcher = watch.equipment_matcher
+            self._explicit_categories = watch.equipment_categories
+            self._learned_categories = learned
+            self._assign_feeds()
+        return True
+
+    def _learn_category(self, item):
+        """從不分分類的來源學習監控關鍵字出現過的分類，並新增該分類的來源
+
+        只處理名稱符合、且這個分類還沒學過的關鍵字，大多數物品不需要取得鎖或重新分配來源。
+        """
+        if item.category is None:
+            return
+        learned = self._learned_categories
+        patterns = [
+            pattern for pattern in self.matcher.match(item.name)
+            if pattern in self.unresolved and item.category not in learned.get(pattern, ())
+        ]
+        if not patterns:
+            return
+        with self._lock:
+            for pattern in patterns:
+                self._learned_categories.setdefault(pattern, set()).add(item.category)
+            self._assign_feeds()
+            categories = sorted(shard for shard in self.feeds if shard is not None)
+        logger.info(
+            "監控裝備 %s 出現在分類 %s，目前查詢分類: %s",
+            ", ".join(patterns), item.category, ", ".join(map(str, categories)),
+        )
+
+    def print_watchlist(self):
+        """顯示監控的裝備和價格上限"""
+        with self._lock:
+            equipment_list, matcher = self.equipment_list, self.matcher
+        logger.info("監測 %d 個裝備", len(equipment_list))
+        balance = spendable_balance()
+        equipment_price_limits = [
+            (name, price if price is not None else balance)
+            for name, price in matcher.rules.items()
+        ]
+
+        # 格式化顯示監控的裝備和價格上限
+        logger.info(_format_watchlist("監控裝備清單:", "│ 裝備名稱                        │ 價格上限  │", equipment_price_limits))
+
+        with self._lock:
+            categories = sorted(shard for shard in self.feeds if shard is not None)
+            unresolved = sorted(self.unresolved)
+        if categories:
+            logger.info("查詢分類: %s", ", ".join(map(str, categories)))
+        if unresolved and config.EQUIPMENT_CATEGORY_FEEDS:
+            logger.info("分類不確定完整、同時以不分分類的來源查詢: %s", ", ".join(unresolved))
+
+    def poll_once(self, shard=None):
+        """查詢一個來源分片並處理新上架的裝備
+
+        Args:
+            shard: 分類編號，None為不分分類的來源
+
+        Returns:
+            本次處理的新裝備數量，查詢失敗時返回None
+        """
+        if self.apply_pending_watch():
+            logger.info("已套用新的裝備監控清單")
+            self.print_watchlist()
+        with self._lock:
+            feed = self.feeds.get(shard)
+        # 分片已因監控清單變更而移除
+        if feed is None:
+            return 0
+        # 獲取最新裝備列表
+        all_items = feed.poll()
+        if all_items is None:
+            return None
+        if self.price_history is not None:
+            self.price_history.record(all_items)
+
+        # 找出新裝備並加入已處理集合（不分分類的來源與分類來源可能查詢到同一件裝備，只會處理一次）
+        new_item_ids = self.processed_item_ids.add_new(item.token_id for item in all_items)
+        if not new_item_ids:
+            return 0
+        new_count = len(new_item_ids)
+
+        for item in all_items:
+            token_id = item.token_id
+
+            # 跳過已處理的裝備
+            if token_id not in new_item_ids:
                 continue
-            
-            for item in all_items:
-                item_name = item.get("name", "")
-                token_id = item["tokenId"]
-                
-                # 跳過已處理的裝備
-                if token_id in processed_item_ids:
-                    continue
-                    
-                # 將當前裝備ID添加到已處理集合
-                processed_item_ids.add(token_id)
-                
-                # 計算價格 (Wei → 遊戲幣)
-                price_wei = item["salesInfo"]["priceWei"]
-                price = int(int(price_wei) / config.WEI_PER_ETHER)
-                
-                # 檢查是否匹配任何監控的裝備
-                for equip_name in equipment_list:
-                    if equip_name in item_name:
-                        # 獲取價格上限，如果是None則使用當前錢包餘額
-                        config_price = config.EQUIPMENT_MONITOR_LIST[equip_name]
-                        price_limit = config_price if config_price is not None else config.WALLET_BALANCE
-                        
-                        # 使用固定寬度格式化輸出
-                        print(f"裝備: {item_name:<30} | 價格: {price:<8} | 上限: {price_limit:<8}")
-                        
-                        # 如果價格低於上限，嘗試購買
-                        if price <= price_limit:
-                            print("-" * 70)
-                            print(f"發現符合條件的裝備!")
-                            print(f"名稱: {item_name}")
-                            print(f"價格: {price} (上限: {price_limit})")
-                            print(f"連結: https://msu.io/marketplace/nft/{token_id}")
-                            
-                            # 檢查餘額是否足夠
-                            if config.WALLET_BALANCE < price:
-                                print(f"餘額不足！當前餘額: {config.WALLET_BALANCE:,}，需要: {price:,}")
-                                print("交易已跳過")
-                                print("-" * 70)
-                                break
-                                
-                            print("-" * 70)
-                            
-                            if buy_item_api(token_id, price_wei):
-                                print(f"已成功購買 {item_name}")
-                                # 購買成功後更新錢包餘額
-                                config.update_wallet_balance()
-                            break
-            
-            # 控制已處理裝備ID集合大小，避免無限增長
-            if len(processed_item_ids) > 1000:
-                # 只保留最近500個處理過的ID
-                processed_item_ids = set(list(processed_item_ids)[-500:])
-            
-            # 適當休息，避免頻繁API呼叫
-            time.sleep(8)
-        except KeyboardInterrupt:
-            print("程式被手動中斷")
-            break
-        except Exception as e:
-            print(f"發生錯誤: {e}")
-            time.sleep(5)
-            continue 
\ No newline at end of file
+            new_item_ids.discard(token_id)
+            observe_listing_age(self.name, item.listed_at)
+
+            if shard is None and self.unresolved:
+                self._learn_category(item)
+            self._evaluate_item(item)
+
+        return new_count
+
+    def save_state(self):
+        """把已處理ID快照到磁碟（由監控引擎在背景定期呼叫及停止時呼叫，不在查詢途中寫入）"""
+        self.processed_item_ids.save()
+
+    def _evaluate_item(self, item):
+        """判斷單件裝備是否符合監控條件，符合時購買"""
+        detected_at = time.perf_counter()
+        # 整次判斷使用同一個比對器，判斷途中重新載入設定也不會混用新舊監控清單
+        matcher = self.matcher
+        item_name = item.name
+        token_id = item.token_id
+
+        # 顯示用的價格（遊戲幣），比較時使用整數 Wei
+        price = item.price
+
+        # 找出名稱符合的所有監控規則
+        matches = matcher.match(item_name)
+        if not matches:
+            return
+
+        # 多條規則同時符合時使用最低的價格上限，None則使用當前錢包餘額
+        balance = spendable_balance()
+        price_limit = matcher.price_limit(matches, balance)
+
+        # 使用固定寬度格式化輸出
+        logger.debug("裝備: %-30s | 價格: %-8s | 上限: %-8s", item_name, price, price_limit)
+
+        # 如果價格低於上限，嘗試購買
+        if item.within(to_wei(price_limit)):
+            found = fields(token_id=token_id, item_name=item_name, price=price, price_limit=price_limit, rules=matches)
+            logger.info(_ITEM_FOUND, item_name, price, price_limit, ", ".join(matches), token_id, extra=found)
+
+            # 檢查餘額是否足夠
+            if to_wei(balance) < item.price_wei:
+                logger.warning("餘額不足！當前餘額: %s，需要: %s，交易已跳過", f"{balance:,}", f"{price:,}", extra=found)
+                return
+
+            self.buy(token_id, item.price_wei, item_name, detected_at)
+
+
+def auto_buy_pet():
+    """自動購買寵物"""
+    # 避免循環引用，在函數內部導入
+    from monitor import run_monitor
+
+    logger.info("開始自動購買寵物模式")
+    run_monitor(["pet"])
+
+
+def auto_buy_multiple_equipment():
+    """自動監測多個裝備，使用config中的EQUIPMENT_MONITOR_LIST"""
+    from monitor import run_monitor
+
+    logger.info("開始自動監測多裝備模式")
+    run_monitor(["equipment"])
@@ -0,0 +1,147 @@
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+
+def normalize_query(item_name: str, *filters):
+    """把搜尋條件轉為快取鍵：名稱不分大小寫並合併多餘空白"""
+    return (" ".join(item_name.lower().split()),) + tuple(
+        tuple(value) if isinstance(value, list) else value for value in filters
+    )
+
+
+def approximate_size(value):
+    """估計結果佔用的記憶體（bytes）：遞迴加總容器及其內容的 sys.getsizeof
+
+    同一個物件被多次引用時只計算一次，數字、字串等不可變的小物件也會計入，只作為快取容量的估計值。
+    """
+    seen = set()
+    stack = [value]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif not isinstance(item, (str, bytes, int, float, bool, Decimal, type(None))) and hasattr(item, "__dict__"):
+            stack.append(vars(item))
+    return total
+
+
+class SingleFlightCache:
+    """有存活時間 (TTL) 及容量上限 (LRU) 的非同步查詢快取
+
+    同一個鍵同時有多個查詢時只會執行一次載入，其他呼叫端等待同一個結果（single-flight），
+    載入失敗時不快取，所有等待中的呼叫端都會收到同一個例外。
+    容量可同時以結果數量及估計的記憶體用量 (approximate_size) 限制，超過任一上限時淘汰最久未使用的結果。
+    """
+
+    def __init__(self, ttl, max_entries=None, max_bytes=None, sizeof=approximate_size):
+        """
+        Args:
+            ttl: 快取結果的存活秒數
+            max_entries: 最多保存的結果數量，None表示不限
+            max_bytes: 所有結果估計的記憶體用量上限（bytes），None表示不限；單一結果超過上限時不快取
+            sizeof: 估計單一結果記憶體用量的函數
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()  # 鍵 -> (過期時間, 結果, 估計的記憶體用量)
+        self._bytes = 0
+        self._in_flight = {}  # 鍵 -> 載入中的 asyncio.Task
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, key, load):
+        """取得快取結果，沒有或已過期時以 load() 載入
+
+        Args:
+            key: 快取鍵（可雜湊），通常由 normalize_query 產生
+            load: 沒有參數的協程函數，返回要快取的結果
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value, _ = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self._remove(key)
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, load))
+            self._in_flight[key] = task
+        # shield: 單一呼叫端被取消時不影響其他等待同一結果的呼叫端
+        return await asyncio.shield(task)
+
+    async def _load(self, key, load):
+        try:
+            value = await load()
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        self._remove(key)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return value
+        self._entries[key] = (time.monotonic() + self.ttl, value, size)
+        self._bytes += size
+        while (
+            self.max_entries is not None and len(self._entries) > self.max_entries
+            or self.max_bytes is not None and self._bytes > self.max_bytes
+        ):
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+        return value
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def invalidate(self, key=None):
+        """移除指定鍵的快取結果，key為None時清除全部"""
+        if key is None:
+            self._entries.clear()
+            self._bytes = 0
+        else:
+            self._remove(key)
+
+    def stats(self):
+        """快取命中統計
+
+        Returns:
+            dict: hits、misses、coalesced（合併到進行中查詢的次數）、errors、entries、
+            bytes（估計的記憶體用量，未設定 max_bytes 時為0）、hit_rate
+        """
+        requests = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hit_rate": (self.hits + self.coalesced) / requests if requests else None,
+        }
@@ -2,6 +2,8 @@ import os
 import json
 from decimal import Decimal
 
+from price_history import DEFAULT_FILE, DEFAULT_STATE_DIR
+
 # 1 Ether = 10^18 Wei
 WEI_PER_ETHER = Decimal("1000000000000000000")
 
@@ -9,29 +11,50 @@ WEI_PER_ETHER = Decimal("1000000000000000000")
 TOKEN_ADDRESS = "0x07E49Ad54FcD23F6e7B911C2068F0148d1827c08"
 NFT_ADDRESS = "0x43DCff2A0cedcd5e10e6f1c18b503498dDCe60d5"
 
+# 市集API位址（效能測試時可改為本地模擬伺服器）
+MARKETPLACE_API_URL = "https://msu.io/marketplace/api"
+
 # 錢包餘額（遊戲幣）
 WALLET_BALANCE = 0
 
 # 從設定檔讀取設定
 def load_config():
+    """讀取 config.json 的錢包設定
+
+    單一錢包時填寫 private_key 及 wallet；多個錢包時填寫
+    "wallets": [{"name": ..., "private_key": ..., "wallet": ..., "budget": ...}]，budget 為選填的花費上限（遊戲幣）。
+
+    Returns:
+        錢包設定列表，每項包含 name、private_key、wallet、budget
+    """
     config_path = os.path.join(os.path.dirname(__file__), 'config.json')
     try:
         with open(config_path) as f:
             config = json.load(f)
         
-        # 讀取所有設定項，不提供預設值
-        private_key = config.get('private_key')
-        wallet = config.get('wallet')
-        
-        # 檢查必要設定項是否存在
-        missing_configs = []
-        if not private_key: missing_configs.append('private_key')
-        if not wallet: missing_configs.append('wallet')
-        
-        if missing_configs:
-            raise ValueError(f"缺少必要的設定項: {', '.join(missing_configs)}")
-        
-        return private_key, wallet
+        entries = config.get('wallets') or [config]
+        wallets = []
+        for index, entry in enumerate(entries):
+            # 讀取所有設定項，不提供預設值
+            private_key = entry.get('private_key')
+            wallet = entry.get('wallet')
+            
+            # 檢查必要設定項是否存在
+            missing_configs = []
+            if not private_key: missing_configs.append('private_key')
+            if not wallet: missing_configs.append('wallet')
+            
+            if missing_configs:
+                location = f"（wallets 第 {index + 1} 項）" if 'wallets' in config else ""
+                raise ValueError(f"缺少必要的設定項{location}: {', '.join(missing_configs)}")
+            
+            wallets.append({
+                'name': entry.get('name') or f"wallet-{index + 1}",
+                'private_key': private_key,
+                'wallet': wallet,
+                'budget': entry.get('budget'),
+            })
+        return wallets
     except FileNotFoundError:
         raise FileNotFoundError("找不到config.json檔案，請先建立該檔案並填入必要的設定項")
     except json.JSONDecodeError:
@@ -40,30 +63,61 @@ def load_config():
         raise Exception(f"載入設定時發生錯誤: {e}")
 
 # 更新錢包餘額
-def update_wallet_balance():
+def update_wallet_balance(wallet=None):
     """
-    更新全域錢包餘額變數
+    以API餘額對帳本地錢包帳本，WALLET_BALANCE 為對帳後單一錢包最多能花費的金額
+
+    購買時只讀取本地帳本（成功時扣款、失敗時不扣），此函數由監控引擎在背景定期呼叫。
+
+    Args:
+        wallet: 只更新指定的錢包，None表示更新所有錢包
     """
     global WALLET_BALANCE
     # 避免循環引用，在函數內部導入
-    from api import get_wallet_balance
+    import time
+    from api import get_wallet_balance_wei, get_wallet_pool
+    from log import get_logger
+    logger = get_logger("config")
     
-    balance = get_wallet_balance()
-    if balance is not None:
-        WALLET_BALANCE = balance
-        print(f"錢包餘額更新: {WALLET_BALANCE:,} NESO")
-    return balance
+    pool = get_wallet_pool()
+    updated = False
+    for target in [wallet] if wallet is not None else pool.wallets:
+        requested_at = time.monotonic()
+        balance_wei = get_wallet_balance_wei(target.address)
+        if balance_wei is None:
+            continue
+        first_time = target.reconciled_at is None
+        drift = pool.reconcile(target, balance_wei, requested_at, grace=BALANCE_DEBIT_GRACE)
+        updated = True
+        if first_time:
+            if len(pool) > 1:
+                logger.info("錢包 %s 餘額: %s NESO", target.name, f"{target.balance:,}")
+        elif drift:
+            # 帳本與API不一致（例如結果未知的交易最後失敗，或在其他地方花費）
+            logger.warning("錢包 %s 帳本校正: %s NESO", target.name, f"{-drift / WEI_PER_ETHER:+,}")
+    if not updated:
+        return None
+    balance = pool.max_available()
+    if balance != WALLET_BALANCE:
+        logger.info("錢包餘額更新: %s NESO", f"{balance:,}")
+    WALLET_BALANCE = balance
+    return WALLET_BALANCE
 
 try:
     # 載入設定
-    PRIVATE_KEY, WALLET = load_config()
+    WALLETS = load_config()
+    # 第一個錢包為預設錢包
+    PRIVATE_KEY, WALLET = WALLETS[0]['private_key'], WALLETS[0]['wallet']
 except Exception as e:
     print(f"錯誤: {e}")
     print("程式將結束")
     import sys
     sys.exit(1)
 
-# 寵物篩選條件: [{技能}, 可接受最高價格]
+# 寵物篩選條件: [{技能}, 可接受最高價格]，依清單順序決定優先度（越前面越優先）
+# 也可以使用字典格式指定排除技能、優先度（數字越大越優先，預設0）及預算（本次執行最多花費的遊戲幣）:
+#   {"skills": {"Auto Buff"}, "exclude": {"Auto Move"}, "price": 300000, "priority": 10, "budget": 1000000}
+# 寵物只套用符合的規則中最優先的一條，預算用完的規則會被略過
 PET_FILTERS = [
     [{"Magnet Effect"}, None],
     [{"Auto Buff"}, None],
@@ -89,4 +143,77 @@ EQUIPMENT_MONITOR_LIST = {
     "Black Bean Mark": None,
     "Will o' the Wisps": None,
     # 可以新增更多裝備和對應的價格上限
-} 
\ No newline at end of file
+}
+
+# 裝備來源依分類分開查詢：只查詢監控清單中的裝備所屬的分類，每個分類各自翻頁及調整查詢間隔，
+# 其他分類大量上架時不會擠掉監控的裝備。裝備的分類依序取自下面的設定、價格歷史紀錄，
+# 都沒有時先以不分分類的來源查詢，第一次符合時學習該裝備的分類
+EQUIPMENT_CATEGORY_FEEDS = True  # 設為False時只使用不分分類的來源
+# 從價格歷史紀錄或不分分類的來源學到的分類不一定完整（例如 "Badge of" 可能跨多個分類），
+# 預設仍保留不分分類的來源；設為True時這些裝備只查詢已知的分類，會漏掉尚未出現過的分類
+EQUIPMENT_TRUST_LEARNED_CATEGORIES = False
+EQUIPMENT_CATEGORIES = {
+    # "裝備名稱": 分類編號（categoryNo），或分類編號列表，例如
+    # "Golden Clover Belt": 1000201001,
+}
+
+# 可熱重載的監控設定檔（選用）：存在時以其中的 pet_filters、equipment、equipment_categories、wallets 取代上面的設定，
+# 執行中修改檔案會在下一次查詢前套用，不需要重新啟動或重新登入
+WATCHLIST_FILE = os.path.join(os.path.dirname(__file__), 'watchlist.json')
+WATCHLIST_RELOAD_INTERVAL = 2  # 檢查設定檔是否變更的間隔（秒）
+
+# 紀錄設定：紀錄在背景執行緒寫出，不會拖慢偵測
+LOG_LEVEL = 'INFO'  # DEBUG 會顯示每件物品的判斷過程，INFO 只顯示符合條件的物品及購買結果
+LOG_FORMAT = 'text'  # text 或 json（每行一筆 JSON，方便收集紀錄）
+
+# Prometheus 監控指標端點（http://METRICS_HOST:METRICS_PORT/metrics），設為None關閉
+METRICS_PORT = 9108
+METRICS_HOST = '127.0.0.1'
+
+# 監控引擎設定
+POLL_INTERVAL = 8  # 每個市集來源的初始查詢間隔（秒），之後依上架速度自動調整
+POLL_INTERVAL_MIN = 2  # 上架頻繁時的最短查詢間隔（秒）
+POLL_INTERVAL_MAX = 30  # 市場冷清時的最長查詢間隔（秒）
+POLL_TARGET_NEW_PER_POLL = 5  # 調整查詢間隔時，希望每次查詢拿到的新物品數量
+ERROR_RETRY_INTERVAL = 5  # 發生錯誤後的重試等待時間（秒）
+SHARD_SYNC_INTERVAL = 1  # 檢查來源分片（裝備分類）是否增減的間隔（秒）
+BALANCE_REFRESH_INTERVAL = 60  # 背景以API餘額對帳本地錢包帳本的間隔（秒）
+BALANCE_DEBIT_GRACE = 30  # 本地扣款後多久內的API餘額可能尚未反映該筆購買，對帳時保留扣款（秒）
+AUTH_REFRESH_MARGIN = 5 * 60  # JWT過期前多久在背景重新登入（秒）
+AUTH_DEFAULT_TTL = 30 * 60  # 無法從cookie讀取JWT過期時間時的預設有效時間（秒）
+MONITOR_MAX_WORKERS = 8  # 執行同步API呼叫的執行緒數量上限
+PET_LOOKUP_WORKERS = 8  # 同時查詢寵物技能的執行緒數量
+MAX_CONCURRENT_REQUESTS_PER_HOST = 6  # 同一主機的同時請求數量上限
+
+# 限流設定（所有API呼叫共用）
+RATE_LIMIT_PER_SECOND = 5  # 每秒允許的請求數量
+RATE_LIMIT_BURST = 10  # 允許的瞬間請求數量
+BACKOFF_BASE = 10  # 遇到 403/429 且沒有 Retry-After 時的初始冷卻時間（秒），連續發生時加倍
+BACKOFF_MAX = 300  # 冷卻時間上限（秒）
+
+# 購買流程設定
+MAX_BUYS_IN_FLIGHT = 3  # 每個錢包同時進行中（送出及等待結果）的購買數量上限
+SETTLE_POLL_INITIAL = 0.5  # 交易處理中時第一次重新查詢的等待時間（秒），之後逐次加倍
+SETTLE_POLL_MAX = 4  # 查詢交易結果的最長間隔（秒）
+SETTLE_TIMEOUT = 60  # 交易結果仍為處理中時的最長等待時間（秒）
+
+# 最近上架來源的分頁設定
+PET_PAGE_SIZE = 20  # 寵物來源每頁最大數量
+EQUIPMENT_PAGE_SIZE = 135  # 不分分類的裝備來源每頁最大數量
+EQUIPMENT_CATEGORY_PAGE_SIZE = 40  # 每個裝備分類來源每頁最大數量
+EQUIPMENT_CATEGORY_TARGET_PER_POLL = 1  # 裝備分類來源調整查詢間隔時，希望每次查詢拿到的新物品數量
+FEED_MIN_PAGE_SIZE = 5  # 市場冷清時縮小到的最小每頁數量
+FEED_MAX_PAGES = 5  # 每次查詢最多往後追趕的頁數
+
+# 已處理物品ID的去重設定
+STATE_DIR = DEFAULT_STATE_DIR  # 快照存放目錄（專案目錄下的 state，Discord Bot 的價格歷史也預設放在這裡）
+DEDUP_CAPACITY = 5000  # 每個來源最多記住的物品ID數量
+DEDUP_TTL = 6 * 60 * 60  # 物品ID的保存時間（秒）
+DEDUP_SAVE_INTERVAL = 30  # 在背景快照已處理ID的間隔（秒），有變動時才寫入，停止時也會寫入
+
+# 價格歷史紀錄設定（每次查詢到的物品都會紀錄到 STATE_DIR 下的 SQLite 資料庫）
+PRICE_HISTORY_ENABLED = True
+PRICE_HISTORY_FILE = DEFAULT_FILE  # 資料庫檔名（price_history.db）
+PRICE_HISTORY_BATCH_SIZE = 500  # 累積多少筆觀察紀錄後寫入
+PRICE_HISTORY_FLUSH_INTERVAL = 10  # 距離上次寫入超過多少秒時寫入（秒）
+PRICE_HISTORY_RETENTION_DAYS = 30  # 紀錄的保存天數（依最後出現時間），None表示永久保存
@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from log import get_logger
+
+logger = get_logger("dedup")
+
+
+class SeenIdStore:
+    """已處理物品ID的去重儲存
+
+    依加入順序保存ID，超過容量時淘汰最舊的ID，超過存活時間 (TTL) 的ID也會被淘汰，
+    查詢為 O(1)。可快照到磁碟，重新啟動後不會重複處理目前頁面上的物品。
+    """
+
+    def __init__(self, capacity, ttl=None, path=None):
+        """
+        Args:
+            capacity: 最多保存的ID數量
+            ttl: ID的存活秒數，None表示不過期
+            path: 快照檔案路徑，None表示不持久化
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self.path = path
+        self._ids = OrderedDict()  # ID -> 加入時間
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        if path:
+            self.load()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, item_id):
+        with self._lock:
+            added_at = self._ids.get(item_id)
+            if added_at is None:
+                return False
+            if self.ttl is not None and time.time() - added_at > self.ttl:
+                del self._ids[item_id]
+                self._dirty = True
+                return False
+            return True
+
+    def add(self, item_id):
+        """加入單一ID"""
+        self.update((item_id,))
+
+    def update(self, item_ids):
+        """加入多個ID，並淘汰過期或超過容量的舊ID"""
+        now = time.time()
+        with self._lock:
+            for item_id in item_ids:
+                self._ids[item_id] = now
+                self._ids.move_to_end(item_id)
+            self._dirty = True
+            self._evict(now)
+
+    def add_new(self, item_ids):
+        """加入多個ID，返回原本不在儲存中的ID
+
+        檢查及加入在同一把鎖內完成，多個來源共用同一個儲存時，同一個ID只會被其中一個來源處理。
+
+        Returns:
+            新加入的ID集合
+        """
+        now = time.time()
+        new_ids = set()
+        with self._lock:
+            for item_id in item_ids:
+                added_at = self._ids.get(item_id)
+                if added_at is not None and (self.ttl is None or now - added_at <= self.ttl):
+                    continue
+                self._ids[item_id] = now
+                self._ids.move_to_end(item_id)
+                new_ids.add(item_id)
+            if new_ids:
+                self._dirty = True
+                self._evict(now)
+        return new_ids
+
+    def _evict(self, now):
+        """淘汰過期及超過容量的ID（呼叫前需持有鎖）"""
+        if self.ttl is not None:
+            while self._ids:
+                oldest_id, added_at = next(iter(self._ids.items()))
+                if now - added_at <= self.ttl:
+                    break
+                del self._ids[oldest_id]
+        while len(self._ids) > self.capacity:
+            self._ids.popitem(last=False)
+
+    def save(self):
+        """將目前內容快照到磁碟（內容沒有變動時略過）"""
+        if not self.path or not self._dirty:
+            return
+        # 多個執行緒同時快照時依序寫入，避免共用同一個暫存檔
+        with self._save_lock:
+            with self._lock:
+                snapshot = list(self._ids.items())
+                self._dirty = False
+
+            # 先寫入暫存檔再取代，避免寫入中斷造成檔案損毀
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+
+    def load(self):
+        """從磁碟快照載入，檔案不存在或格式錯誤時從空白開始"""
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning("讀取去重快照失敗，將從空白開始: %s", e)
+            return
+
+        with self._lock:
+            self._ids = OrderedDict((item_id, added_at) for item_id, added_at in snapshot)
+            self._evict(time.time())
@@ -1,128 +1,325 @@
 # discord_bot.py
-import json
+import asyncio
 import os
-from pathlib import Path
+import time
 
 import discord
 from discord.ext import commands, tasks
 from dotenv import load_dotenv
 
-from msu_market import compute_price_stats, fetch_items, format_price_table
+from cache import SingleFlightCache, normalize_query
+from metrics import DISCORD_FLUSH, DISCORD_REFRESH, start_metrics_server
+from msu_market import format_price_table, search_price_stats
+from price_history import DEFAULT_PATH, open_price_history
+from tracking import RefreshScheduler, TrackingStore
 
 load_dotenv()
 
-DATA_FILE = Path("tracked_items.json")
-if not DATA_FILE.exists():
-    with open(DATA_FILE, "w") as f:
-        json.dump([], f)
-
 intents = discord.Intents.default()
 intents.message_content = True
 
 bot = commands.Bot(command_prefix="!", intents=intents)
 
+# 同時進行的市集查詢上限，查詢在執行緒中執行，不會阻塞事件迴圈
+MAX_CONCURRENT_FETCHES = int(os.getenv("MAX_CONCURRENT_FETCHES", "4"))
+fetch_semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+
+# 搜尋結果快取：相同道具在存活時間內只查詢一次，同時的相同查詢會合併
+search_cache = SingleFlightCache(
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "30")),
+    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "256")),
+    max_bytes=int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+)
+
+# 每次查詢到的物品都會紀錄到價格歷史，供 !history 查詢；預設與監控程式共用 state/price_history.db
+PRICE_HISTORY_RETENTION_DAYS = float(os.getenv("PRICE_HISTORY_RETENTION_DAYS", "30"))
+price_history = open_price_history(
+    os.getenv("PRICE_HISTORY_PATH", DEFAULT_PATH),
+    retention=PRICE_HISTORY_RETENTION_DAYS * 24 * 60 * 60 if PRICE_HISTORY_RETENTION_DAYS > 0 else None,
+)
+HISTORY_WINDOW_HOURS = float(os.getenv("HISTORY_WINDOW_HOURS", "24"))
+
+# 搜尋的職業條件（以逗號分隔，例如 "thief,pirate"），未設定時搜尋所有職業
+SEARCH_CLASSES = [name.strip() for name in os.getenv("SEARCH_CLASSES", "").split(",") if name.strip()] or None
+
+
+CHECK_INTERVAL = float(os.getenv("CHECK_INTERVAL", "300"))  # 道具的預設查詢間隔（秒）
+MIN_REFRESH_GAP = float(os.getenv("MIN_REFRESH_GAP", "1"))  # 兩次查詢之間的最短間隔（秒）
+REPORT_FLUSH_INTERVAL = float(os.getenv("REPORT_FLUSH_INTERVAL", "10"))  # 合併發送回報的間隔（秒）
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Prometheus 監控指標端點的連接埠，0表示關閉
+
+# 各頻道的追蹤清單；第一次啟動時匯入舊版的全域清單到 REPORT_CHANNEL_ID
+tracking = TrackingStore(
+    os.getenv("TRACKING_FILE", "tracking.json"),
+    default_interval=CHECK_INTERVAL,
+    legacy_path="tracked_items.json",
+    legacy_channel_id=os.getenv("REPORT_CHANNEL_ID"),
+)
+# 每個 (頻道ID, 道具名稱) 依自己的間隔排程查詢
+scheduler = RefreshScheduler(min_gap=MIN_REFRESH_GAP)
+scheduler_wakeup = asyncio.Event()
+refresh_tasks = set()
+
+DISCORD_MESSAGE_LIMIT = 2000  # Discord 單則訊息的字數上限
+# 程式碼區塊標記，切開訊息時用來補上結束與重新開啟
+FENCE = "```"
+FENCE_OPEN = FENCE + "\n"
+FENCE_CLOSE = "\n" + FENCE
+
+# 每個 (頻道ID, 道具名稱) 上次回報的狀態，只有狀態改變時才再次回報
+last_reported = {}
+# 等待發送的回報: 頻道ID -> 訊息列表
+pending_reports = {}
+
+
+def report_state(result):
+    """回報時比較的狀態：最低價及是否建議入手，查詢失敗時為錯誤訊息"""
+    if isinstance(result, Exception):
+        return ("error", str(result))
+    _, stats = result
+    if not stats:
+        return None
+    return (stats["lowest_price"], stats["should_buy"])
+
+
+def chunk_messages(parts, limit=DISCORD_MESSAGE_LIMIT, separator="\n\n"):
+    """把多段訊息依序合併成不超過字數上限的訊息
+
+    單段超過上限時依行切開，單行仍超過上限時直接截斷。
+    在 ``` 程式碼區塊中切開時，會在前一段結尾補上 ``` 並在下一段開頭重新開啟，
+    避免兩則訊息的格式都跑掉。
+    """
+    chunks = []
+    current = ""
+    for part in parts:
+        pieces = [part] if len(part) <= limit else split_lines(part, limit)
+        for piece in pieces:
+            if current and len(current) + len(separator) + len(piece) <= limit:
+                current += separator + piece
+            else:
+                if current:
+                    chunks.append(current)
+                current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_lines(text, limit):
+    """把超過上限的訊息依行切開，並在切開處補上程式碼區塊的結束與開頭
+
+    Returns:
+        每段不超過上限的訊息列表
+    """
+    pieces = []
+    current = ""
+    # current 結尾是否位於未結束的程式碼區塊內
+    in_fence = False
+    for line in text.splitlines():
+        # 保留補上結束與重新開啟 ``` 所需的空間
+        line = line[:limit - 2 * len(FENCE_CLOSE)]
+        after = in_fence ^ (line.count(FENCE) % 2 == 1)
+        candidate = current + "\n" + line if current else line
+        if len(candidate) + (len(FENCE_CLOSE) if after else 0) <= limit:
+            current = candidate
+        else:
+            pieces.append(current + FENCE_CLOSE if in_fence else current)
+            current = FENCE_OPEN + line if in_fence else line
+        in_fence = after
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def search_and_record(item_name: str):
+    """讀取道具的所有搜尋結果，計算價格統計並紀錄到價格歷史（在背景執行緒執行）
+
+    Returns:
+        (物品數量, 價格統計)
+    """
+    return search_price_stats(item_name, on_page=price_history.record, classes=SEARCH_CLASSES)
 
-def load_tracked_items():
-    if DATA_FILE.exists():
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    return []
 
+async def fetch_item_stats(item_name: str):
+    """查詢道具並計算價格統計，優先使用快取
 
-def save_tracked_items(items):
-    with open(DATA_FILE, "w") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
+    查詢在背景執行緒執行，同時進行的查詢數量受 fetch_semaphore 限制。
 
+    Returns:
+        (物品數量, 價格統計)
+    """
+    async def load():
+        async with fetch_semaphore:
+            return await asyncio.to_thread(search_and_record, item_name)
 
-tracked_items = load_tracked_items()
+    return await search_cache.get(normalize_query(item_name, SEARCH_CLASSES), load)
 
 
 @bot.event
 async def on_ready():
     print(f"Bot已上線，登入為 {bot.user}")
-    check_items.start()
-    print(f"定時查詢開啟，時間間隔為{os.getenv("CHECK_INTERVAL")}秒。")
+    if not flush_reports.is_running():
+        if METRICS_PORT:
+            start_metrics_server(METRICS_PORT, os.getenv("METRICS_HOST", "127.0.0.1"))
+        # 同一間隔的道具平均分散在間隔內查詢
+        scheduler.stagger(tracking.entries())
+        bot.loop.create_task(run_scheduler())
+        flush_reports.start()
+        print(f"定時查詢開啟，共 {len(scheduler)} 個追蹤項目，預設間隔為{CHECK_INTERVAL:g}秒。")
 
 
 @bot.command(name="add")
 async def add_item(ctx, *, item_name: str):
     item_name = item_name.strip().lower()
-    if item_name in tracked_items:
+    guild_id = ctx.guild.id if ctx.guild else None
+    if not tracking.add(ctx.channel.id, item_name, guild_id=guild_id):
         await ctx.send(f"'{item_name}' 已在追蹤清單中。")
         return
-    tracked_items.append(item_name)
-    save_tracked_items(tracked_items)
+    # 新加入的道具立即查詢一次
+    scheduler.schedule((ctx.channel.id, item_name), tracking.interval(ctx.channel.id, item_name))
+    scheduler_wakeup.set()
     await ctx.send(f"已將 '{item_name}' 加入追蹤清單。")
 
 
 @bot.command(name="remove")
 async def remove_item(ctx, *, item_name: str):
     item_name = item_name.strip().lower()
-    if item_name not in tracked_items:
+    if not tracking.remove(ctx.channel.id, item_name):
         await ctx.send(f"清單中沒有 '{item_name}'。")
         return
-    tracked_items.remove(item_name)
-    save_tracked_items(tracked_items)
+    scheduler.unschedule((ctx.channel.id, item_name))
+    last_reported.pop((ctx.channel.id, item_name), None)
     await ctx.send(f"已將 '{item_name}' 從追蹤清單中移除。")
 
 
+@bot.command(name="interval")
+async def set_interval(ctx, seconds: float, *, item_name: str):
+    # 設定單一道具的查詢間隔，例如熱門道具 30 秒、冷門道具 600 秒
+    item_name = item_name.strip().lower()
+    if seconds < 10:
+        await ctx.send("查詢間隔不能少於 10 秒。")
+        return
+    if not tracking.set_interval(ctx.channel.id, item_name, seconds):
+        await ctx.send(f"清單中沒有 '{item_name}'。")
+        return
+    scheduler.schedule((ctx.channel.id, item_name), seconds, delay=seconds)
+    scheduler_wakeup.set()
+    await ctx.send(f"'{item_name}' 的查詢間隔已設為 {seconds:g} 秒。")
+
+
 @bot.command(name="list")
 async def list_items(ctx):
-    if not tracked_items:
+    items = tracking.items(ctx.channel.id)
+    if not items:
         await ctx.send("目前沒有追蹤任何裝備。")
     else:
-        await ctx.send("目前追蹤的裝備有:\n" + "\n".join(tracked_items))
+        lines = [f"{item_name}（每 {interval:g} 秒）" for item_name, interval in items.items()]
+        await ctx.send("目前追蹤的裝備有:\n" + "\n".join(lines))
 
 
 @bot.command(name="price")
 async def fetch_price(ctx, *, item_name: str):
     try:
-        data = fetch_items(item_name)
+        count, stats = await fetch_item_stats(item_name)
     except Exception as e:
         await ctx.send("查詢時發生問題，請稍後再試。")
         print(e)
         return
 
-    items = data.get("items", [])
-    if not items:
+    if not count:
         await ctx.send("未查詢到任何道具。")
         return
 
-    stats = compute_price_stats(items)
     if not stats:
         await ctx.send("沒有找到任何價格資訊。")
         return
 
-    table_str = format_price_table(stats)
+    table_str = format_price_table(item_name, stats)
     await ctx.send(table_str)
 
 
-@tasks.loop(seconds=os.getenv("CHECK_INTERVAL"))
-async def check_items():
-    # 定期檢查追蹤的裝備，並在指定頻道回報
-    channel = await bot.fetch_channel(os.getenv("REPORT_CHANNEL_ID"))
+@bot.command(name="history")
+async def history_price(ctx, *, item_name: str):
+    # 以本機紀錄的價格歷史計算統計，不呼叫市集API
+    item_name = item_name.strip().lower()
+    since = time.time() - HISTORY_WINDOW_HOURS * 3600
+    stats = await asyncio.to_thread(
+        lambda: price_history.price_stats([item_name], since=since)[item_name]
+    )
+    await ctx.send(
+        format_price_table(f"{item_name}（最近 {HISTORY_WINDOW_HOURS:g} 小時）", stats)
+    )
+
+
+@bot.command(name="cache")
+async def cache_stats(ctx):
+    stats = search_cache.stats()
+    hit_rate = f"{stats['hit_rate']:.1%}" if stats["hit_rate"] is not None else "N/A"
+    await ctx.send(
+        f"搜尋快取: 命中 {stats['hits']} 次、合併 {stats['coalesced']} 次、"
+        f"查詢 {stats['misses']} 次（失敗 {stats['errors']} 次），"
+        f"命中率 {hit_rate}，目前保存 {stats['entries']} 筆（約 {stats['bytes'] / 1024:.0f} KB）"
+    )
+
+
+async def run_scheduler():
+    """依排程逐一查詢追蹤項目，查詢在背景進行，不會延誤下一個排程"""
+    while True:
+        delay = scheduler.next_delay()
+        if delay != 0:
+            # 等到下一個項目到期，或有項目新增、修改時重新計算
+            scheduler_wakeup.clear()
+            try:
+                await asyncio.wait_for(scheduler_wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        key = scheduler.pop_due()
+        task = asyncio.create_task(refresh_item(*key))
+        refresh_tasks.add(task)
+        task.add_done_callback(refresh_tasks.discard)
 
-    if channel is None:
-        print("指定的報告頻道不存在或Bot沒有存取權限。")
+
+async def refresh_item(channel_id, item_name):
+    """查詢單一追蹤項目，最低價或建議改變時排入回報"""
+    started = time.monotonic()
+    try:
+        result = await fetch_item_stats(item_name)
+    except Exception as e:
+        result = e
+    DISCORD_REFRESH.observe(time.monotonic() - started, "error" if isinstance(result, Exception) else "ok")
+    key = (channel_id, item_name)
+    if key not in scheduler:
+        # 查詢期間已被移除
+        return
+    state = report_state(result)
+    if key in last_reported and last_reported[key] == state:
         return
-    if not tracked_items:
-        # 沒有裝備就不報告
+    last_reported[key] = state
+    if isinstance(result, Exception):
+        message = f"**{item_name}**\n查詢發生錯誤: {result}"
+    else:
+        _, stats = result
+        message = format_price_table(item_name, stats)
+    pending_reports.setdefault(channel_id, []).append(message)
+
+
+@tasks.loop(seconds=REPORT_FLUSH_INTERVAL)
+async def flush_reports():
+    # 定期把各頻道累積的回報依字數上限分批發送
+    if not pending_reports:
         return
-    # 查詢每個裝備並發佈結果
-    msg_parts = []
-    for item_name in tracked_items:
+    started = time.monotonic()
+    for channel_id in list(pending_reports):
+        msg_parts = pending_reports.pop(channel_id)
         try:
-            data = fetch_items(item_name)
-            items = data.get("items", [])
-            stats = compute_price_stats(items)
-            msg_parts.append(format_price_table(item_name, stats))
-        except Exception as e:
-            msg_parts.append(f"**{item_name}**\n查詢發生錯誤: {e}")
-
-    # 將結果分批發送
-    # 若單次消息過長, 可再優化分批策略
-    report_msg = "\n\n".join(msg_parts)
-    await channel.send(report_msg)
+            channel = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+        except discord.DiscordException:
+            print(f"頻道 {channel_id} 不存在或Bot沒有存取權限。")
+            continue
+        for report_msg in chunk_messages(msg_parts):
+            await channel.send(report_msg)
+    DISCORD_FLUSH.observe(time.monotonic() - started)
 
 
 bot.run(os.getenv("BOT_TOKEN"))
@@ -0,0 +1,141 @@
+from collections import deque
+import config
+from listing import decode_listing
+from log import get_logger
+
+logger = get_logger("feed")
+
+# 水位線保留的最新 tokenId 數量，避免水位線上的物品被買走後找不到
+WATERMARK_ANCHORS = 10
+
+
+class FeedReader:
+    """最近上架 (RECENTLY_LISTED) 來源的讀取器
+
+    記住上次處理到的最新物品（水位線），每次查詢時持續往後翻頁，
+    直到遇到水位線為止，因此兩次查詢之間上架數量超過一頁時也不會漏掉。
+    市場冷清時會縮小每頁數量，只傳輸新上架的部分。
+    物品在讀取時即轉為 Listing，水位線以下的物品不會被解碼。
+    """
+
+    def __init__(self, fetch_page, max_page_size, min_page_size=None, max_pages=None):
+        """
+        Args:
+            fetch_page: 分頁查詢函數，簽名為 fetch_page(page_no, page_size)，失敗時返回None
+            max_page_size: 每頁最大數量
+            min_page_size: 每頁最小數量，預設為 config.FEED_MIN_PAGE_SIZE
+            max_pages: 每次查詢最多翻頁數，預設為 config.FEED_MAX_PAGES
+        """
+        self.fetch_page = fetch_page
+        self.max_page_size = max_page_size
+        self.min_page_size = min(min_page_size or config.FEED_MIN_PAGE_SIZE, max_page_size)
+        self.max_pages = max_pages or config.FEED_MAX_PAGES
+        self.page_size = max_page_size
+        # 水位線：上次查詢時最新的幾個 tokenId 及最新上架時間
+        self.watermark_ids = deque(maxlen=WATERMARK_ANCHORS)
+        self.watermark_time = None
+
+    def _reached_watermark(self, item):
+        """判斷物品是否已在水位線以下（已處理過）
+
+        先比較上架時間，tokenId 只用來區分與水位線同時上架的物品；
+        水位線上的物品重新上架時會以較新的上架時間出現在最前面，不會被當成水位線而略過後面的新物品。
+        """
+        sales_info = item.get("salesInfo") or {}
+        listed_at = sales_info.get("listedAt") or sales_info.get("createdAt")
+        if listed_at is None or self.watermark_time is None:
+            # 無法比較上架時間時只能依 tokenId 判斷
+            return item["tokenId"] in self.watermark_ids
+        if listed_at != self.watermark_time:
+            return listed_at < self.watermark_time
+        return item["tokenId"] in self.watermark_ids
+
+    def poll(self):
+        """查詢自上次水位線之後新上架的物品
+
+        Returns:
+            新上架的 Listing 列表（由新到舊），查詢失敗時返回None
+        """
+        # 第一次查詢沒有水位線，只讀取第一頁
+        first_poll = not self.watermark_ids
+        max_pages = 1 if first_poll else self.max_pages
+
+        result = self._read_pages(self.page_size, max_pages, first_poll)
+        if result is None:
+            return None
+        new_items, pages_read, reached, complete = result
+
+        # 縮小後的第一頁全是新物品，代表上架量突然變大，改用最大每頁數量重新讀取
+        if not first_poll and pages_read == 1 and not reached and self.page_size < self.max_page_size:
+            result = self._read_pages(self.max_page_size, max_pages, first_poll)
+            if result is not None:
+                new_items, pages_read, reached, complete = result
+
+        if not complete:
+            # 後面的分頁查詢失敗，保留原本的水位線，下一次查詢重新讀取未讀到的分頁
+            logger.warning("第 %d 頁之後的查詢失敗，下一次查詢重新讀取", pages_read)
+            self.page_size = self.max_page_size
+            return new_items
+        if not reached:
+            logger.warning("上架數量超過 %d 頁，部分物品可能未處理", max_pages)
+
+        self._advance_watermark(new_items)
+        self._adjust_page_size(len(new_items), pages_read, reached)
+        return new_items
+
+    def _read_pages(self, page_size, max_pages, first_poll):
+        """從第一頁開始往後翻頁，直到遇到水位線
+
+        Returns:
+            (新物品列表, 讀取頁數, 是否已遇到水位線, 是否所有分頁都查詢成功)，第一頁查詢失敗時返回None
+        """
+        new_items = []
+        reached = first_poll
+        pages_read = 0
+        for page_no in range(1, max_pages + 1):
+            response = self.fetch_page(page_no, page_size)
+            if response is None:
+                if page_no == 1:
+                    return None
+                return new_items, pages_read, False, False
+            pages_read = page_no
+
+            items = response.get("items") or []
+            for item in items:
+                if not first_poll and self._reached_watermark(item):
+                    reached = True
+                    break
+                listing = decode_listing(item)
+                if listing is not None:
+                    new_items.append(listing)
+
+            # 遇到水位線或已沒有更多資料時停止翻頁
+            if reached or len(items) < page_size:
+                reached = True
+                break
+
+            # 縮小後的第一頁就已全是新物品時，交由呼叫端改用最大每頁數量
+            if page_size < self.max_page_size:
+                break
+
+        return new_items, pages_read, reached, True
+
+    def _advance_watermark(self, new_items):
+        """以本次最新的物品更新水位線"""
+        if not new_items:
+            return
+        # 由舊到新加入，讓 deque 保留最新的幾個 tokenId
+        for item in reversed(new_items[:WATERMARK_ANCHORS]):
+            self.watermark_ids.appendleft(item.token_id)
+        listed_times = [item.listed_at for item in new_items if item.listed_at is not None]
+        if listed_times:
+            self.watermark_time = max(listed_times + ([self.watermark_time] if self.watermark_time else []))
+
+    def _adjust_page_size(self, new_count, pages_read, reached):
+        """依新上架數量調整下一次的每頁數量"""
+        if pages_read > 1 or not reached:
+            # 需要翻頁代表上架量大，恢復最大每頁數量
+            self.page_size = self.max_page_size
+        else:
+            # 預留一倍空間給下一次的新上架物品，冷清時逐步縮小
+            self.page_size = max(self.min_page_size, min(self.max_page_size, new_count * 2))
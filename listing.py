@@ -0,0 +1,100 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+try:
+    import orjson
+
+    def loads(data):
+        """解析 JSON（使用 orjson）"""
+        return orjson.loads(data)
+except ImportError:  # 沒有安裝 orjson 時使用標準函式庫
+    import json
+
+    def loads(data):
+        """解析 JSON（使用標準函式庫）"""
+        return json.loads(data)
+
+WEI_PER_ETHER = 10 ** 18  # 1 Ether = 10^18 Wei（整數）
+
+
+def to_wei(amount):
+    """把遊戲幣金額（整數、Decimal 或浮點數）精確轉為整數 Wei"""
+    if isinstance(amount, int):
+        return amount * WEI_PER_ETHER
+    return int(Decimal(str(amount)) * WEI_PER_ETHER)
+
+
+def listed_timestamp(value):
+    """把上架時間（ISO 8601 字串或 epoch 秒/毫秒）轉為 epoch 秒，無法解析時返回None"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e11 else float(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class Listing:
+    """市集上架物品，只保存監控會用到的欄位，價格為整數 Wei"""
+
+    __slots__ = ("token_id", "name", "category", "price_wei", "listed_at")
+
+    def __init__(self, token_id, name, category, price_wei, listed_at=None):
+        self.token_id = token_id
+        self.name = name
+        self.category = category
+        self.price_wei = price_wei
+        self.listed_at = listed_at
+
+    def __repr__(self):
+        return f"Listing({self.token_id!r}, {self.name!r}, price_wei={self.price_wei})"
+
+    @property
+    def price(self):
+        """價格（遊戲幣，捨去小數）"""
+        return self.price_wei // WEI_PER_ETHER
+
+    @property
+    def price_ether(self):
+        """精確的價格（遊戲幣，Decimal）"""
+        return Decimal(self.price_wei) / WEI_PER_ETHER
+
+    def within(self, limit_wei):
+        """價格是否不超過上限（Wei）"""
+        return self.price_wei <= limit_wei
+
+
+def decode_listing(item):
+    """把 explore API 的單一物品轉為 Listing，沒有價格時返回None"""
+    sales_info = item.get("salesInfo") or {}
+    price_wei = sales_info.get("priceWei")
+    if not price_wei:
+        return None
+    return Listing(
+        item["tokenId"],
+        item.get("name", ""),
+        item.get("categoryNo"),
+        int(price_wei),
+        sales_info.get("listedAt") or sales_info.get("createdAt"),
+    )
+
+
+def decode_listings(response):
+    """把 explore API 的回應（dict 或原始 JSON）轉為 Listing 列表
+
+    Returns:
+        Listing 列表，沒有價格的物品會被略過
+    """
+    if isinstance(response, (bytes, str)):
+        response = loads(response)
+    listings = []
+    for item in response.get("items") or ():
+        listing = decode_listing(item)
+        if listing is not None:
+            listings.append(listing)
+    return listings
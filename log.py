@@ -0,0 +1,114 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+_LISTENER = None
+_SETUP_LOCK = threading.Lock()
+
+# 紀錄的標準屬性，其他屬性（以 extra 傳入）視為結構化欄位
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def _setting(name, default):
+    """讀取 config.py 的紀錄設定
+
+    只在程式已載入 config 時讀取，Discord Bot 等不使用 config.py（需要 config.json）的程式使用預設值。
+    """
+    config = sys.modules.get("config")
+    return getattr(config, name, default) if config is not None else default
+
+
+def fields(**values):
+    """以 extra 傳入的結構化欄位，例如 logger.info("已成功購買 %s", label, extra=fields(token_id=token_id))"""
+    return values
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """只把紀錄放入佇列，訊息格式化留給背景執行緒
+
+    標準的 QueueHandler 會在呼叫端的執行緒格式化訊息（為了可序列化），
+    同一程序內的佇列不需要，直接傳遞紀錄即可讓偵測迴圈不做任何格式化。
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """寫入當下的 sys.stdout（測試程式重新導向輸出時仍然有效）"""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class JsonFormatter(logging.Formatter):
+    """每筆紀錄輸出為一行 JSON，包含時間、等級、模組、訊息及結構化欄位"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level=None, fmt=None):
+    """設定所有 msu.* 紀錄器：紀錄放入佇列，由背景執行緒寫到標準輸出
+
+    重複呼叫時只更新等級。程式結束時會寫完佇列中剩餘的紀錄。
+
+    Args:
+        level: 紀錄等級名稱，預設為 config.LOG_LEVEL（未載入 config 時為 INFO）
+        fmt: "text" 或 "json"，預設為 config.LOG_FORMAT（未載入 config 時為 text）
+    """
+    global _LISTENER
+    root = logging.getLogger("msu")
+    root.setLevel((level or _setting("LOG_LEVEL", "INFO")).upper())
+    with _SETUP_LOCK:
+        if _LISTENER is not None:
+            return
+        output = _StdoutHandler()
+        if (fmt or _setting("LOG_FORMAT", "text")) == "json":
+            output.setFormatter(JsonFormatter())
+        else:
+            output.setFormatter(logging.Formatter("%(asctime)s %(message)s", datefmt="%H:%M:%S"))
+        records = queue.SimpleQueue()
+        root.addHandler(_DeferredQueueHandler(records))
+        root.propagate = False
+        _LISTENER = QueueListener(records, output, respect_handler_level=True)
+        _LISTENER.start()
+        atexit.register(flush_logging)
+
+
+def flush_logging():
+    """寫完佇列中剩餘的紀錄並停止背景執行緒（程式結束時自動呼叫）"""
+    with _SETUP_LOCK:
+        if _LISTENER is not None and _LISTENER._thread is not None:
+            _LISTENER.stop()
+
+
+def get_logger(name):
+    """取得模組的紀錄器（第一次使用時依 config 設定）"""
+    if _LISTENER is None:
+        setup_logging()
+    return logging.getLogger(f"msu.{name}")
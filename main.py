@@ -1,19 +1,25 @@
 import os
 import argparse
 from buyer import auto_buy_pet, auto_buy_multiple_equipment
+from monitor import run_monitor, FEED_MONITORS
 from api import initialize_authentication, buy_item_api
+from log import get_logger
+
+logger = get_logger("main")
 
 def main():
     """主程式入口"""
     parser = argparse.ArgumentParser(description='楓之谷N市集自動化交易工具')
-    parser.add_argument('--mode', type=str, choices=['pet', 'equipment'], 
-                      default='pet', help='選擇執行模式: pet (寵物), equipment (多裝備同時監控)')
+    parser.add_argument('--mode', type=str, choices=['pet', 'equipment', 'all'], 
+                      default='pet', help='選擇執行模式: pet (寵物), equipment (多裝備同時監控), all (同時監控多個來源)')
+    parser.add_argument('--feeds', type=str, nargs='+', choices=list(FEED_MONITORS),
+                      default=list(FEED_MONITORS), help='all 模式下要同時監控的來源，預設為全部')
     
     args = parser.parse_args()
     
     # 確保設定檔存在
     if not os.path.exists('config.json'):
-        print("錯誤: 找不到config.json檔案")
+        logger.error("錯誤: 找不到config.json檔案")
         return
 
     # 初始化認證會話
@@ -24,16 +30,19 @@ def main():
         if args.mode == 'pet':
             auto_buy_pet()
         elif args.mode == 'equipment':
-            print("啟動多裝備監控模式")
-            print("注意: 多裝備模式將同時監控 config.py 中 EQUIPMENT_MONITOR_LIST 設定的所有裝備")
-            print("      每種裝備可以設定各自的價格上限")
+            logger.info("啟動多裝備監控模式")
+            logger.info("注意: 多裝備模式將同時監控 config.py 中 EQUIPMENT_MONITOR_LIST 設定的所有裝備")
+            logger.info("      每種裝備可以設定各自的價格上限")
             auto_buy_multiple_equipment()
+        elif args.mode == 'all':
+            logger.info("啟動多來源同時監控模式: %s", ", ".join(args.feeds))
+            run_monitor(args.feeds)
     except KeyboardInterrupt:
-        print("程式被手動中斷")
+        logger.info("程式被手動中斷")
     except Exception as e:
-        print(f"執行時發生錯誤: {e}")
+        logger.error("執行時發生錯誤: %s", e)
     finally:
-        print("程式已結束")
+        logger.info("程式已結束")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
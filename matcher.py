@@ -0,0 +1,274 @@
+import threading
+from collections import deque
+from listing import to_wei
+
+
+class WatchlistMatcher:
+    """監控清單的多關鍵字比對器（Aho-Corasick 自動機）
+
+    監控清單在建立時編譯成自動機，之後每個物品名稱只需掃描一次，
+    就能找出所有包含在名稱中的監控關鍵字，成本與關鍵字數量無關。
+    """
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules: 監控規則，格式為 {關鍵字: 價格上限}，價格上限為None表示使用錢包餘額
+        """
+        self.rules = dict(rules)
+        self.patterns = [pattern for pattern in self.rules if pattern]
+        # 每個節點的轉移表、失敗連結及輸出（關鍵字索引）
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        self._build()
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def _build(self):
+        """建立字典樹並以廣度優先計算失敗連結"""
+        goto, output = self._goto, self._output
+        node_outputs = [[]]
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for char in pattern:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][char] = next_node
+                    goto.append({})
+                    self._fail.append(0)
+                    node_outputs.append([])
+                node = next_node
+            node_outputs[node].append(index)
+
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = goto[fallback].get(char, 0)
+                # 第一層節點的失敗連結指回根節點
+                self._fail[child] = target if target != child else 0
+                # 合併失敗連結上的輸出，比對時不需再沿失敗連結回溯
+                node_outputs[child].extend(node_outputs[self._fail[child]])
+
+        output[:] = [tuple(indexes) for indexes in node_outputs]
+
+    def match(self, name):
+        """找出名稱中包含的所有監控關鍵字
+
+        Args:
+            name: 物品名稱
+
+        Returns:
+            符合的關鍵字列表（依監控清單中的順序，不重複）
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        found = set()
+        for char in name:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+        return [self.patterns[index] for index in sorted(found)]
+
+    def price_limit(self, matches, default_limit):
+        """取得多個符合規則中最嚴格（最低）的價格上限
+
+        Args:
+            matches: match() 返回的關鍵字列表
+            default_limit: 規則價格上限為None時使用的上限（通常為錢包餘額）
+
+        Returns:
+            最低的價格上限，沒有符合的規則時返回None
+        """
+        if not matches:
+            return None
+        return min(
+            self.rules[pattern] if self.rules[pattern] is not None else default_limit
+            for pattern in matches
+        )
+
+
+class PetRule:
+    """編譯後的寵物篩選規則：必須技能及排除技能以位元遮罩表示"""
+
+    __slots__ = (
+        "skills", "exclude", "price_limit", "price_limit_wei", "priority", "budget_wei", "spent_wei",
+        "required_mask", "excluded_mask", "order",
+    )
+
+    def __init__(self, skills, price_limit, exclude=(), priority=0, budget=None, order=0):
+        self.skills = frozenset(skills)
+        self.exclude = frozenset(exclude)
+        self.price_limit = price_limit
+        self.price_limit_wei = to_wei(price_limit) if price_limit is not None else None
+        self.priority = priority
+        self.budget_wei = to_wei(budget) if budget is not None else None
+        self.spent_wei = 0
+        self.required_mask = 0
+        self.excluded_mask = 0
+        self.order = order
+
+    def __repr__(self):
+        return f"PetRule({self.describe()!r}, price_limit={self.price_limit}, priority={self.priority})"
+
+    def describe(self):
+        """顯示用的技能組合，排除的技能以 ! 開頭"""
+        parts = sorted(self.skills) + [f"!{skill}" for skill in sorted(self.exclude)]
+        return ", ".join(parts) if parts else "無技能"
+
+    def has_budget(self, price_wei):
+        """剩餘預算是否足夠購買"""
+        return self.budget_wei is None or self.spent_wei + price_wei <= self.budget_wei
+
+    def within_limit(self, price_wei, default_limit_wei=None):
+        """價格是否不超過價格上限，上限為None時使用 default_limit_wei（也為None時不限）"""
+        limit_wei = self.price_limit_wei if self.price_limit_wei is not None else default_limit_wei
+        return limit_wei is None or price_wei <= limit_wei
+
+
+def parse_pet_rule(rule, order=0):
+    """把 PET_FILTERS 的一項轉為 PetRule
+
+    Args:
+        rule: [{技能}, 價格上限] 或
+            {"skills": {技能}, "exclude": {技能}, "price": 價格上限, "priority": 優先度, "budget": 預算}
+        order: 規則在清單中的位置，優先度相同時越前面越優先
+    """
+    if isinstance(rule, dict):
+        return PetRule(
+            rule.get("skills") or (),
+            rule.get("price"),
+            exclude=rule.get("exclude") or (),
+            priority=rule.get("priority", 0),
+            budget=rule.get("budget"),
+            order=order,
+        )
+    skills, price_limit = rule
+    return PetRule(skills, price_limit, order=order)
+
+
+class PetRuleMatcher:
+    """寵物技能規則比對器（位元遮罩）
+
+    每個技能名稱在編譯時對應到一個位元，每條規則編譯為必須技能及排除技能兩個遮罩，
+    寵物只需轉換一次技能遮罩，比對時為整數 AND 運算。
+    規則依各自最小的必須技能位元建立索引，只檢查寵物擁有的技能對應到的規則，
+    且每個索引依優先順序排列，找到比目前結果更優先的規則後即停止。
+    多條規則符合時以優先度最高者為準（相同時以清單中較前面者為準），
+    價格超過上限或預算用完的規則略過，繼續比對下一條規則。
+    """
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules: 寵物篩選規則列表（格式見 parse_pet_rule）
+        """
+        self.rules = sorted(
+            (parse_pet_rule(rule, order) for order, rule in enumerate(rules)),
+            key=lambda rule: (-rule.priority, rule.order),
+        )
+        self._bits = {}  # 技能名稱 -> 位元位置
+        self._by_bit = {}  # 位元位置 -> 以該位元為索引的規則 [(排名, 必須遮罩, 排除遮罩, 規則)]
+        self._always = []  # 沒有必須技能的規則
+        self._lock = threading.Lock()
+        for rank, rule in enumerate(self.rules):
+            rule.required_mask = self._intern(rule.skills)
+            rule.excluded_mask = self._intern(rule.exclude)
+            entry = (rank, rule.required_mask, rule.excluded_mask, rule)
+            if rule.required_mask:
+                lowest_bit = (rule.required_mask & -rule.required_mask).bit_length() - 1
+                self._by_bit.setdefault(lowest_bit, []).append(entry)
+            else:
+                self._always.append(entry)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def _intern(self, skills):
+        mask = 0
+        for skill in skills:
+            bit = self._bits.get(skill)
+            if bit is None:
+                bit = self._bits[skill] = len(self._bits)
+            mask |= 1 << bit
+        return mask
+
+    def skill_mask(self, skills):
+        """把寵物技能轉為遮罩，沒有出現在任何規則中的技能不影響比對"""
+        mask = 0
+        bits = self._bits
+        for skill in skills:
+            bit = bits.get(skill)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def match(self, skills, price_wei=0, default_limit_wei=None):
+        """找出寵物符合的最優先規則
+
+        Args:
+            skills: 寵物技能名稱
+            price_wei: 寵物價格（Wei），價格超過上限或預算不足以購買的規則會被略過
+            default_limit_wei: 價格上限為None的規則使用的上限（Wei），None表示不限
+
+        Returns:
+            PetRule，沒有符合的規則時返回None
+        """
+        mask = self.skill_mask(skills)
+        best = None
+        # 每個索引列表都依排名排序，找到第一條符合的規則或排名不比目前最佳者優先時即停止
+        remaining = mask
+        lists = [self._always]
+        while remaining:
+            lowest = remaining & -remaining
+            ranks = self._by_bit.get(lowest.bit_length() - 1)
+            if ranks:
+                lists.append(ranks)
+            remaining ^= lowest
+        for entries in lists:
+            for rank, required_mask, excluded_mask, rule in entries:
+                if best is not None and rank >= best:
+                    break
+                if (
+                    mask & required_mask == required_mask
+                    and not mask & excluded_mask
+                    and rule.within_limit(price_wei, default_limit_wei)
+                    and rule.has_budget(price_wei)
+                ):
+                    best = rank
+                    break
+        return self.rules[best] if best is not None else None
+
+    def claim(self, rule, price_wei):
+        """購買前從規則預算扣除金額，預算不足時返回False"""
+        with self._lock:
+            if not rule.has_budget(price_wei):
+                return False
+            rule.spent_wei += price_wei
+            return True
+
+    def refund(self, rule, price_wei):
+        """購買失敗時把金額退回規則預算
+
+        規則在購買期間被重新載入時，退回到目前相同條件（技能及排除技能）的規則。
+        """
+        with self._lock:
+            for candidate in self.rules:
+                if candidate is rule or (candidate.skills, candidate.exclude) == (rule.skills, rule.exclude):
+                    candidate.spent_wei = max(candidate.spent_wei - price_wei, 0)
+                    return
+
+    def carry_over(self, previous):
+        """重新載入規則時，沿用舊規則中相同條件（技能及排除技能）的已花費金額"""
+        spent = {(rule.skills, rule.exclude): rule.spent_wei for rule in previous.rules}
+        for rule in self.rules:
+            rule.spent_wei = spent.get((rule.skills, rule.exclude), 0)
@@ -0,0 +1,234 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from listing import listed_timestamp
+from log import get_logger
+
+logger = get_logger("metrics")
+
+# 延遲類指標的預設區間（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_METRICS = []
+_METRICS_LOCK = threading.Lock()
+_SERVER = None
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """只會增加的計數器，依標籤值分開計數"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        """
+        Args:
+            name: 指標名稱
+            help_text: 指標說明
+            labelnames: 標籤名稱，inc() 時依相同順序傳入標籤值
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # 標籤值 -> 計數
+        self._lock = threading.Lock()
+        with _METRICS_LOCK:
+            _METRICS.append(self)
+
+    def inc(self, *labels, amount=1):
+        """增加計數"""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        """目前的計數"""
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Histogram:
+    """分佈統計（累計區間計數、總和及次數），依標籤值分開統計"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        """
+        Args:
+            name: 指標名稱
+            help_text: 指標說明
+            labelnames: 標籤名稱，observe() 時依相同順序傳入標籤值
+            buckets: 區間上限（遞增），會自動加上 +Inf
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}  # 標籤值 -> [各區間計數, 總和, 次數]
+        self._lock = threading.Lock()
+        with _METRICS_LOCK:
+            _METRICS.append(self)
+
+    def observe(self, value, *labels):
+        """紀錄一個觀察值"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels):
+        """觀察次數"""
+        with self._lock:
+            series = self._series.get(labels)
+            return series[2] if series else 0
+
+    def render(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._series.items())
+        lines = []
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+def render_metrics():
+    """以 Prometheus 文字格式輸出所有指標"""
+    with _METRICS_LOCK:
+        metrics = list(_METRICS)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# 市集API
+API_REQUESTS = Counter("msu_api_requests_total", "市集API請求數量", ("endpoint", "status"))
+API_LATENCY = Histogram("msu_api_request_seconds", "市集API回應時間（秒）", ("endpoint",))
+API_BLOCKED = Counter("msu_api_blocked_total", "被拒絕或限流的請求數量（403、429、Cloudflare驗證）", ("reason",))
+
+# 監控來源
+FEED_POLLS = Counter("msu_feed_polls_total", "市集來源查詢次數", ("feed", "result"))
+FEED_NEW_LISTINGS = Histogram(
+    "msu_feed_new_listings", "每次查詢的新上架物品數量", ("feed",),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 135, 500),
+)
+LISTING_TO_DETECT = Histogram(
+    "msu_listing_to_detect_seconds", "物品上架到偵測到的時間（秒）", ("feed",),
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600),
+)
+
+# 購買
+DETECT_TO_BUY = Histogram("msu_detect_to_buy_seconds", "偵測到物品到送出購買請求的時間（秒）")
+SETTLE_TIME = Histogram("msu_settle_seconds", "送出購買到交易結果確定的時間（秒）", ("result",))
+
+# Discord Bot
+DISCORD_REFRESH = Histogram("msu_discord_refresh_seconds", "Discord Bot 查詢單一追蹤道具的時間（秒）", ("result",))
+DISCORD_FLUSH = Histogram("msu_discord_flush_seconds", "Discord Bot 發送一輪回報的時間（秒）")
+
+
+def endpoint_label(method, url):
+    """把請求URL轉為指標標籤：去掉主機及API前綴，ID及錢包地址以佔位符取代"""
+    path = urlsplit(url).path
+    path = path.split("/api", 1)[1] if "/api/" in path else path
+    path = re.sub(r"/transaction/[^/]+/", "/transaction/{id}/", path)
+    path = re.sub(r"/balance/[^/]+$", "/balance/{wallet}", path)
+    path = re.sub(r"/\d+(?=/|$)", "/{id}", path)
+    return f"{method.upper()} {path}"
+
+
+def _record_response(response, *args, **kwargs):
+    endpoint = endpoint_label(response.request.method, response.url)
+    API_REQUESTS.inc(endpoint, str(response.status_code))
+    API_LATENCY.observe(response.elapsed.total_seconds(), endpoint)
+    if response.status_code in (403, 429):
+        API_BLOCKED.inc(str(response.status_code))
+
+
+def instrument_session(session):
+    """在 requests/cloudscraper 會話加上回應掛鉤，紀錄每個請求的端點、狀態碼及回應時間"""
+    session.hooks.setdefault("response", []).append(_record_response)
+    return session
+
+
+def observe_listing_age(feed, listed_at):
+    """紀錄物品上架到現在的時間，上架時間無法解析時略過"""
+    timestamp = listed_timestamp(listed_at)
+    if timestamp is not None:
+        LISTING_TO_DETECT.observe(max(time.time() - timestamp, 0), feed)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 不輸出每個抓取請求
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """在背景執行緒啟動 /metrics HTTP 端點（同一程序只會啟動一次）
+
+    連接埠已被使用（例如同時執行多個監控程序）時只顯示警告，不影響監控及購買。
+
+    Returns:
+        ThreadingHTTPServer，可用 shutdown() 停止；無法啟動時返回None
+    """
+    global _SERVER
+    with _METRICS_LOCK:
+        if _SERVER is None:
+            try:
+                _SERVER = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                logger.warning("無法在 %s:%d 啟動監控指標端點，略過: %s", host, port, e)
+                return None
+            threading.Thread(target=_SERVER.serve_forever, name="metrics", daemon=True).start()
+            logger.info("監控指標: http://%s:%d/metrics", host, _SERVER.server_port)
+        return _SERVER
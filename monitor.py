@@ -0,0 +1,199 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import config
+from api import get_buy_latency_stats, get_rate_limiter, get_wallet_pool
+from buyer import PetMonitor, EquipmentMonitor
+from log import get_logger
+from metrics import FEED_NEW_LISTINGS, FEED_POLLS, start_metrics_server
+from purchase import PurchasePipeline
+from watchconfig import WatchConfigReloader
+
+logger = get_logger("monitor")
+
+# 可用的市集來源: 名稱 -> 監控類別
+FEED_MONITORS = {
+    PetMonitor.name: PetMonitor,
+    EquipmentMonitor.name: EquipmentMonitor,
+}
+
+
+class MonitorEngine:
+    """非同步監控引擎
+
+    每個市集來源分片（裝備依分類分開查詢）與錢包餘額更新都是獨立的 asyncio 任務，
+    同步的 cloudscraper 呼叫交由有上限的執行緒池執行，
+    因此某個來源的等待或網路延遲不會拖慢其他來源。
+    符合條件的物品交給購買流程在背景購買，偵測不會等待交易結果。
+    監控設定檔 (WATCHLIST_FILE) 變更時在背景驗證及編譯，於各來源下一次查詢前替換，
+    認證會話及錢包不受影響。
+    """
+
+    def __init__(self, feeds, max_workers=None):
+        self.pipeline = PurchasePipeline()
+        self.monitors = [FEED_MONITORS[feed](buy=self.pipeline.submit) for feed in feeds]
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.MONITOR_MAX_WORKERS,
+            thread_name_prefix="monitor",
+        )
+        self.wallet_pool = get_wallet_pool()
+        self.watch_reloader = WatchConfigReloader(
+            config.WATCHLIST_FILE, [wallet.name for wallet in self.wallet_pool.wallets]
+        )
+
+    async def run_blocking(self, func, *args):
+        """在執行緒池中執行同步函數，不阻塞事件迴圈"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def _run_feed(self, monitor, shard=None):
+        """持續查詢單一市集來源分片，查詢間隔依該分片的上架速度及限流狀態調整"""
+        label = monitor.name if shard is None else f"{monitor.name}:{shard}"
+        poll_interval = monitor.poll_interval(shard)
+        rate_limiter = get_rate_limiter()
+        while True:
+            try:
+                new_count = await self.run_blocking(monitor.poll_once, shard)
+            except Exception as e:
+                FEED_POLLS.inc(label, "error")
+                logger.error("[%s] 發生錯誤: %s", label, e)
+                await asyncio.sleep(config.ERROR_RETRY_INTERVAL)
+                continue
+            if new_count is None:
+                FEED_POLLS.inc(label, "failed")
+            else:
+                FEED_POLLS.inc(label, "ok")
+                FEED_NEW_LISTINGS.observe(new_count, label)
+
+            # 適當休息，避免頻繁API呼叫
+            await asyncio.sleep(poll_interval.next_interval(new_count, rate_limiter.cooldown_remaining()))
+
+    async def _run_monitor(self, monitor):
+        """為來源的每個分片維持一個查詢任務，分片隨監控清單（或學到的裝備分類）增減"""
+        tasks = {}
+        try:
+            while True:
+                shards = set(monitor.shards())
+                for shard in shards - tasks.keys():
+                    name = monitor.name if shard is None else f"{monitor.name}:{shard}"
+                    tasks[shard] = asyncio.create_task(self._run_feed(monitor, shard), name=name)
+                for shard in tasks.keys() - shards:
+                    tasks.pop(shard).cancel()
+                await asyncio.sleep(config.SHARD_SYNC_INTERVAL)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    async def _refresh_balance(self):
+        """定期在背景以API餘額對帳本地錢包帳本（購買流程只讀取帳本，不等待此任務）"""
+        while True:
+            await asyncio.sleep(config.BALANCE_REFRESH_INTERVAL)
+            try:
+                await self.run_blocking(config.update_wallet_balance)
+            except Exception as e:
+                logger.warning("更新錢包餘額時發生錯誤: %s", e)
+
+    async def _snapshot_seen_ids(self):
+        """定期在背景快照各來源的已處理ID（沒有變動時不寫入），重新啟動後不會重複處理"""
+        while True:
+            await asyncio.sleep(config.DEDUP_SAVE_INTERVAL)
+            for monitor in self.monitors:
+                try:
+                    await self.run_blocking(monitor.save_state)
+                except Exception as e:
+                    logger.warning("[%s] 快照已處理ID時發生錯誤: %s", monitor.name, e)
+
+    def _apply_watch(self, watch):
+        """把新的監控設定交給各來源（下一次查詢前套用），錢包預算立即調整"""
+        for monitor in self.monitors:
+            monitor.reload(watch)
+        self.wallet_pool.set_budgets(watch.wallet_budgets)
+
+    async def _reload_watch_config(self):
+        """定期檢查監控設定檔，變更時在執行緒池中載入及編譯"""
+        while True:
+            await asyncio.sleep(config.WATCHLIST_RELOAD_INTERVAL)
+            try:
+                watch = await self.run_blocking(self.watch_reloader.check)
+            except Exception as e:
+                logger.warning("檢查監控設定檔時發生錯誤: %s", e)
+                continue
+            if watch is not None:
+                logger.info("監控設定檔已變更: %s", self.watch_reloader.path)
+                self._apply_watch(watch)
+
+    async def run(self):
+        """啟動所有監控任務，直到被中斷"""
+        if config.METRICS_PORT:
+            start_metrics_server(config.METRICS_PORT, config.METRICS_HOST)
+        # 更新並顯示當前錢包餘額
+        await self.run_blocking(config.update_wallet_balance)
+        await self.pipeline.start()
+        # 啟動時已有監控設定檔則直接套用
+        watch = await self.run_blocking(self.watch_reloader.check)
+        if watch is not None:
+            logger.info("使用監控設定檔: %s", self.watch_reloader.path)
+            self._apply_watch(watch)
+        for monitor in self.monitors:
+            monitor.apply_pending_watch()
+            monitor.print_watchlist()
+
+        tasks = [
+            asyncio.create_task(self._run_monitor(monitor), name=monitor.name)
+            for monitor in self.monitors
+        ]
+        tasks.append(asyncio.create_task(self._refresh_balance(), name="balance"))
+        tasks.append(asyncio.create_task(self._reload_watch_config(), name="watch-config"))
+        tasks.append(asyncio.create_task(self._snapshot_seen_ids(), name="seen-ids"))
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.pipeline.stop()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self._flush_price_history()
+            self._save_seen_ids()
+            self._print_latency_stats()
+
+    def wait_closed(self):
+        """等待執行緒池中進行中的查詢及購買結束（run() 結束後呼叫）
+
+        run() 結束時只取消尚未開始的工作，已在執行緒中進行的查詢、寵物技能查詢及交易結果查詢會繼續執行，
+        關閉市集伺服器（例如效能測試的模擬市集）前應先呼叫此函數。
+        """
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.pipeline.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _flush_price_history(self):
+        """寫入尚未寫入的價格歷史紀錄"""
+        for monitor in self.monitors:
+            if monitor.price_history is not None:
+                monitor.price_history.flush()
+
+    def _save_seen_ids(self):
+        """停止時快照各來源尚未寫入的已處理ID"""
+        for monitor in self.monitors:
+            try:
+                monitor.save_state()
+            except Exception as e:
+                logger.warning("[%s] 快照已處理ID時發生錯誤: %s", monitor.name, e)
+
+    def _print_latency_stats(self):
+        """顯示本次執行的「偵測到送出購買請求」延遲統計"""
+        stats = get_buy_latency_stats()
+        if stats:
+            logger.info(
+                "購買延遲統計 (%d 筆): p50 %.1f ms / p90 %.1f ms / max %.1f ms",
+                stats["count"], stats["p50"], stats["p90"], stats["max"], extra=stats,
+            )
+
+
+def run_monitor(feeds):
+    """以非同步引擎同時監控多個市集來源
+
+    Args:
+        feeds: 要監控的來源名稱列表，例如 ["pet", "equipment"]
+    """
+    logger.info("啟動監控引擎，來源: %s", ", ".join(feeds))
+    asyncio.run(MonitorEngine(feeds).run())
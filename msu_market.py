@@ -1,90 +1,168 @@
 # msu_market.py
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from decimal import ROUND_HALF_UP, Decimal
-from statistics import mean, median
 
 import cloudscraper
 from tabulate import tabulate
 
-WEI_PER_ETHER = Decimal("1000000000000000000")  # 1 Ether = 10^18 Wei
+from metrics import instrument_session
+
+from price_stats import (  # noqa: F401
+    WEI_PER_ETHER,
+    WeiPriceBuffer,
+    compute_price_stats,
+    compute_price_stats_batch,
+    compute_wei_stats_batch,
+    extract_prices_wei,
+)
+
+SEARCH_URL = "https://msu.io/marketplace/api/marketplace/explore/items"
+SEARCH_PAGE_SIZE = 135  # 每頁數量
+SEARCH_MAX_IN_FLIGHT = 4  # 單次搜尋同時進行的分頁請求上限
+SEARCH_MAX_PAGES = 500  # 單次搜尋最多讀取的頁數
+ALL_CLASSES = ["warrior", "magician", "bowman", "thief", "pirate"]
+
+# 每個執行緒重複使用自己的 scraper，避免每次查詢都重新建立 TLS 連線及通過 Cloudflare 驗證
+_SCRAPERS = threading.local()
+# 所有搜尋共用的分頁查詢執行緒池，執行緒（及其 scraper）在搜尋之間重複使用
+_PAGE_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="msu-search")
+
+
+def get_scraper():
+    """取得目前執行緒共用的 cloudscraper 連線"""
+    scraper = getattr(_SCRAPERS, "scraper", None)
+    if scraper is None:
+        scraper = instrument_session(cloudscraper.create_scraper())
+        _SCRAPERS.scraper = scraper
+    return scraper
+
+
+def build_search_filter(
+    item_name: str,
+    classes=None,
+    category: int = 0,
+    price=(0, 10000000000),
+    level=(0, 250),
+    starforce=(0, 25),
+    potential=(0, 4),
+    bonus_potential=(0, 4),
+):
+    """建立搜尋條件
+
+    Args:
+        item_name: 道具名稱（不分大小寫）
+        classes: 職業列表，None表示所有職業
+        category: 分類編號，0表示所有分類
+        price, level, starforce, potential, bonus_potential: (最小值, 最大值)
+    """
+    return {
+        "name": item_name.lower(),
+        "categoryNo": category,
+        "classes": list(classes or ALL_CLASSES),
+        "price": {"min": price[0], "max": price[1]},
+        "level": {"min": level[0], "max": level[1]},
+        "starforce": {"min": starforce[0], "max": starforce[1]},
+        "potential": {"min": potential[0], "max": potential[1]},
+        "bonusPotential": {"min": bonus_potential[0], "max": bonus_potential[1]},
+    }
 
 
-def fetch_items(item_name: str):
-    url = "https://msu.io/marketplace/api/marketplace/explore/items"
+def fetch_page(search_filter: dict, page_no: int = 1, page_size: int = SEARCH_PAGE_SIZE):
+    """以最低價排序查詢一頁搜尋結果"""
     payload = {
-        "filter": {
-            "name": item_name.lower(),
-            "categoryNo": 0,
-            "classes": ["thief"],
-            "price": {"min": 0, "max": 10000000000},
-            "level": {"min": 0, "max": 250},
-            "starforce": {"min": 0, "max": 25},
-            "potential": {"min": 0, "max": 4},
-            "bonusPotential": {"min": 0, "max": 4},
-        },
+        "filter": search_filter,
         "sorting": "ExploreSorting_LOWEST_PRICE",
-        "paginationParam": {"pageNo": 1, "pageSize": 135},
+        "paginationParam": {"pageNo": page_no, "pageSize": page_size},
     }
-
-    scraper = cloudscraper.create_scraper()
-    response = scraper.post(url, json=payload)
+    response = get_scraper().post(SEARCH_URL, json=payload)
     response.raise_for_status()
     return response.json()
 
 
-def compute_price_stats(items: list):
-    prices = []
-    for item in items:
-        price_wei_str = item.get("salesInfo", {}).get("priceWei")
-        if price_wei_str:
-            price_wei = Decimal(price_wei_str)
-            price_ether = (price_wei / WEI_PER_ETHER).quantize(
-                Decimal("0.000000000000000001"), rounding=ROUND_HALF_UP
-            )
-            prices.append(price_ether)
-
-    if not prices:
-        return None
-
-    prices.sort()
-
-    lowest_price = prices[0]
-    second_lowest_price = prices[1] if len(prices) > 1 else None
-    avg_price = Decimal(mean(prices)) if prices else Decimal("0")
-    median_price = Decimal(median(prices)) if prices else Decimal("0")
-
-    price_gap_percent = None
-    if second_lowest_price:
-        price_gap_percent = (
-            (second_lowest_price - lowest_price) / second_lowest_price * 100
-        ).quantize(Decimal("0.01"))
-
-    median_discount_percent = None
-    if median_price > 0:
-        median_discount_percent = (
-            (median_price - lowest_price) / median_price * 100
-        ).quantize(Decimal("0.01"))
-
-    avg_discount_percent = None
-    if avg_price > 0:
-        avg_discount_percent = ((avg_price - lowest_price) / avg_price * 100).quantize(
-            Decimal("0.01")
-        )
-
-    should_buy = False
-    if price_gap_percent and median_discount_percent:
-        if price_gap_percent > 10 and median_discount_percent > 20:
-            should_buy = True
-
-    return {
-        "lowest_price": lowest_price,
-        "second_lowest_price": second_lowest_price,
-        "avg_price": avg_price,
-        "median_price": median_price,
-        "price_gap_percent": price_gap_percent,
-        "median_discount_percent": median_discount_percent,
-        "avg_discount_percent": avg_discount_percent,
-        "should_buy": should_buy,
-    }
+def fetch_items(item_name: str, page_no: int = 1, page_size: int = SEARCH_PAGE_SIZE, **filters):
+    """查詢單頁搜尋結果，filters 同 build_search_filter"""
+    return fetch_page(build_search_filter(item_name, **filters), page_no, page_size)
+
+
+def iter_item_pages(
+    item_name: str,
+    page_size: int = SEARCH_PAGE_SIZE,
+    max_in_flight: int = SEARCH_MAX_IN_FLIGHT,
+    max_pages: int = SEARCH_MAX_PAGES,
+    **filters,
+):
+    """依序產生所有搜尋結果頁面的物品列表
+
+    後面的頁面會以滑動視窗同時查詢（最多 max_in_flight 個請求），
+    但每次只保留視窗內的頁面，因此即使有數萬筆結果，分頁本身的記憶體用量也不會增加。
+    回應有 totalCount 時只查詢需要的頁數，否則讀到不滿一頁時停止。
+
+    Args:
+        item_name: 道具名稱
+        page_size: 每頁數量
+        max_in_flight: 同時進行的分頁請求上限
+        max_pages: 最多讀取的頁數
+        filters: 其他搜尋條件，同 build_search_filter
+
+    Yields:
+        每一頁的物品列表（依頁碼順序）
+    """
+    search_filter = build_search_filter(item_name, **filters)
+    first_page = fetch_page(search_filter, 1, page_size)
+    items = first_page.get("items", [])
+    yield items
+    if len(items) < page_size:
+        return
+
+    total_count = (first_page.get("paginationResult") or {}).get("totalCount")
+    last_page = max_pages
+    if total_count is not None:
+        last_page = min(max_pages, -(-int(total_count) // page_size))
+
+    window = deque()
+    next_page = 2
+    try:
+        while window or next_page <= last_page:
+            while next_page <= last_page and len(window) < max_in_flight:
+                window.append(_PAGE_POOL.submit(fetch_page, search_filter, next_page, page_size))
+                next_page += 1
+            items = window.popleft().result().get("items", [])
+            if items:
+                yield items
+            if len(items) < page_size:
+                # 已到最後一頁
+                return
+    finally:
+        # 讀完、查詢失敗或呼叫端提早停止時，取消尚未開始的請求，避免繼續消耗限速額度
+        for future in window:
+            future.cancel()
+
+
+def search_price_stats(item_name: str, percentiles=(), on_page=None, **filters):
+    """讀取所有搜尋結果並計算價格統計
+
+    每頁只取出價格存入 int64 緩衝區 (WeiPriceBuffer，每筆約 8 bytes)，物品內容在處理完該頁後即可釋放，
+    中位數與百分位數仍以所有價格精確計算。
+
+    Args:
+        item_name: 道具名稱
+        percentiles: 額外計算的百分位數
+        on_page: 每讀到一頁時以物品列表呼叫，例如紀錄到價格歷史
+        filters: 搜尋條件，同 iter_item_pages
+
+    Returns:
+        (物品數量, 價格統計)，沒有任何價格時統計為None
+    """
+    prices = WeiPriceBuffer()
+    count = 0
+    for items in iter_item_pages(item_name, **filters):
+        count += len(items)
+        prices.extend(extract_prices_wei(items))
+        if on_page is not None:
+            on_page(items)
+    return count, prices.stats(percentiles)
 
 
 def format_price_table(item_name: str, stats: dict):
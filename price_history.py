@@ -0,0 +1,253 @@
+import os
+import sqlite3
+import threading
+import time
+
+from listing import Listing
+from price_stats import compute_wei_stats_batch
+
+# 監控程式（config.STATE_DIR、config.PRICE_HISTORY_FILE）與 Discord Bot 共用的預設位置，
+# 定義在這裡是因為 Discord Bot 不載入 config.py（需要 config.json）
+DEFAULT_STATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "state")
+DEFAULT_FILE = "price_history.db"
+DEFAULT_PATH = os.path.join(DEFAULT_STATE_DIR, DEFAULT_FILE)
+
+DEFAULT_BATCH_SIZE = 500  # 累積多少筆觀察紀錄後寫入
+DEFAULT_FLUSH_INTERVAL = 10  # 距離上次寫入超過多少秒時寫入（秒）
+PRUNE_INTERVAL = 60 * 60  # 刪除過期紀錄的間隔（秒）
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    token_id TEXT NOT NULL,
+    price_wei TEXT NOT NULL,
+    name TEXT NOT NULL,
+    category INTEGER,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (token_id, price_wei)
+);
+DROP INDEX IF EXISTS listings_name_time;
+CREATE INDEX IF NOT EXISTS listings_name_seen ON listings (name, last_seen);
+CREATE INDEX IF NOT EXISTS listings_time ON listings (last_seen);
+CREATE TABLE IF NOT EXISTS item_names (name TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS item_names_nocase ON item_names (name COLLATE NOCASE);
+INSERT OR IGNORE INTO item_names (name)
+    SELECT DISTINCT name FROM listings WHERE NOT EXISTS (SELECT 1 FROM item_names);
+"""
+
+_INSERT_NAME = "INSERT OR IGNORE INTO item_names (name) VALUES (?)"
+
+# 同一物品以相同價格再次出現時只更新最後出現時間
+_UPSERT = """
+INSERT INTO listings (token_id, price_wei, name, category, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (token_id, price_wei) DO UPDATE SET
+    last_seen = MAX(last_seen, excluded.last_seen),
+    first_seen = MIN(first_seen, excluded.first_seen)
+"""
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def _name_condition(name, exact):
+    """名稱的查詢條件：exact 為True時名稱需完全相同，否則為包含該名稱（皆不分大小寫）
+
+    先在不重複的物品名稱表 (item_names) 中找出符合的名稱，再以名稱索引查詢紀錄，
+    包含查詢只需掃描名稱表，不會掃描整個紀錄表。
+    """
+    if exact:
+        return ["name IN (SELECT name FROM item_names WHERE name = ? COLLATE NOCASE)"], [name]
+    escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return ["name IN (SELECT name FROM item_names WHERE name LIKE ? ESCAPE '\\')"], [f"%{escaped}%"]
+
+
+class PriceHistoryStore:
+    """市集價格歷史紀錄（SQLite，WAL 模式）
+
+    每次查詢到的物品都以 (tokenId, 價格) 為單位紀錄首次及最後出現時間，
+    觀察紀錄先累積在記憶體中，達到批次大小或寫入間隔時以單一交易寫入。
+    可依物品名稱與時間範圍查詢歷史價格統計（中位數、百分位數等），不需要再呼叫API。
+    設定保存期限時，最後出現時間超過期限的紀錄會定期刪除，資料表不會無限制成長。
+    """
+
+    def __init__(self, path, batch_size=None, flush_interval=None, retention=None):
+        """
+        Args:
+            path: 資料庫檔案路徑
+            batch_size: 累積多少筆觀察紀錄後寫入，預設為 DEFAULT_BATCH_SIZE
+            flush_interval: 距離上次寫入超過多少秒時寫入，預設為 DEFAULT_FLUSH_INTERVAL
+            retention: 紀錄的保存秒數（依最後出現時間），None表示永久保存
+        """
+        self.path = path
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else DEFAULT_FLUSH_INTERVAL
+        self.retention = retention
+        self._pending = {}  # (tokenId, priceWei) -> 觀察紀錄
+        self._pending_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._last_prune = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 監控的多個執行緒共用同一個連線，以 _db_lock 保護
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.prune()
+
+    def record(self, items, seen_at=None):
+        """紀錄一批查詢到的市集物品，累積足夠數量或超過寫入間隔時寫入
+
+        Args:
+            items: 市集物品列表（explore API 的 items 或 Listing）
+            seen_at: 觀察時間 (time.time())，預設為現在
+        """
+        seen_at = seen_at or time.time()
+        with self._pending_lock:
+            for item in items:
+                if isinstance(item, Listing):
+                    token_id, price_wei, name, category = item.token_id, str(item.price_wei), item.name, item.category
+                else:
+                    price_wei = item.get("salesInfo", {}).get("priceWei")
+                    if not price_wei:
+                        continue
+                    token_id, name, category = item["tokenId"], item.get("name", ""), item.get("categoryNo")
+                key = (token_id, price_wei)
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = [token_id, price_wei, name, category, seen_at, seen_at]
+                else:
+                    pending[5] = max(pending[5], seen_at)
+            should_flush = (
+                len(self._pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """把累積的觀察紀錄以單一交易寫入資料庫
+
+        Returns:
+            寫入的筆數
+        """
+        with self._pending_lock:
+            rows = list(self._pending.values())
+            self._pending.clear()
+            self._last_flush = time.monotonic()
+        if not rows:
+            return 0
+        with self._db_lock, self._conn:
+            self._conn.executemany(_UPSERT, rows)
+            self._conn.executemany(_INSERT_NAME, ((name,) for name in {row[2] for row in rows}))
+        if self.retention is not None and time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+            self.prune()
+        return len(rows)
+
+    def prune(self):
+        """刪除最後出現時間超過保存期限的紀錄，以及不再有任何紀錄的物品名稱
+
+        Returns:
+            刪除的紀錄筆數
+        """
+        self._last_prune = time.monotonic()
+        if self.retention is None:
+            return 0
+        with self._db_lock, self._conn:
+            deleted = self._conn.execute(
+                "DELETE FROM listings WHERE last_seen < ?", (time.time() - self.retention,)
+            ).rowcount
+            if deleted:
+                self._conn.execute("DELETE FROM item_names WHERE name NOT IN (SELECT name FROM listings)")
+        return deleted
+
+    def close(self):
+        """寫入剩餘的觀察紀錄並關閉連線"""
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    def get_prices(self, name, since=None, until=None, exact=False):
+        """查詢時間範圍內出現過的物品價格
+
+        Args:
+            name: 物品名稱（不分大小寫）
+            since: 開始時間 (time.time())，None表示不限
+            until: 結束時間 (time.time())，None表示不限
+            exact: 為True時名稱需完全相同，否則為包含該名稱的所有物品
+
+        Returns:
+            priceWei 字串列表
+        """
+        conditions, params = _name_condition(name, exact)
+        # 出現期間與時間範圍重疊的物品
+        if since is not None:
+            conditions.append("last_seen >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("first_seen <= ?")
+            params.append(until)
+        query = f"SELECT price_wei FROM listings WHERE {' AND '.join(conditions)}"
+        self.flush()
+        with self._db_lock:
+            return [row[0] for row in self._conn.execute(query, params)]
+
+    def categories(self, name, exact=False):
+        """查詢物品出現過的分類編號
+
+        Args:
+            name: 物品名稱（不分大小寫）
+            exact: 為True時名稱需完全相同，否則為包含該名稱的所有物品
+
+        Returns:
+            分類編號列表，出現次數多的在前
+        """
+        conditions, params = _name_condition(name, exact)
+        conditions.append("category IS NOT NULL")
+        query = (
+            f"SELECT category FROM listings WHERE {' AND '.join(conditions)} "
+            "GROUP BY category ORDER BY COUNT(*) DESC"
+        )
+        self.flush()
+        with self._db_lock:
+            return [row[0] for row in self._conn.execute(query, params)]
+
+    def name_categories(self):
+        """查詢所有出現過的物品名稱及其分類編號
+
+        Returns:
+            (物品名稱, 分類編號) 列表，不重複
+        """
+        query = "SELECT DISTINCT name, category FROM listings WHERE category IS NOT NULL"
+        self.flush()
+        with self._db_lock:
+            return self._conn.execute(query).fetchall()
+
+    def price_stats(self, names, since=None, until=None, exact=False, percentiles=(10, 25, 75, 90)):
+        """計算多個物品在時間範圍內的歷史價格統計
+
+        Args:
+            names: 物品名稱列表
+            since, until, exact: 同 get_prices
+            percentiles: 額外計算的百分位數
+
+        Returns:
+            {物品名稱: 統計結果}，沒有任何紀錄的物品為None
+        """
+        prices_by_name = {name: self.get_prices(name, since, until, exact) for name in names}
+        return compute_wei_stats_batch(prices_by_name, percentiles)
+
+
+def open_price_history(path, **kwargs):
+    """取得指定路徑的共用價格歷史紀錄（同一檔案只開啟一次）"""
+    path = os.path.abspath(path)
+    with _STORES_LOCK:
+        store = _STORES.get(path)
+        if store is None:
+            store = PriceHistoryStore(path, **kwargs)
+            _STORES[path] = store
+        return store
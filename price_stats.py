@@ -0,0 +1,283 @@
+from array import array
+from decimal import ROUND_HALF_UP, Decimal
+from fractions import Fraction
+from itertools import chain
+import math
+
+try:
+    import numpy as np
+except ImportError:  # 沒有安裝 NumPy 時改用 Python 整數計算
+    np = None
+
+WEI_PER_ETHER = Decimal("1000000000000000000")  # 1 Ether = 10^18 Wei
+WEI_DECIMALS = 18
+ETHER_QUANTUM = Decimal("0.000000000000000001")
+PERCENT_QUANTUM = Decimal("0.01")
+_INT64_MAX = 2 ** 63 - 1
+_WHOLE_ETHER_SUFFIX = "0" * WEI_DECIMALS
+
+
+def wei_to_ether(price_wei):
+    """把 Wei（整數或字串）轉為 18 位小數的 Ether"""
+    return (Decimal(price_wei) / WEI_PER_ETHER).quantize(ETHER_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def extract_prices_wei(items: list):
+    """取出物品列表中所有的 priceWei 字串（略過沒有價格的物品）"""
+    prices = []
+    for item in items:
+        price_wei_str = item.get("salesInfo", {}).get("priceWei")
+        if price_wei_str:
+            prices.append(price_wei_str)
+    return prices
+
+
+def _scale(prices_wei):
+    """去掉同一組價格共同的尾數0，讓價格能以 int64 計算
+
+    市集價格通常是整數遊戲幣（10^18 Wei 的倍數），縮放後的數值遠小於 int64 上限。
+
+    Returns:
+        (縮放後的整數列表, 去掉的位數)
+    """
+    # 常見情況：所有價格都是整數遊戲幣
+    if all(price.endswith(_WHOLE_ETHER_SUFFIX) for price in prices_wei):
+        return [int(price[:-WEI_DECIMALS] or 0) for price in prices_wei], WEI_DECIMALS
+    shift = WEI_DECIMALS
+    for price in prices_wei:
+        shift = min(shift, len(price) - len(price.rstrip("0")))
+        if shift == 0:
+            return [int(price) for price in prices_wei], 0
+    return [int(price[:-shift] or 0) for price in prices_wei], shift
+
+
+class WeiPriceBuffer:
+    """逐頁累積 priceWei 的精簡緩衝區
+
+    價格去掉共同的尾數0後以 int64 陣列 (array('q')) 保存，每筆約 8 bytes，
+    不保留 priceWei 字串；出現更小單位的價格時重新縮放，超出 int64 時改用 Python 整數。
+    """
+
+    def __init__(self):
+        self.values = array("q")
+        self.shift = WEI_DECIMALS
+
+    def __len__(self):
+        return len(self.values)
+
+    def extend(self, prices_wei):
+        """加入多個 priceWei 字串"""
+        for price in prices_wei:
+            zeros = len(price) - len(price.rstrip("0"))
+            if zeros < self.shift:
+                self._rescale(zeros)
+            value = int(price[:-self.shift] or 0) if self.shift else int(price)
+            if isinstance(self.values, array) and value > _INT64_MAX:
+                self.values = list(self.values)
+            self.values.append(value)
+
+    def _rescale(self, shift):
+        """改用較少的去掉位數，已累積的價格乘上對應的倍數"""
+        factor = 10 ** (self.shift - shift)
+        self.shift = shift
+        values = [value * factor for value in self.values]
+        if isinstance(self.values, array) and (not values or max(values) <= _INT64_MAX):
+            values = array("q", values)
+        self.values = values
+
+    def stats(self, percentiles=()):
+        """計算累積價格的統計，結果與 compute_wei_stats_batch 相同，沒有任何價格時返回None"""
+        return _compute_scaled_stats({None: (self.values, self.shift)}, percentiles)[None]
+
+
+class _SortedPrices:
+    """一個物品排序後的縮放價格及總和，供 _build_stats 使用"""
+
+    __slots__ = ("values", "count", "total", "shift", "stdev")
+
+    def __init__(self, values, count, total, shift, stdev):
+        self.values = values
+        self.count = count
+        self.total = total
+        self.shift = shift
+        self.stdev = stdev
+
+    def wei(self, index):
+        return int(self.values[index]) * 10 ** self.shift
+
+
+def _sorted_python(values, shift):
+    """以 Python 整數排序及加總（沒有 NumPy 或數值超出 int64 時使用）"""
+    values = sorted(values)
+    count = len(values)
+    total = sum(values)
+    mean = total / count
+    stdev = math.sqrt(sum((value - mean) ** 2 for value in values) / count)
+    return _SortedPrices(values, count, total, shift, stdev)
+
+
+def _sorted_numpy(groups):
+    """以 NumPy 一次排序及加總多個物品的價格
+
+    所有物品的價格串接成同一個 int64 陣列，依 (物品, 價格) 排序後
+    再以 reduceat 分段計算總和與標準差。
+
+    Args:
+        groups: [(縮放後的價格列表, 去掉的位數)]
+
+    Returns:
+        與 groups 順序相同的 _SortedPrices 列表
+    """
+    counts = np.fromiter((len(values) for values, _ in groups), dtype=np.int64, count=len(groups))
+    values = np.fromiter(chain.from_iterable(values for values, _ in groups), dtype=np.int64, count=int(counts.sum()))
+    segments = np.repeat(np.arange(len(groups)), counts)
+    values = values[np.lexsort((values, segments))]
+
+    starts = np.zeros(len(groups), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    totals = np.add.reduceat(values, starts)
+    means = totals / counts
+    deviations = values - np.repeat(means, counts)
+    stdevs = np.sqrt(np.add.reduceat(deviations * deviations, starts) / counts)
+
+    return [
+        _SortedPrices(values[start:start + count], int(count), int(total), shift, float(stdev))
+        for (_, shift), start, count, total, stdev in zip(groups, starts, counts, totals, stdevs)
+    ]
+
+
+def _percentile_ether(prices, percentile):
+    """線性內插百分位數（與 numpy.percentile 預設方法相同），以分數精確計算"""
+    position = Fraction(percentile) * (prices.count - 1) / 100
+    lower = math.floor(position)
+    value = Fraction(prices.wei(lower))
+    if position > lower:
+        value += (prices.wei(lower + 1) - value) * (position - lower)
+    ether = Decimal(value.numerator) / (Decimal(value.denominator) * WEI_PER_ETHER)
+    return ether.quantize(ETHER_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def _build_stats(prices, percentiles):
+    """由排序後的價格計算統計結果，數值與原本以 Decimal 逐筆計算的結果相同"""
+    count = prices.count
+    lowest_price = wei_to_ether(prices.wei(0))
+    second_lowest_price = wei_to_ether(prices.wei(1)) if count > 1 else None
+    # 與 statistics.mean 相同：精確的總和除以數量後四捨五入到 Decimal 精度
+    avg_price = Decimal(prices.total * 10 ** prices.shift) / (Decimal(count) * WEI_PER_ETHER)
+    middle = count // 2
+    if count % 2:
+        median_price = wei_to_ether(prices.wei(middle))
+    else:
+        median_price = (wei_to_ether(prices.wei(middle - 1)) + wei_to_ether(prices.wei(middle))) / 2
+
+    price_gap_percent = None
+    if second_lowest_price:
+        price_gap_percent = (
+            (second_lowest_price - lowest_price) / second_lowest_price * 100
+        ).quantize(PERCENT_QUANTUM)
+
+    median_discount_percent = None
+    if median_price > 0:
+        median_discount_percent = (
+            (median_price - lowest_price) / median_price * 100
+        ).quantize(PERCENT_QUANTUM)
+
+    avg_discount_percent = None
+    if avg_price > 0:
+        avg_discount_percent = ((avg_price - lowest_price) / avg_price * 100).quantize(
+            PERCENT_QUANTUM
+        )
+
+    should_buy = False
+    if price_gap_percent and median_discount_percent:
+        if price_gap_percent > 10 and median_discount_percent > 20:
+            should_buy = True
+
+    # 離散程度：母體標準差及變異係數
+    price_stdev = (Decimal(prices.stdev) * 10 ** prices.shift / WEI_PER_ETHER).quantize(PERCENT_QUANTUM)
+    price_cv_percent = None
+    if avg_price > 0:
+        price_cv_percent = (price_stdev / avg_price * 100).quantize(PERCENT_QUANTUM)
+
+    return {
+        "lowest_price": lowest_price,
+        "second_lowest_price": second_lowest_price,
+        "avg_price": avg_price,
+        "median_price": median_price,
+        "price_gap_percent": price_gap_percent,
+        "median_discount_percent": median_discount_percent,
+        "avg_discount_percent": avg_discount_percent,
+        "should_buy": should_buy,
+        "price_stdev": price_stdev,
+        "price_cv_percent": price_cv_percent,
+        "percentiles": {percentile: _percentile_ether(prices, percentile) for percentile in percentiles},
+        "count": count,
+    }
+
+
+def compute_wei_stats_batch(prices_by_name: dict, percentiles=()):
+    """一次計算多組 priceWei 的價格統計
+
+    價格以整數 Wei 計算（縮放成 int64 後交給 NumPy 批次排序及加總），
+    只有最後的少數結果才轉為 Decimal。
+
+    Args:
+        prices_by_name: {物品名稱: priceWei 字串列表}
+        percentiles: 額外計算的百分位數，例如 (10, 25, 75, 90)
+
+    Returns:
+        {物品名稱: 統計結果}，沒有任何價格的物品為None
+    """
+    return _compute_scaled_stats(
+        {name: _scale(prices_wei) if prices_wei else None for name, prices_wei in prices_by_name.items()},
+        percentiles,
+    )
+
+
+def _compute_scaled_stats(groups, percentiles):
+    """計算多組縮放後價格的統計
+
+    Args:
+        groups: {物品名稱: (縮放後的價格, 去掉的位數)}，沒有價格時為None
+        percentiles: 額外計算的百分位數
+
+    Returns:
+        {物品名稱: 統計結果}，沒有任何價格的物品為None
+    """
+    results = {name: None for name in groups}
+    numpy_groups, numpy_names = [], []
+    for name, group in groups.items():
+        if not group or not len(group[0]):
+            continue
+        values, shift = group
+        # 總和也必須放得進 int64 才能交給 NumPy
+        if np is not None and max(values) * len(values) <= _INT64_MAX:
+            numpy_groups.append((values, shift))
+            numpy_names.append(name)
+        else:
+            results[name] = _build_stats(_sorted_python(values, shift), percentiles)
+
+    if numpy_groups:
+        for name, prices in zip(numpy_names, _sorted_numpy(numpy_groups)):
+            results[name] = _build_stats(prices, percentiles)
+    return results
+
+
+def compute_price_stats_batch(items_by_name: dict, percentiles=()):
+    """一次計算多個物品的價格統計
+
+    Args:
+        items_by_name: {物品名稱: 市集物品列表}
+        percentiles: 額外計算的百分位數，例如 (10, 25, 75, 90)
+
+    Returns:
+        {物品名稱: 統計結果}，沒有任何價格的物品為None
+    """
+    return compute_wei_stats_batch(
+        {name: extract_prices_wei(items) for name, items in items_by_name.items()}, percentiles
+    )
+
+
+def compute_price_stats(items: list, percentiles=()):
+    """計算單一物品的價格統計，沒有任何價格時返回None"""
+    return compute_price_stats_batch({None: items}, percentiles)[None]
@@ -0,0 +1,205 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import config
+from log import fields, get_logger
+from metrics import SETTLE_TIME
+from api import (
+    submit_buy_order, get_transaction_result, get_wallet_pool,
+    TX_CODE_PENDING, TX_CODE_SUCCESS, TX_SUCCESS, TX_FAILED, TX_TIMEOUT, TX_UNKNOWN,
+)
+
+logger = get_logger("purchase")
+
+# 購買請求在完成前的狀態，完成後為 TX_SUCCESS、TX_FAILED、TX_TIMEOUT 或 TX_UNKNOWN
+BUY_QUEUED = "queued"
+BUY_SUBMITTING = "submitting"
+BUY_PENDING = "pending"
+
+
+class BuyRequest:
+    """一筆待購買的物品"""
+
+    def __init__(self, token_id, price_wei, label, detected_at=None, on_result=None):
+        self.token_id = token_id
+        self.price_wei = price_wei
+        self.label = label
+        self.detected_at = detected_at
+        self.on_result = on_result
+        self.wallet = None
+        self.transaction_id = None
+        self.state = BUY_QUEUED
+
+
+class PurchasePipeline:
+    """非阻塞購買流程
+
+    偵測迴圈呼叫 submit() 把購買交給背景的購買工作者後立即返回，
+    工作者送出訂單後以非同步輪詢（退避間隔）等待交易結果，
+    因此前面的交易還在處理時仍可持續偵測新上架的物品。
+    每筆購買交給錢包池中餘額足夠且最閒置的錢包，多個錢包可同時購買不同物品；
+    所有錢包都忙碌時等待錢包空出，沒有任何錢包買得起時直接放棄。
+    是否買得起只看錢包池的本地帳本，購買後不會再呼叫餘額API。
+    """
+
+    def __init__(self, wallet_pool=None, max_in_flight=None):
+        """
+        Args:
+            wallet_pool: 購買用的錢包池，預設為 api.get_wallet_pool()
+            max_in_flight: 同時進行的購買數量上限，預設為錢包數量乘以 config.MAX_BUYS_IN_FLIGHT
+        """
+        self.wallet_pool = wallet_pool or get_wallet_pool()
+        self.max_in_flight = max_in_flight or len(self.wallet_pool) * config.MAX_BUYS_IN_FLIGHT
+        self.executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="buyer")
+        self.loop = None
+        self.queue = None
+        self._wallet_released = None
+        self._workers = []
+        self._stopped = False
+
+    async def start(self):
+        """啟動購買工作者（需在事件迴圈中呼叫）"""
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self._wallet_released = asyncio.Condition()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"buyer-{index}")
+            for index in range(self.max_in_flight)
+        ]
+
+    def stop(self):
+        """停止購買工作者，之後送入的購買會直接視為失敗"""
+        self._stopped = True
+        for worker in self._workers:
+            worker.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, token_id, price_wei, label, detected_at=None, on_result=None):
+        """排入一筆購買，可在任何執行緒呼叫，不會等待交易結果
+
+        Args:
+            token_id: 物品的 tokenId
+            price_wei: 價格（Wei）
+            label: 顯示用的物品名稱
+            detected_at: 偵測到物品時的 time.perf_counter() 值
+            on_result: 購買結束後在事件迴圈中呼叫 on_result(最終狀態)
+
+        Returns:
+            BuyRequest，可用來查詢購買狀態
+        """
+        request = BuyRequest(token_id, price_wei, label, detected_at, on_result)
+        if self._stopped:
+            # 引擎停止後仍在執行緒中判斷的物品（事件迴圈可能已關閉）
+            request.state = TX_FAILED
+            logger.warning("購買流程已停止，跳過 %s", label, extra=fields(token_id=token_id))
+            if on_result is not None:
+                on_result(request.state)
+            return request
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, request)
+        return request
+
+    async def _run_blocking(self, func, *args):
+        return await self.loop.run_in_executor(self.executor, func, *args)
+
+    async def _worker(self):
+        while True:
+            request = await self.queue.get()
+            try:
+                await self._process(request)
+            except Exception as e:
+                # 已送出（或正在送出）訂單時交易仍可能完成，結果視為未知
+                request.state = TX_UNKNOWN if request.state in (BUY_SUBMITTING, BUY_PENDING) else TX_FAILED
+                logger.error("購買 %s 時發生錯誤: %s", request.label, e, extra=fields(token_id=request.token_id))
+            finally:
+                self.queue.task_done()
+            if request.on_result is not None:
+                try:
+                    request.on_result(request.state)
+                except Exception as e:
+                    logger.error("處理 %s 的購買結果時發生錯誤: %s", request.label, e)
+
+    async def _acquire_wallet(self, request):
+        """等待一個餘額足夠且有空的錢包，沒有任何錢包買得起時返回None"""
+        price_wei = int(request.price_wei)
+        async with self._wallet_released:
+            while True:
+                if not self.wallet_pool.can_afford(price_wei):
+                    return None
+                wallet = self.wallet_pool.acquire(price_wei)
+                if wallet is not None:
+                    return wallet
+                await self._wallet_released.wait()
+
+    async def _release_wallet(self, request, spent):
+        async with self._wallet_released:
+            self.wallet_pool.release(request.wallet, int(request.price_wei), spent)
+            self._wallet_released.notify_all()
+
+    async def _process(self, request):
+        """分配錢包、送出訂單並等待交易結果"""
+        request.wallet = await self._acquire_wallet(request)
+        if request.wallet is None:
+            request.state = TX_FAILED
+            logger.warning("所有錢包的餘額或預算都不足，跳過 %s", request.label, extra=fields(token_id=request.token_id))
+            return
+
+        # 發生例外時交易可能已完成，與結果未知相同先扣款，寧可少買也不超支
+        spent = True
+        try:
+            spent = await self._buy(request)
+        finally:
+            # 成功或結果未知時在本地帳本扣款，確定失敗時才釋放預留金額；
+            # 實際未花費的扣款由背景的 WalletPool.reconcile 依API餘額校正
+            await self._release_wallet(request, spent)
+
+    async def _buy(self, request):
+        """以分配到的錢包購買，返回是否可能已花費（成功或結果未知）"""
+        wallet_label = f" [{request.wallet.name}]" if len(self.wallet_pool) > 1 else ""
+        context = fields(token_id=request.token_id, wallet=request.wallet.name, transaction_id=None)
+        request.state = BUY_SUBMITTING
+        request.transaction_id = await self._run_blocking(
+            submit_buy_order, request.token_id, request.price_wei, request.detected_at, request.wallet
+        )
+        if request.transaction_id is None:
+            request.state = TX_FAILED
+            logger.warning("購買 %s 失敗%s", request.label, wallet_label, extra=context)
+            return False
+
+        request.state = BUY_PENDING
+        request.state = await self._settle(request.transaction_id, request.wallet)
+        context["transaction_id"] = request.transaction_id
+        if request.state == TX_SUCCESS:
+            logger.info("已成功購買 %s%s", request.label, wallet_label, extra=context)
+        elif request.state in (TX_TIMEOUT, TX_UNKNOWN):
+            logger.warning(
+                "購買 %s 的交易在 %s 秒內仍未確認結果，請稍後確認%s",
+                request.label, config.SETTLE_TIMEOUT, wallet_label, extra=context,
+            )
+        else:
+            logger.warning("購買 %s 失敗%s", request.label, wallet_label, extra=context)
+        return request.state != TX_FAILED
+
+    async def _settle(self, transaction_id, wallet=None):
+        """以退避間隔非同步輪詢交易結果，並紀錄結算時間
+
+        Returns:
+            TX_SUCCESS、TX_FAILED、TX_TIMEOUT 或 TX_UNKNOWN
+        """
+        started = self.loop.time()
+        result = await self._poll_result(transaction_id, wallet)
+        SETTLE_TIME.observe(self.loop.time() - started, result)
+        return result
+
+    async def _poll_result(self, transaction_id, wallet):
+        delay = config.SETTLE_POLL_INITIAL
+        deadline = self.loop.time() + config.SETTLE_TIMEOUT
+        while True:
+            code = await self._run_blocking(get_transaction_result, transaction_id, wallet)
+            if code == TX_CODE_SUCCESS:
+                return TX_SUCCESS
+            # 查詢失敗（None）時交易可能仍會完成，視同處理中
+            if code not in (TX_CODE_PENDING, None):
+                return TX_FAILED
+            if self.loop.time() + delay > deadline:
+                return TX_TIMEOUT if code == TX_CODE_PENDING else TX_UNKNOWN
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, config.SETTLE_POLL_MAX)
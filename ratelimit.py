@@ -0,0 +1,159 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import config
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 標頭（秒數），無法解析時返回None"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    # HTTP 日期格式
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """所有API呼叫共用的令牌桶限流器
+
+    每個請求前取得一個令牌，令牌以固定速率補充；
+    遇到 403/429 或 Cloudflare 驗證時進入冷卻，優先採用 Retry-After，
+    否則以指數退避加上隨機抖動計算冷卻時間。冷卻期間的請求會等待而不是在請求函數內休眠。
+    """
+
+    def __init__(self, rate=None, burst=None):
+        """
+        Args:
+            rate: 每秒補充的令牌數，預設為 config.RATE_LIMIT_PER_SECOND
+            burst: 令牌桶容量，預設為 config.RATE_LIMIT_BURST
+        """
+        self.rate = rate or config.RATE_LIMIT_PER_SECOND
+        self.capacity = burst or config.RATE_LIMIT_BURST
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._cooldown_until = 0.0
+        self._failures = 0
+        self._priority_waiting = 0  # 等待中的優先請求數量
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self, block=True, priority=False):
+        """取得一個令牌
+
+        Args:
+            block: 為False時不等待（用於送出購買），令牌可暫時透支，之後的請求會等待更久
+            priority: 優先請求（用於查詢交易結果）：仍會等待令牌及冷卻，
+                但有優先請求等待時，一般請求要等它取得令牌後才能取得
+
+        Returns:
+            等待的秒數
+        """
+        waited = 0.0
+        queued = False
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if not block:
+                        self._tokens -= 1
+                        return waited
+                    wait = max(self._cooldown_until - now, 0)
+                    if wait == 0:
+                        if self._tokens >= 1 and (priority or not self._priority_waiting):
+                            self._tokens -= 1
+                            return waited
+                        if priority and not queued:
+                            self._priority_waiting += 1
+                            queued = True
+                        # 令牌已讓給等待中的優先請求時，至少等待補充一個令牌的時間
+                        wait = max(1 - self._tokens, 1 if self._tokens >= 1 else 0) / self.rate
+                time.sleep(wait)
+                waited += wait
+        finally:
+            if queued:
+                with self._lock:
+                    self._priority_waiting -= 1
+
+    def cooldown_remaining(self):
+        """距離冷卻結束的秒數"""
+        return max(self._cooldown_until - time.monotonic(), 0)
+
+    def record_success(self):
+        """請求成功時重設退避次數"""
+        self._failures = 0
+
+    def record_throttled(self, retry_after=None):
+        """遇到限流或拒絕存取時進入冷卻
+
+        Args:
+            retry_after: 伺服器指定的等待秒數，None表示使用指數退避
+
+        Returns:
+            冷卻秒數
+        """
+        with self._lock:
+            self._failures += 1
+            if retry_after is None:
+                backoff = min(config.BACKOFF_BASE * 2 ** (self._failures - 1), config.BACKOFF_MAX)
+                # 抖動避免多個呼叫端同時恢復請求
+                retry_after = backoff / 2 + random.uniform(0, backoff / 2)
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + retry_after)
+            self._tokens = min(self._tokens, 0)
+        return retry_after
+
+
+class AdaptivePollInterval:
+    """依上架速度調整查詢間隔
+
+    以指數移動平均估計每秒新上架數量，上架多時縮短間隔，冷清時逐步放寬，
+    並在限流冷卻期間延後下一次查詢。
+    """
+
+    def __init__(self, initial=None, minimum=None, maximum=None, target_per_poll=None):
+        self.interval = initial or config.POLL_INTERVAL
+        self.minimum = minimum or config.POLL_INTERVAL_MIN
+        self.maximum = maximum or config.POLL_INTERVAL_MAX
+        self.target_per_poll = target_per_poll or config.POLL_TARGET_NEW_PER_POLL
+        self.arrival_rate = 0.0
+        self._last_poll_at = None
+
+    def next_interval(self, new_count, cooldown=0):
+        """根據本次新上架數量計算下一次查詢前的等待時間
+
+        Args:
+            new_count: 本次查詢的新物品數量，查詢失敗時為None
+            cooldown: 限流器剩餘的冷卻秒數
+        """
+        now = time.monotonic()
+        if self._last_poll_at is None:
+            # 第一次查詢還無法估計上架速度，維持初始間隔
+            self._last_poll_at = now
+            return max(self.interval, cooldown)
+        if new_count is not None:
+            elapsed = max(now - self._last_poll_at, 1e-3)
+            self.arrival_rate = 0.7 * self.arrival_rate + 0.3 * (new_count / elapsed)
+        self._last_poll_at = now
+
+        if self.arrival_rate > 0:
+            # 讓每次查詢大約拿到 target_per_poll 個新物品
+            target = self.target_per_poll / self.arrival_rate
+        else:
+            target = self.maximum
+        # 往目標逐步調整；上架變多時立即縮短，冷清時每次最多放寬一半
+        if target < self.interval:
+            self.interval = target
+        else:
+            self.interval = min(target, self.interval * 1.5)
+        self.interval = min(max(self.interval, self.minimum), self.maximum)
+        return max(self.interval, cooldown)
@@ -0,0 +1,178 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+import cloudscraper
+from eth_account import Account
+from eth_account.messages import encode_defunct
+import config
+from log import get_logger
+from metrics import instrument_session
+
+logger = get_logger("session")
+
+# 回應內容中代表JWT過期或丟失的字串
+JWT_ERROR_MARKERS = ("Jwt is missing", "Jwt is expired", "code\":3")
+
+
+def is_jwt_error(response_text):
+    """檢查回應內容是否為JWT過期或丟失的錯誤"""
+    return any(marker in response_text for marker in JWT_ERROR_MARKERS)
+
+
+def _decode_jwt_expiry(token):
+    """解析JWT payload中的過期時間 (exp)，不是JWT時返回None"""
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = parts[1] + "=" * (-len(parts[1]) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+    except (ValueError, json.JSONDecodeError):
+        return None
+    exp = claims.get("exp") if isinstance(claims, dict) else None
+    return float(exp) if isinstance(exp, (int, float)) else None
+
+
+def read_token_expiry(scraper):
+    """從scraper的認證cookie中讀取JWT過期時間（本地解析，不需網路請求）
+
+    Returns:
+        過期時間的Unix時間戳記，找不到時返回None
+    """
+    expiries = []
+    for cookie in scraper.cookies:
+        exp = _decode_jwt_expiry(cookie.value or "")
+        if exp is None and cookie.expires and "token" in cookie.name.lower():
+            # 不是JWT格式時，退而使用cookie本身的過期時間
+            exp = float(cookie.expires)
+        if exp is not None:
+            expiries.append(exp)
+    return min(expiries) if expiries else None
+
+
+class AuthSession:
+    """錢包認證會話
+
+    登入後從cookie讀取JWT過期時間，有效性檢查完全在本地進行，
+    並由背景執行緒在過期前主動重新登入，購買路徑上不會有額外的網路請求。
+    """
+
+    def __init__(self, wallet, private_key):
+        self.wallet = wallet
+        self.private_key = private_key
+        self.scraper = None
+        self.expires_at = None
+        self.last_auth_time = None
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._stop_event = threading.Event()
+
+    def is_valid(self, margin=0):
+        """本地檢查會話是否有效（距離過期超過 margin 秒）"""
+        return (
+            self.scraper is not None
+            and self.expires_at is not None
+            and time.time() < self.expires_at - margin
+        )
+
+    def seconds_until_expiry(self):
+        """距離過期的秒數，尚未登入時返回0"""
+        if self.expires_at is None:
+            return 0
+        return self.expires_at - time.time()
+
+    def get_scraper(self):
+        """取得已認證的scraper，過期時才重新登入"""
+        if self.is_valid():
+            return self.scraper
+        with self._lock:
+            # 其他執行緒可能已完成重新登入
+            if not self.is_valid():
+                logger.info("重新登入中...")
+                self._login()
+            return self.scraper
+
+    def invalidate(self):
+        """伺服器回應JWT錯誤時呼叫，下次使用前會重新登入"""
+        self.expires_at = None
+
+    def refresh(self):
+        """立即重新登入"""
+        with self._lock:
+            self._login()
+        return self.scraper
+
+    def _login(self):
+        """以錢包簽名登入，成功後替換scraper（呼叫前需持有鎖）"""
+        # 建立新的scraper實例並進行認證
+        scraper = instrument_session(cloudscraper.create_scraper())
+        rpc_endpoint = f"{config.MARKETPLACE_API_URL}/gateway/v1"
+
+        try:
+            # 1. 拿 challenge message
+            msg_res = scraper.post(f"{rpc_endpoint}/web/message", json={"address": self.wallet})
+            msg_res.raise_for_status()
+            challenge = msg_res.json()["message"]
+            logger.debug("收到挑戰訊息")
+
+            # 2. 簽名
+            eip191_msg = encode_defunct(text=challenge)
+            signed = Account.sign_message(eip191_msg, private_key=self.private_key)
+            signature = signed.signature.hex()
+            logger.debug("生成簽名: 0x%s...", signature[:10])
+
+            # 3. 登入
+            auth_payload = {
+                "address": self.wallet,
+                "signature": "0x" + signature,
+                "walletType": "WALLET_TYPE_METAMASK"
+            }
+            auth_res = scraper.post(f"{rpc_endpoint}/web/signin-wallet", json=auth_payload)
+
+            # 顯示詳細錯誤
+            if auth_res.status_code != 200:
+                logger.error("認證失敗: %s，錯誤內容: %s", auth_res.status_code, auth_res.text)
+                raise Exception(f"認證失敗: {auth_res.status_code}")
+
+            logger.info("認證成功，已取得認證cookies")
+        except Exception as e:
+            logger.error("認證過程發生錯誤: %s", e)
+            raise
+
+        now = time.time()
+        expires_at = read_token_expiry(scraper)
+        if expires_at is None:
+            # 讀不到過期時間時，使用預設的會話有效時間
+            expires_at = now + config.AUTH_DEFAULT_TTL
+        self.scraper = scraper
+        self.expires_at = expires_at
+        self.last_auth_time = datetime.now()
+        logger.info("認證會話有效至 %s", f"{datetime.fromtimestamp(expires_at):%Y-%m-%d %H:%M:%S}")
+
+    def start_refresher(self):
+        """啟動背景執行緒，在JWT過期前主動重新登入"""
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._stop_event.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop, name="auth-refresher", daemon=True)
+        self._refresher.start()
+
+    def stop_refresher(self):
+        """停止背景重新登入執行緒"""
+        self._stop_event.set()
+
+    def _refresh_loop(self):
+        while not self._stop_event.is_set():
+            # 等到距離過期剩下 AUTH_REFRESH_MARGIN 秒時重新登入
+            # 有效時間比 AUTH_REFRESH_MARGIN 還短時，改為在剩餘時間過半時重新登入
+            remaining = self.seconds_until_expiry()
+            wait = max(remaining - config.AUTH_REFRESH_MARGIN, remaining / 2, 0)
+            if self._stop_event.wait(wait):
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("背景重新認證失敗: %s", e)
+                self._stop_event.wait(config.ERROR_RETRY_INTERVAL)
@@ -0,0 +1,109 @@
+import time
+from eth_account import Account
+from eth_utils import keccak
+import config
+
+# EIP-712 網域設定
+DOMAIN_NAME = "Marketplace"
+DOMAIN_VERSION = "1.0"
+CHAIN_ID = 68414
+VERIFYING_CONTRACT = "0xf1c82c082af3de3614771105f01dc419c3163352"
+
+# EIP-712 型別字串，欄位順序需與簽名結構一致
+DOMAIN_TYPE = "EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)"
+ORDER_TYPE = (
+    "Order(uint256 isSeller,address maker,uint256 listingTime,uint256 expirationTime,"
+    "address tokenAddress,uint256 tokenAmount,address nftAddress,uint256 nftTokenId,uint256 salt)"
+)
+
+# 訂單有效時間（秒）
+ORDER_EXPIRATION = 24 * 60 * 60
+
+
+def _uint256(value):
+    """將整數編碼為32位元組的 ABI word"""
+    return int(value).to_bytes(32, "big")
+
+
+def _address(value):
+    """將地址編碼為32位元組的 ABI word"""
+    return bytes.fromhex(value[2:] if value.startswith("0x") else value).rjust(32, b"\0")
+
+
+class OrderSigner:
+    """預先編譯的 EIP-712 購買訂單簽名器
+
+    網域分隔值 (domain separator)、Order 型別雜湊、固定欄位及錢包帳戶在建立時計算一次，
+    每筆訂單只需雜湊價格、tokenId 及時間戳記等變動欄位，結果與 encode_typed_data 相同。
+    """
+
+    def __init__(self, wallet, private_key, token_address=None, nft_address=None):
+        self.wallet = wallet
+        self.token_address = token_address or config.TOKEN_ADDRESS
+        self.nft_address = nft_address or config.NFT_ADDRESS
+        self.account = Account.from_key(private_key)
+
+        self.domain_separator = keccak(
+            keccak(text=DOMAIN_TYPE)
+            + keccak(text=DOMAIN_NAME)
+            + keccak(text=DOMAIN_VERSION)
+            + _uint256(CHAIN_ID)
+            + _address(VERIFYING_CONTRACT)
+        )
+        self.order_typehash = keccak(text=ORDER_TYPE)
+        # 固定欄位預先編碼: isSeller=0、maker、tokenAddress、nftAddress
+        self._prefix = self.order_typehash + _uint256(0) + _address(wallet.lower())
+        self._token_word = _address(self.token_address.lower())
+        self._nft_word = _address(self.nft_address.lower())
+        # 新版 eth_account 改名為 unsafe_sign_hash
+        self._sign_hash = getattr(self.account, "unsafe_sign_hash", None) or self.account.signHash
+
+    def order_digest(self, listing_time, expiration_time, token_amount, token_id, salt):
+        """計算訂單的 EIP-712 簽名雜湊"""
+        struct_hash = keccak(
+            self._prefix
+            + _uint256(listing_time)
+            + _uint256(expiration_time)
+            + self._token_word
+            + _uint256(token_amount)
+            + self._nft_word
+            + _uint256(token_id)
+            + _uint256(salt)
+        )
+        return keccak(b"\x19\x01" + self.domain_separator + struct_hash)
+
+    def sign_order(self, token_id, token_amount, now=None):
+        """建立並簽署購買訂單
+
+        Args:
+            token_id: 物品的 tokenId
+            token_amount: 價格（Wei）
+            now: 目前的Unix時間戳記（秒），預設為現在時間
+
+        Returns:
+            可直接送出的購買 POST 資料
+        """
+        now = time.time() if now is None else now
+        listing_time = int(now)  # 秒級時間戳記
+        expiration_time = listing_time + ORDER_EXPIRATION  # 一天後
+        salt = int(now * 1000)  # 毫秒級時間戳記
+        token_amount = int(token_amount)
+        token_id = int(token_id)
+
+        digest = self.order_digest(listing_time, expiration_time, token_amount, token_id, salt)
+        signature = self._sign_hash(digest)
+
+        return {
+            "order": {
+                "isSeller": False,
+                "maker": self.wallet,
+                "listingTime": str(listing_time),
+                "expirationTime": str(expiration_time),
+                "tokenAddress": self.token_address,
+                "tokenAmount": str(token_amount),
+                "nftAddress": self.nft_address,
+                "nftTokenId": str(token_id),
+                "salt": str(salt),
+            },
+            "orderSign": "0x" + bytes(signature.signature).hex(),
+        }
@@ -0,0 +1,184 @@
+import heapq
+import itertools
+import json
+import os
+import time
+
+
+class TrackingStore:
+    """各頻道的追蹤清單（依伺服器及頻道分開保存）
+
+    檔案格式:
+        {"<頻道ID>": {"guild_id": "<伺服器ID>", "items": {"道具名稱": 查詢間隔秒數或null}}}
+    查詢間隔為null時使用預設間隔。
+    """
+
+    def __init__(self, path, default_interval, legacy_path=None, legacy_channel_id=None):
+        """
+        Args:
+            path: 追蹤清單檔案路徑
+            default_interval: 未指定查詢間隔時的預設值（秒）
+            legacy_path: 舊版全域追蹤清單 (tracked_items.json)，新檔案不存在時匯入
+            legacy_channel_id: 舊版清單要匯入到的頻道ID
+        """
+        self.path = path
+        self.default_interval = default_interval
+        self._channels = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self._channels = json.load(f)
+        elif legacy_path and legacy_channel_id and os.path.exists(legacy_path):
+            with open(legacy_path, "r") as f:
+                legacy_items = json.load(f)
+            for item_name in legacy_items:
+                self.add(legacy_channel_id, item_name)
+
+    def _channel(self, channel_id, guild_id=None):
+        channel = self._channels.setdefault(str(channel_id), {"guild_id": None, "items": {}})
+        if guild_id is not None:
+            channel["guild_id"] = str(guild_id)
+        return channel
+
+    def save(self):
+        """以暫存檔加上取代的方式寫入，避免寫到一半時檔案損毀"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._channels, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, channel_id, item_name, guild_id=None, interval=None):
+        """加入追蹤，已在清單中時返回False"""
+        items = self._channel(channel_id, guild_id)["items"]
+        if item_name in items:
+            return False
+        items[item_name] = interval
+        self.save()
+        return True
+
+    def remove(self, channel_id, item_name):
+        """移除追蹤，不在清單中時返回False"""
+        channel = self._channels.get(str(channel_id))
+        if channel is None or item_name not in channel["items"]:
+            return False
+        del channel["items"][item_name]
+        if not channel["items"]:
+            del self._channels[str(channel_id)]
+        self.save()
+        return True
+
+    def set_interval(self, channel_id, item_name, interval):
+        """設定道具的查詢間隔，不在清單中時返回False"""
+        channel = self._channels.get(str(channel_id))
+        if channel is None or item_name not in channel["items"]:
+            return False
+        channel["items"][item_name] = interval
+        self.save()
+        return True
+
+    def interval(self, channel_id, item_name):
+        """道具的查詢間隔（秒）"""
+        interval = self._channels[str(channel_id)]["items"][item_name]
+        return interval if interval is not None else self.default_interval
+
+    def items(self, channel_id):
+        """頻道的追蹤清單
+
+        Returns:
+            {道具名稱: 查詢間隔秒數}
+        """
+        channel = self._channels.get(str(channel_id))
+        if channel is None:
+            return {}
+        return {item_name: self.interval(channel_id, item_name) for item_name in channel["items"]}
+
+    def entries(self):
+        """所有頻道的追蹤項目
+
+        Returns:
+            [((頻道ID, 道具名稱), 查詢間隔秒數)]
+        """
+        return [
+            ((int(channel_id), item_name), self.interval(channel_id, item_name))
+            for channel_id, channel in self._channels.items()
+            for item_name in channel["items"]
+        ]
+
+
+class RefreshScheduler:
+    """以優先佇列排程各追蹤項目的查詢
+
+    每個項目依自己的查詢間隔重複排程；啟動時同一間隔的項目平均分散在間隔內，
+    並限制兩次查詢之間的最短間隔，避免所有項目同時查詢觸發限流。
+    """
+
+    def __init__(self, min_gap=0):
+        """
+        Args:
+            min_gap: 兩次查詢之間的最短間隔（秒）
+        """
+        self.min_gap = min_gap
+        self._heap = []  # (預定時間, 序號, 項目)
+        self._intervals = {}  # 項目 -> 查詢間隔
+        self._due = {}  # 項目 -> 目前有效的預定時間
+        self._counter = itertools.count()
+        self._last_dispatch = float("-inf")
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def __contains__(self, key):
+        return key in self._intervals
+
+    def schedule(self, key, interval, delay=0):
+        """排程項目（已排程時改為新的間隔），在 delay 秒後第一次查詢"""
+        self._intervals[key] = interval
+        self._push(key, time.monotonic() + delay)
+
+    def stagger(self, entries):
+        """排程多個項目，同一間隔的項目平均分散在間隔內
+
+        Args:
+            entries: [(項目, 查詢間隔秒數)]
+        """
+        groups = {}
+        for key, interval in entries:
+            groups.setdefault(interval, []).append(key)
+        for interval, keys in groups.items():
+            for index, key in enumerate(keys):
+                self.schedule(key, interval, delay=interval * index / len(keys))
+
+    def unschedule(self, key):
+        """取消項目的排程（佇列中的舊排程會在取出時略過）"""
+        self._intervals.pop(key, None)
+        self._due.pop(key, None)
+
+    def _push(self, key, due):
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, next(self._counter), key))
+
+    def _discard_stale(self):
+        while self._heap:
+            due, _, key = self._heap[0]
+            if self._due.get(key) == due:
+                return
+            heapq.heappop(self._heap)
+
+    def next_delay(self):
+        """距離下一個項目可查詢的秒數，沒有任何項目時返回None"""
+        self._discard_stale()
+        if not self._heap:
+            return None
+        ready_at = max(self._heap[0][0], self._last_dispatch + self.min_gap)
+        return max(ready_at - time.monotonic(), 0)
+
+    def pop_due(self):
+        """取出到期的項目並排程下一次查詢，沒有到期項目時返回None"""
+        if self.next_delay() != 0:
+            return None
+        due, _, key = heapq.heappop(self._heap)
+        now = time.monotonic()
+        self._last_dispatch = now
+        # 維持原本的相位；落後超過一個間隔時從現在重新計算
+        next_due = due + self._intervals[key]
+        self._push(key, next_due if next_due > now else now + self._intervals[key])
+        return key
@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import deque
+from listing import WEI_PER_ETHER, to_wei
+from session import AuthSession
+from signer import OrderSigner
+
+
+class Wallet:
+    """一個購買用錢包：獨立的認證會話、訂單簽名器、餘額帳本及預算
+
+    餘額 = 最近一次對帳的API餘額 - 對帳後本地扣款的購買金額，
+    購買的判斷只讀取本地帳本，不需要等待網路。
+    """
+
+    def __init__(self, name, address, private_key, budget=None):
+        """
+        Args:
+            name: 顯示用名稱
+            address: 錢包地址
+            private_key: 錢包私鑰
+            budget: 本次執行最多花費的遊戲幣，None表示不限
+        """
+        self.name = name
+        self.address = address
+        self.private_key = private_key
+        self.budget_wei = to_wei(budget) if budget is not None else None
+        self.session = AuthSession(address, private_key)
+        self._signer = None
+        self.confirmed_wei = 0  # 最近一次對帳時API返回的餘額
+        self.debited_wei = 0  # API餘額可能尚未反映的本地扣款
+        self._debits = deque()  # (扣款時間 time.monotonic(), 金額)
+        self.reconciled_at = None  # 最近一次對帳的 time.monotonic() 值
+        self.spent_wei = 0  # 已完成購買的金額
+        self.reserved_wei = 0  # 進行中購買的金額
+        self.in_flight = 0  # 進行中的購買數量
+
+    def __repr__(self):
+        return f"Wallet({self.name!r}, {self.address!r})"
+
+    @property
+    def signer(self):
+        """預先編譯的訂單簽名器（第一次使用時建立）"""
+        if self._signer is None:
+            self._signer = OrderSigner(self.address, self.private_key)
+        return self._signer
+
+    @property
+    def balance_wei(self):
+        """帳本餘額（Wei）"""
+        return self.confirmed_wei - self.debited_wei
+
+    @property
+    def balance(self):
+        """帳本餘額（遊戲幣）"""
+        return self.balance_wei // WEI_PER_ETHER
+
+    def available_wei(self):
+        """扣除進行中購買及預算限制後，還能花費的金額（Wei）"""
+        available = self.balance_wei - self.reserved_wei
+        if self.budget_wei is not None:
+            available = min(available, self.budget_wei - self.spent_wei - self.reserved_wei)
+        return max(available, 0)
+
+    def available(self):
+        """還能花費的遊戲幣"""
+        return self.available_wei() // WEI_PER_ETHER
+
+
+class WalletPool:
+    """把購買分配到多個錢包
+
+    每次購買選擇餘額及預算足夠、且進行中購買最少的錢包，
+    並預留該筆金額直到購買完成，同時進行的購買不會超支。
+    購買成功（或結果未知）時先在本地帳本扣款，失敗時釋放預留金額，
+    之後由背景的 reconcile 以API餘額校正。
+    """
+
+    def __init__(self, wallets, max_in_flight_per_wallet=1):
+        """
+        Args:
+            wallets: Wallet 列表
+            max_in_flight_per_wallet: 每個錢包同時進行的購買數量上限
+        """
+        self.wallets = list(wallets)
+        self.max_in_flight_per_wallet = max_in_flight_per_wallet
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.wallets)
+
+    def can_afford(self, price_wei):
+        """不計進行中的購買時，是否有任何錢包的餘額及預算足夠（值得等待錢包空出）"""
+        with self._lock:
+            return any(
+                wallet.balance_wei >= price_wei
+                and (wallet.budget_wei is None or wallet.budget_wei - wallet.spent_wei >= price_wei)
+                for wallet in self.wallets
+            )
+
+    def acquire(self, price_wei):
+        """選擇一個目前可以購買的錢包並預留金額
+
+        Returns:
+            Wallet，目前沒有可用的錢包時返回None
+        """
+        with self._lock:
+            candidates = [
+                wallet for wallet in self.wallets
+                if wallet.in_flight < self.max_in_flight_per_wallet and wallet.available_wei() >= price_wei
+            ]
+            if not candidates:
+                return None
+            # 優先使用閒置的錢包，讓同時符合的物品由不同錢包並行購買
+            wallet = min(candidates, key=lambda candidate: (candidate.in_flight, -candidate.available_wei()))
+            wallet.in_flight += 1
+            wallet.reserved_wei += price_wei
+            return wallet
+
+    def release(self, wallet, price_wei, spent):
+        """購買完成後釋放錢包
+
+        Args:
+            wallet: acquire 返回的錢包
+            price_wei: acquire 時預留的金額
+            spent: 購買是否成功（或結果未知），為True時計入預算
+        """
+        with self._lock:
+            wallet.in_flight -= 1
+            wallet.reserved_wei -= price_wei
+            if spent:
+                self._debit(wallet, price_wei)
+
+    def debit(self, wallet, price_wei):
+        """在本地帳本扣款（未經 acquire 的直接購買）"""
+        with self._lock:
+            self._debit(wallet, price_wei)
+
+    def _debit(self, wallet, price_wei):
+        wallet.spent_wei += price_wei
+        wallet.debited_wei += price_wei
+        wallet._debits.append((time.monotonic(), price_wei))
+
+    def reconcile(self, wallet, balance_wei, requested_at, grace=0):
+        """以API返回的餘額校正本地帳本
+
+        API餘額可能還沒反映剛完成的購買，因此在查詢開始前 grace 秒內的本地扣款會保留，
+        較早的扣款視為已反映在API餘額中並從帳本移除。
+
+        Args:
+            wallet: 要校正的錢包
+            balance_wei: API返回的餘額（Wei）
+            requested_at: 開始查詢餘額時的 time.monotonic() 值
+            grace: 扣款後多久內的API餘額可能尚未反映該筆扣款（秒）
+
+        Returns:
+            校正前後的帳本餘額差異（Wei），正數表示帳本原本高估
+        """
+        with self._lock:
+            before = wallet.balance_wei
+            while wallet._debits and wallet._debits[0][0] < requested_at - grace:
+                wallet._debits.popleft()
+            wallet.confirmed_wei = balance_wei
+            wallet.reconciled_at = requested_at
+            wallet.debited_wei = sum(amount for _, amount in wallet._debits)
+            return before - wallet.balance_wei
+
+    def set_budgets(self, budgets):
+        """調整錢包的預算（已花費金額不變）
+
+        Args:
+            budgets: {錢包名稱: 預算（遊戲幣）}，預算為None表示不限
+        """
+        with self._lock:
+            for wallet in self.wallets:
+                if wallet.name in budgets:
+                    budget = budgets[wallet.name]
+                    wallet.budget_wei = to_wei(budget) if budget is not None else None
+
+    def max_available(self):
+        """單一錢包最多能花費的遊戲幣（用於價格上限為None的規則）"""
+        with self._lock:
+            return max((wallet.available() for wallet in self.wallets), default=0)
@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import config
+from log import get_logger
+from matcher import PetRuleMatcher, WatchlistMatcher
+
+logger = get_logger("watchconfig")
+
+# 設定檔可包含的區塊，沒有出現的區塊使用 config.py 中的設定
+_SECTIONS = {"pet_filters", "equipment", "equipment_categories", "wallets"}
+_PET_RULE_KEYS = {"skills", "exclude", "price", "priority", "budget"}
+
+
+def _check_amount(value, where, allow_none=True):
+    if value is None and allow_none:
+        return value
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f"{where} 必須是非負數字{'或null' if allow_none else ''}")
+    return value
+
+
+def _check_skills(value, where):
+    if not isinstance(value, list) or not all(isinstance(skill, str) for skill in value):
+        raise ValueError(f"{where} 必須是技能名稱列表")
+    return set(value)
+
+
+def _parse_pet_filters(entries):
+    """驗證寵物篩選條件，轉為 PET_FILTERS 的格式"""
+    if not isinstance(entries, list):
+        raise ValueError("pet_filters 必須是列表")
+    rules = []
+    for index, entry in enumerate(entries):
+        where = f"pet_filters 第 {index + 1} 項"
+        if isinstance(entry, list):
+            # [[技能], 價格上限]
+            if len(entry) != 2:
+                raise ValueError(f"{where} 必須是 [[技能], 價格上限]")
+            rules.append([_check_skills(entry[0], f"{where} 的技能"), _check_amount(entry[1], f"{where} 的價格上限")])
+        elif isinstance(entry, dict):
+            unknown = set(entry) - _PET_RULE_KEYS
+            if unknown:
+                raise ValueError(f"{where} 有未知的欄位: {', '.join(sorted(unknown))}")
+            priority = entry.get("priority", 0)
+            if isinstance(priority, bool) or not isinstance(priority, int):
+                raise ValueError(f"{where} 的 priority 必須是整數")
+            rules.append({
+                "skills": _check_skills(entry.get("skills", []), f"{where} 的 skills"),
+                "exclude": _check_skills(entry.get("exclude", []), f"{where} 的 exclude"),
+                "price": _check_amount(entry.get("price"), f"{where} 的 price"),
+                "priority": priority,
+                "budget": _check_amount(entry.get("budget"), f"{where} 的 budget"),
+            })
+        else:
+            raise ValueError(f"{where} 格式錯誤")
+    return rules
+
+
+def _parse_equipment(entries):
+    """驗證裝備監控清單 {裝備名稱: 價格上限}"""
+    if not isinstance(entries, dict):
+        raise ValueError("equipment 必須是 {裝備名稱: 價格上限}")
+    for name, price_limit in entries.items():
+        if not name:
+            raise ValueError("equipment 的裝備名稱不能為空")
+        _check_amount(price_limit, f"equipment 的 {name} 價格上限")
+    return dict(entries)
+
+
+def _parse_equipment_categories(entries):
+    """驗證裝備分類 {裝備名稱: 分類編號或分類編號列表}"""
+    if not isinstance(entries, dict):
+        raise ValueError("equipment_categories 必須是 {裝備名稱: 分類編號}")
+    for name, categories in entries.items():
+        values = categories if isinstance(categories, list) else [categories]
+        if not values or not all(isinstance(value, int) and not isinstance(value, bool) and value > 0 for value in values):
+            raise ValueError(f"equipment_categories 的 {name} 必須是分類編號或分類編號列表")
+    return dict(entries)
+
+
+def _parse_wallets(entries, wallet_names):
+    """驗證錢包設定 {錢包名稱: {"budget": 預算}}，只能調整已登入的錢包"""
+    if not isinstance(entries, dict):
+        raise ValueError("wallets 必須是 {錢包名稱: {\"budget\": 預算}}")
+    budgets = {}
+    for name, settings in entries.items():
+        if name not in wallet_names:
+            raise ValueError(f"wallets 的 {name} 不在 config.json 的錢包中（新增錢包需要重新啟動）")
+        if not isinstance(settings, dict) or set(settings) - {"budget"}:
+            raise ValueError(f"wallets 的 {name} 只能設定 budget")
+        budgets[name] = _check_amount(settings.get("budget"), f"wallets 的 {name} budget")
+    return budgets
+
+
+class WatchConfig:
+    """驗證並編譯完成的監控設定，建立後不再修改，可在執行緒之間直接替換"""
+
+    def __init__(self, pet_filters, equipment, wallet_budgets=None, equipment_categories=None):
+        """
+        Args:
+            pet_filters: 寵物篩選條件（PET_FILTERS 格式）
+            equipment: 裝備監控清單 {裝備名稱: 價格上限}
+            wallet_budgets: {錢包名稱: 預算}，None表示不調整錢包
+            equipment_categories: {裝備名稱: 分類編號或分類編號列表}（EQUIPMENT_CATEGORIES 格式）
+        """
+        self.pet_filters = pet_filters
+        self.equipment = equipment
+        self.wallet_budgets = wallet_budgets or {}
+        self.equipment_categories = equipment_categories or {}
+        # 在載入的執行緒中編譯，監控迴圈只需替換參考
+        self.pet_rules = PetRuleMatcher(pet_filters)
+        self.equipment_matcher = WatchlistMatcher(equipment)
+
+
+def load_watch_config(path, wallet_names=()):
+    """讀取、驗證並編譯監控設定檔
+
+    Args:
+        path: 設定檔路徑（JSON）
+        wallet_names: 已登入的錢包名稱，wallets 區塊只能調整這些錢包
+
+    Returns:
+        WatchConfig
+
+    Raises:
+        ValueError: 設定檔格式錯誤
+    """
+    with open(path, encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON 格式錯誤: {e}")
+    if not isinstance(data, dict):
+        raise ValueError("設定檔必須是 JSON 物件")
+    unknown = set(data) - _SECTIONS
+    if unknown:
+        raise ValueError(f"未知的設定區塊: {', '.join(sorted(unknown))}")
+
+    pet_filters = _parse_pet_filters(data["pet_filters"]) if "pet_filters" in data else config.PET_FILTERS
+    equipment = _parse_equipment(data["equipment"]) if "equipment" in data else config.EQUIPMENT_MONITOR_LIST
+    equipment_categories = (
+        _parse_equipment_categories(data["equipment_categories"])
+        if "equipment_categories" in data else config.EQUIPMENT_CATEGORIES
+    )
+    wallet_budgets = _parse_wallets(data["wallets"], set(wallet_names)) if "wallets" in data else None
+    return WatchConfig(pet_filters, equipment, wallet_budgets, equipment_categories)
+
+
+class WatchConfigReloader:
+    """監看監控設定檔，內容變更時重新載入
+
+    以檔案修改時間及大小判斷是否變更，變更後在呼叫端的執行緒中驗證及編譯，
+    失敗時保留目前的設定並顯示錯誤，同一版本的檔案只會顯示一次錯誤。
+    """
+
+    def __init__(self, path, wallet_names=()):
+        """
+        Args:
+            path: 設定檔路徑
+            wallet_names: 已登入的錢包名稱
+        """
+        self.path = path
+        self.wallet_names = tuple(wallet_names)
+        self.current = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def check(self):
+        """檢查設定檔是否變更
+
+        Returns:
+            變更且載入成功時返回新的 WatchConfig，否則返回None
+        """
+        with self._lock:
+            signature = self._file_signature()
+            if signature is None or signature == self._signature:
+                return None
+            self._signature = signature
+            try:
+                watch = load_watch_config(self.path, self.wallet_names)
+            except (OSError, ValueError) as e:
+                logger.error("監控設定檔 %s 載入失敗，繼續使用目前的設定: %s", self.path, e)
+                return None
+            self.current = watch
+            return watch